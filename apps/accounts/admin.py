@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
+from django.db.models.functions import Lower, Trim
 
-from .models import Profile
+from .archive import restore_user
+from .locations import get_index, normalize
+from .models import ArchivedUser, Profile
 
 # --- Site branding ---
 admin.site.site_header = "AuthProfile Admin"
@@ -32,10 +35,27 @@ admin.site.register(User, UserAdmin)
 
 
 # --- Profile admin ---
+class LocationFilter(admin.SimpleListFilter):
+    """The most used locations, read from the location index instead of a DISTINCT scan."""
+
+    title = "location"
+    parameter_name = "location"
+    limit = 30
+
+    def lookups(self, request, model_admin):
+        return [(location, f"{location} ({users})") for location, users in get_index().search(limit=self.limit)]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            # Every spelling folded into the index entry
+            return queryset.alias(location_key=Lower(Trim("location"))).filter(location_key=normalize(self.value()))
+        return queryset
+
+
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ["user", "location", "phone", "bio_short", "created_at", "updated_at"]
-    list_filter = ["location", "created_at"]
+    list_filter = [LocationFilter, "created_at"]
     search_fields = ["user__username", "user__email", "location", "bio"]
     readonly_fields = ["created_at", "updated_at"]
     ordering = ["-created_at"]
@@ -45,3 +65,24 @@ class ProfileAdmin(admin.ModelAdmin):
         if obj.bio and len(obj.bio) > 50:
             return obj.bio[:50] + "..."
         return obj.bio or "—"
+
+
+# --- Archived accounts ---
+@admin.register(ArchivedUser)
+class ArchivedUserAdmin(admin.ModelAdmin):
+    list_display = ["username", "email", "last_seen", "archived_at"]
+    search_fields = ["username", "email"]
+    readonly_fields = ["id", "username", "email", "last_seen", "archived_at", "data"]
+    ordering = ["-archived_at"]
+    actions = ["restore"]
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Restore selected accounts")
+    def restore(self, request, queryset):
+        count = 0
+        for archived in queryset:
+            restore_user(archived)
+            count += 1
+        self.message_user(request, f"Restored {count} account{'' if count == 1 else 's'}.")
@@ -1,16 +1,38 @@
 from django.urls import include, path
-from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
+from drf_spectacular.views import SpectacularRedocView, SpectacularSwaggerView
 from rest_framework.routers import DefaultRouter
 
-from .api_views import ProfileViewSet, UserViewSet
+from .api_views import (
+    AvailabilityView,
+    CacheStatsView,
+    LocationAutocompleteView,
+    ProfileViewSet,
+    ProfilingView,
+    SignedTokenObtainView,
+    SignedTokenRefreshView,
+    SignedTokenRevokeView,
+    StatsView,
+    UserViewSet,
+    profile_stream_view,
+)
+from .schema import schema_view
 
 router = DefaultRouter()
 router.register(r"profiles", ProfileViewSet)
 router.register(r"users", UserViewSet)
 
 urlpatterns = [
+    path("profiles/stream/", profile_stream_view, name="profile-stream"),
     path("", include(router.urls)),
-    path("schema/", SpectacularAPIView.as_view(), name="schema"),
+    path("token/", SignedTokenObtainView.as_view(), name="token-obtain"),
+    path("token/refresh/", SignedTokenRefreshView.as_view(), name="token-refresh"),
+    path("token/revoke/", SignedTokenRevokeView.as_view(), name="token-revoke"),
+    path("availability/", AvailabilityView.as_view(), name="availability"),
+    path("locations/", LocationAutocompleteView.as_view(), name="location-autocomplete"),
+    path("stats/", StatsView.as_view(), name="stats"),
+    path("cache/stats/", CacheStatsView.as_view(), name="cache-stats"),
+    path("profiling/", ProfilingView.as_view(), name="profiling"),
+    path("schema/", schema_view, name="schema"),
     path("docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
     path("redoc/", SpectacularRedocView.as_view(url_name="schema"), name="redoc"),
 ]
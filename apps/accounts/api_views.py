@@ -1,10 +1,112 @@
-from django.contrib.auth.models import User
-from drf_spectacular.utils import extend_schema, extend_schema_view
-from rest_framework import filters, permissions, viewsets
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User, update_last_login
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
+from rest_framework import permissions, serializers, viewsets
+from rest_framework.authtoken.serializers import AuthTokenSerializer
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, AuthenticationFailed, Throttled
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.throttling import ScopedRateThrottle
+from rest_framework.views import APIView
 
-from .models import Profile
+from .authentication import SignedTokenAuthentication
+from .availability import EMAIL, USERNAME, is_taken
+from .changelog import changes_since
+from .events import hub
+from .filters import DirectoryOrderingFilter, DirectorySearchFilter
+from .locations import get_index
+from .loginguard import get_guard
+from .models import ChangeLogEntry, Profile, UserDirectory
+from .pagination import DirectoryPagination
 from .permissions import IsOwnerOrReadOnly
-from .serializers import ProfileSerializer, UserPublicSerializer, UserSerializer
+from .phones import normalize_phone
+from .profiling import report as profiling_report
+from .serializers import (
+    ChangeLogEntrySerializer,
+    ProfileSerializer,
+    RefreshTokenSerializer,
+    SignedTokenPairSerializer,
+    UserPublicSerializer,
+    UserSerializer,
+)
+from .signed_tokens import REFRESH, TokenError, current_generation, issue_pair, revoke_tokens, verify
+from .stats import directory_stats
+from .usercache import get_cached_user, get_cached_users, get_cached_users_by_username
+
+CHANGES_DEFAULT_LIMIT = 100
+CHANGES_MAX_LIMIT = 1000
+USERS_BATCH_MAX = 100
+STATS_MAX_LOCATIONS = 100
+STATS_MAX_DAYS = 366
+LOCATIONS_MAX_LIMIT = 50
+# Rows loaded and serialized at a time when streaming a large page
+STREAM_CHUNK_SIZE = 200
+
+
+def _query_int(request, name, default, minimum=0):
+    try:
+        value = int(request.query_params.get(name, default))
+    except ValueError:
+        raise serializers.ValidationError({name: "Must be an integer."}) from None
+    if value < minimum:
+        raise serializers.ValidationError({name: f"Must be at least {minimum}."})
+    return value
+
+
+class DirectoryListMixin:
+    """List through the UserDirectory read model.
+
+    Search, ordering, counting and pagination run on the flat directory
+    table; only the objects on the requested page are then loaded by primary
+    key and serialized as usual.
+
+    Large pages (staff exports) are streamed in chunks of
+    ``STREAM_CHUNK_SIZE`` rows, so memory does not grow with ``page_size``.
+    """
+
+    directory_id_field = "user_id"
+    pagination_class = DirectoryPagination
+
+    def get_directory_queryset(self):
+        return UserDirectory.objects.all()
+
+    def list(self, request, *args, **kwargs):
+        entries = self.filter_queryset(self.get_directory_queryset())
+        entries = entries.values_list(self.directory_id_field, flat=True)
+        if self.paginator is not None and self.paginator.should_stream(request):
+            ids = self.paginator.paginate_queryset_lazily(entries, request)
+            return self.paginator.get_streaming_response(self.stream_rows(ids))
+        page = self.paginate_queryset(entries)
+        ids = page if page is not None else list(entries)
+        objects = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer([objects[pk] for pk in ids if pk in objects], many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    def stream_rows(self, ids):
+        """Serialize the objects of ``ids`` one at a time, loading them in chunks."""
+        chunk = []
+        for pk in ids.iterator(chunk_size=STREAM_CHUNK_SIZE):
+            chunk.append(pk)
+            if len(chunk) == STREAM_CHUNK_SIZE:
+                yield from self._serialize_chunk(chunk)
+                chunk = []
+        yield from self._serialize_chunk(chunk)
+
+    def _serialize_chunk(self, ids):
+        objects = self.get_queryset().in_bulk(ids)
+        serializer_class = self.get_serializer_class()
+        context = self.get_serializer_context()
+        for pk in ids:
+            if pk in objects:
+                yield serializer_class(objects[pk], context=context).data
 
 
 @extend_schema_view(
@@ -15,7 +117,7 @@ from .serializers import ProfileSerializer, UserPublicSerializer, UserSerializer
     partial_update=extend_schema(summary="Partial update a profile", tags=["Profiles"]),
     destroy=extend_schema(summary="Delete a profile", tags=["Profiles"]),
 )
-class ProfileViewSet(viewsets.ModelViewSet):
+class ProfileViewSet(DirectoryListMixin, viewsets.ModelViewSet):
     """ViewSet for user profiles.
 
     Provides full CRUD operations on Profile objects.
@@ -26,17 +128,94 @@ class ProfileViewSet(viewsets.ModelViewSet):
     queryset = Profile.objects.select_related("user").all()
     serializer_class = ProfileSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DirectorySearchFilter, DirectoryOrderingFilter]
     search_fields = ["user__username", "location", "bio"]
     ordering_fields = ["created_at", "updated_at"]
     ordering = ["-created_at"]
+    directory_id_field = "profile_id"
+    directory_search_field = "profile_search_key"
+    directory_ordering_map = {"created_at": "profile_created_at", "updated_at": "profile_updated_at"}
+    # Set per action (by_phone); declared so @action may override it
+    throttle_scope = None
+
+    def get_directory_queryset(self):
+        return UserDirectory.objects.filter(profile_id__isnull=False)
+
+    @extend_schema(
+        summary="List profile and user changes since a cursor",
+        tags=["Profiles"],
+        parameters=[
+            OpenApiParameter("since", int, description="Cursor returned by the previous call (0 to start)"),
+            OpenApiParameter("limit", int, description=f"Batch size (max {CHANGES_MAX_LIMIT})"),
+        ],
+        responses=ChangeLogEntrySerializer(many=True),
+    )
+    @action(detail=False, methods=["get"], pagination_class=None, filter_backends=[])
+    def changes(self, request):
+        """Return changes after `since` in cursor order, including deletions.
+
+        Mirrors store `next_cursor` and call again while `has_more` is true.
+        """
+        since = _query_int(request, "since", 0)
+        limit = min(_query_int(request, "limit", CHANGES_DEFAULT_LIMIT, minimum=1), CHANGES_MAX_LIMIT)
+        entries, has_more = changes_since(since, limit)
+
+        wanted = {kind: set() for kind in ChangeLogEntry.Kind.values}
+        for entry in entries:
+            if entry.action != ChangeLogEntry.Action.DELETED:
+                wanted[entry.kind].add(entry.object_id)
+        user_serializer = UserSerializer if request.user.is_staff else UserPublicSerializer
+        objects = {}
+        for profile in Profile.objects.select_related("user").filter(pk__in=wanted["profile"]):
+            objects[("profile", profile.pk)] = ProfileSerializer(profile).data
+        for user in User.objects.select_related("profile").filter(pk__in=wanted["user"]):
+            objects[("user", user.pk)] = user_serializer(user).data
+
+        return Response(
+            {
+                "next_cursor": entries[-1].sequence if entries else since,
+                "has_more": has_more,
+                "results": ChangeLogEntrySerializer(entries, many=True, context={"objects": objects}).data,
+            }
+        )
+
+    @extend_schema(
+        summary="Look up profiles by phone number (staff only)",
+        tags=["Profiles"],
+        parameters=[OpenApiParameter("number", str, required=True, description="Phone number in any common format")],
+        responses=ProfileSerializer(many=True),
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="by-phone",
+        permission_classes=[permissions.IsAdminUser],
+        throttle_classes=[ScopedRateThrottle],
+        throttle_scope="phone_lookup",
+        pagination_class=None,
+        filter_backends=[],
+    )
+    def by_phone(self, request):
+        """Return the profiles whose phone normalizes to the same E.164 number, via the phone index."""
+        number = normalize_phone(request.query_params.get("number", ""))
+        if not number:
+            raise serializers.ValidationError({"number": "Enter a valid phone number."})
+        profiles = Profile.objects.select_related("user").filter(phone_normalized=number)
+        return Response({"number": number, "results": ProfileSerializer(profiles, many=True).data})
 
 
 @extend_schema_view(
-    list=extend_schema(summary="List all users", tags=["Users"]),
+    list=extend_schema(
+        summary="List all users, or look up a batch by id or username",
+        tags=["Users"],
+        parameters=[
+            OpenApiParameter("ids", str, description=f"Comma-separated user ids (max {USERS_BATCH_MAX})"),
+            OpenApiParameter("usernames", str, description=f"Comma-separated usernames (max {USERS_BATCH_MAX})"),
+        ],
+    ),
     retrieve=extend_schema(summary="Retrieve a user", tags=["Users"]),
 )
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+class UserViewSet(DirectoryListMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for users (read-only).
 
     Provides list and detail views for registered users.
@@ -47,12 +226,247 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
 
     queryset = User.objects.select_related("profile").all()
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DirectorySearchFilter, DirectoryOrderingFilter]
     search_fields = ["username", "first_name", "last_name"]
     ordering_fields = ["date_joined", "username"]
     ordering = ["-date_joined"]
+    directory_search_field = "user_search_key"
 
     def get_serializer_class(self):
         if self.request.user.is_staff:
             return UserSerializer
         return UserPublicSerializer
+
+    def list(self, request, *args, **kwargs):
+        """With `ids` or `usernames`, return those users in the requested order instead of a page.
+
+        Batch responses are `{"results": [...], "missing": [...]}`, where
+        `missing` lists the requested ids or usernames that do not exist.
+        """
+        for param in ("ids", "usernames"):
+            if param in request.query_params:
+                return self.batch_lookup(param, request.query_params[param])
+        return super().list(request, *args, **kwargs)
+
+    def batch_lookup(self, param, value):
+        wanted = list(dict.fromkeys(item.strip() for item in value.split(",") if item.strip()))
+        if len(wanted) > USERS_BATCH_MAX:
+            raise serializers.ValidationError({param: f"At most {USERS_BATCH_MAX} values per request."})
+        if param == "ids":
+            try:
+                wanted = list(dict.fromkeys(int(item) for item in wanted))
+            except ValueError:
+                raise serializers.ValidationError({param: "Must be a comma-separated list of integers."}) from None
+            found = get_cached_users(wanted)
+        else:
+            found = get_cached_users_by_username(wanted)
+        serializer = self.get_serializer([found[key] for key in wanted if key in found], many=True)
+        return Response({"results": serializer.data, "missing": [key for key in wanted if key not in found]})
+
+
+@sync_to_async
+def _stream_user(request):
+    request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = request.user
+    except APIException:
+        return None
+    return user if user.is_authenticated else None
+
+
+async def profile_stream_view(request):
+    """Stream profile updates as server-sent events (requires an ASGI server).
+
+    Authenticates with the API's authentication classes. `?ids=1,2` limits
+    the stream to the given profiles. Clients that fall too far behind
+    receive a `dropped` event and should reconnect.
+
+    Under WSGI the whole stream would be buffered before the first byte is
+    sent, holding a worker until it times out, so the request is refused.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"detail": "Event streams require the ASGI server (config.asgi)."}, status=501)
+    if await _stream_user(request) is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    ids = request.GET.get("ids", "")
+    try:
+        profile_ids = {int(pk) for pk in ids.split(",") if pk.strip()} or None
+    except ValueError:
+        return JsonResponse({"ids": ["Must be a comma-separated list of integers."]}, status=400)
+
+    subscriber = hub.subscribe(profile_ids)
+    response = StreamingHttpResponse(hub.stream(subscriber), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+class CacheStatsView(APIView):
+    """Hit counts and ratios of the cache tiers in the worker serving the request (staff only)."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    @extend_schema(summary="Cache hit ratios", tags=["Admin"], responses={200: dict})
+    def get(self, request):
+        stats = getattr(cache, "stats", None)
+        return Response(stats() if stats else {})
+
+
+class ProfilingView(APIView):
+    """Per-endpoint allocation and stack sampling profiles from all workers (staff only)."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    @extend_schema(
+        summary="Sampling profiler report",
+        tags=["Admin"],
+        parameters=[OpenApiParameter("top", int, description="Allocation sites and frames per endpoint (max 100)")],
+        responses={200: dict},
+    )
+    def get(self, request):
+        """Return endpoints by retained memory, each with its top allocation sites and hot frames."""
+        top = min(_query_int(request, "top", 10, minimum=1), 100)
+        return Response({"sample_rate": settings.PROFILING_SAMPLE_RATE, "endpoints": profiling_report(top)})
+
+
+class StatsView(APIView):
+    """Directory statistics read from incrementally maintained counters."""
+
+    @extend_schema(
+        summary="Directory statistics",
+        tags=["Users"],
+        parameters=[
+            OpenApiParameter("locations", int, description=f"Top locations to return (max {STATS_MAX_LOCATIONS})"),
+            OpenApiParameter("days", int, description=f"Days of daily signups to return (max {STATS_MAX_DAYS})"),
+        ],
+        responses={200: dict},
+    )
+    def get(self, request):
+        """Return user/profile totals, top locations, completeness buckets and daily signups."""
+        top_locations = min(_query_int(request, "locations", 20, minimum=1), STATS_MAX_LOCATIONS)
+        days = min(_query_int(request, "days", 30, minimum=1), STATS_MAX_DAYS)
+        return Response(directory_stats(top_locations, days))
+
+
+class AvailabilityView(APIView):
+    """Live registration checks; most answers come from a per-worker filter without a query."""
+
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "availability"
+
+    @extend_schema(
+        summary="Check username/email availability",
+        tags=["Auth"],
+        parameters=[
+            OpenApiParameter("username", str, description="Username to check"),
+            OpenApiParameter("email", str, description="Email address to check"),
+        ],
+        responses={200: dict},
+    )
+    def get(self, request):
+        """Return whether each given username and email is still free to register."""
+        checks = {kind: request.query_params.get(kind, "").strip() for kind in (USERNAME, EMAIL)}
+        checks = {kind: value for kind, value in checks.items() if value}
+        if not checks:
+            raise serializers.ValidationError("Pass a username, an email or both.")
+        return Response(
+            {kind: {"value": value, "available": not is_taken(kind, value)} for kind, value in checks.items()}
+        )
+
+
+class LocationAutocompleteView(APIView):
+    """Location suggestions served from the in-process prefix index."""
+
+    # One request per keystroke: a scoped rate instead of the general user rate
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "autocomplete"
+
+    @extend_schema(
+        summary="Autocomplete locations",
+        tags=["Profiles"],
+        parameters=[
+            OpenApiParameter("prefix", str, description="Case-insensitive start of the location"),
+            OpenApiParameter("limit", int, description=f"Suggestions to return (max {LOCATIONS_MAX_LIMIT})"),
+        ],
+        responses={200: dict},
+    )
+    def get(self, request):
+        """Return the most used locations starting with ``prefix``, with their user counts."""
+        limit = min(_query_int(request, "limit", 10, minimum=1), LOCATIONS_MAX_LIMIT)
+        matches = get_index().search(request.query_params.get("prefix", ""), limit)
+        response = Response({"results": [{"location": location, "users": users} for location, users in matches]})
+        response["Cache-Control"] = "private, max-age=60"
+        return response
+
+
+class SignedTokenObtainView(APIView):
+    """Exchange a username and password for a signed access/refresh token pair."""
+
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    @extend_schema(
+        summary="Obtain signed tokens",
+        tags=["Auth"],
+        request=AuthTokenSerializer,
+        responses=SignedTokenPairSerializer,
+    )
+    def post(self, request):
+        """Send the access token as `Authorization: Bearer <access>`; renew it with the refresh token."""
+        guard = get_guard()
+        username = str(request.data.get("username", ""))
+        ip = request.META.get("REMOTE_ADDR", "")
+        if guard.is_locked(username, ip):
+            raise Throttled(detail="Too many attempts. Please try again later.")
+        serializer = AuthTokenSerializer(data=request.data, context={"request": request})
+        if not serializer.is_valid():
+            guard.record_failure(username, ip)
+            raise serializers.ValidationError(serializer.errors)
+        user = serializer.validated_data["user"]
+        update_last_login(None, user)
+        return Response(issue_pair(user.pk))
+
+
+class SignedTokenRefreshView(APIView):
+    """Exchange a refresh token for a new token pair."""
+
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    @extend_schema(
+        summary="Refresh signed tokens",
+        tags=["Auth"],
+        request=RefreshTokenSerializer,
+        responses=SignedTokenPairSerializer,
+    )
+    def post(self, request):
+        """Refresh tokens are not renewed past revocation (see `/api/token/revoke/`)."""
+        serializer = RefreshTokenSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            claims = verify(serializer.validated_data["refresh"], REFRESH)
+        except TokenError as exc:
+            raise AuthenticationFailed(str(exc)) from None
+        user = get_cached_user(claims.user_id)
+        if user is None or not user.is_active:
+            raise AuthenticationFailed("User inactive or deleted.")
+        if claims.generation != current_generation(user.pk):
+            raise AuthenticationFailed("Token has been revoked.")
+        # A refresh is a sign-in as far as account activity goes (see archive.cold_users)
+        update_last_login(None, user)
+        return Response(issue_pair(user.pk))
+
+    def get_authenticate_header(self, request):
+        # Answer rejected refresh tokens with 401 rather than 403
+        return SignedTokenAuthentication().authenticate_header(request)
+
+
+class SignedTokenRevokeView(APIView):
+    """Revoke every signed token of the requesting user (log out everywhere)."""
+
+    @extend_schema(summary="Revoke signed tokens", tags=["Auth"], request=None, responses={204: None})
+    def post(self, request):
+        revoke_tokens(request.user.pk)
+        return Response(status=204)
@@ -0,0 +1,208 @@
+"""Archival of cold accounts, so the hot auth tables hold only the working set.
+
+``archive_users`` moves users who have not logged in since a cutoff (or,
+never having logged in, joined before it) into ``ArchivedUser`` rows, one
+batch per transaction. They are deleted from ``auth_user`` and every table
+that cascades from it (profile, directory row, API token, ...). The deletes
+go through the usual signals, so archived accounts also leave the
+directory, statistics, caches and change feed until they come back. Staff
+accounts and holders of an API token issued after the cutoff are kept;
+signed API tokens count through ``last_login``, which obtaining and
+refreshing them update.
+
+``ArchiveBackend`` restores an account when its owner logs in, and the
+password reset form when they ask for a reset: the user and profile are
+recreated under their original ids with the same password hash. Archived
+usernames and emails stay reserved meanwhile.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.sessions.models import Session
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .models import ArchivedUser, Profile, TokenGeneration
+
+USER_FIELDS = ["username", "first_name", "last_name", "email", "password", "is_active", "date_joined", "last_login"]
+PROFILE_FIELDS = ["bio", "avatar_url", "location", "phone", "created_at"]
+DB_SESSION_ENGINES = {"django.contrib.sessions.backends.db", "django.contrib.sessions.backends.cached_db"}
+
+
+def archive_cutoff(days=None):
+    return timezone.now() - timedelta(days=settings.ARCHIVE_AFTER_DAYS if days is None else days)
+
+
+def cold_users(cutoff):
+    """Users eligible for archiving: not seen since ``cutoff``, not staff, no recent API token."""
+    recent_token = Token.objects.filter(user=OuterRef("pk"), created__gte=cutoff)
+    return (
+        User.objects.filter(is_staff=False, is_superuser=False)
+        .alias(last_seen=Coalesce("last_login", "date_joined"))
+        .filter(last_seen__lt=cutoff)
+        .exclude(Exists(recent_token))
+    )
+
+
+def _related(user, name):
+    try:
+        return getattr(user, name)
+    except (Profile.DoesNotExist, TokenGeneration.DoesNotExist):
+        return None
+
+
+def _snapshot(user, groups, permissions):
+    profile = _related(user, "profile")
+    token_generation = _related(user, "token_generation")
+    return {
+        "user": {name: getattr(user, name) for name in USER_FIELDS},
+        "profile": {"id": profile.pk, **{name: getattr(profile, name) for name in PROFILE_FIELDS}} if profile else None,
+        "groups": groups.get(user.pk, []),
+        "permissions": permissions.get(user.pk, []),
+        "token_generation": token_generation.generation if token_generation else 0,
+    }
+
+
+def _memberships(through, field, user_ids):
+    memberships = {}
+    for user_id, related_id in through.objects.filter(user_id__in=user_ids).values_list("user_id", field):
+        memberships.setdefault(user_id, []).append(related_id)
+    return memberships
+
+
+def archive_users(cutoff, batch_size=500):
+    """Move cold users into the archive, ``batch_size`` per transaction; return how many."""
+    archived = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            users = list(
+                cold_users(cutoff)
+                .filter(pk__gt=last_pk)
+                .select_related("profile", "token_generation")
+                .order_by("pk")[:batch_size]
+            )
+            if not users:
+                return archived
+            last_pk = users[-1].pk
+            ids = [user.pk for user in users]
+            groups = _memberships(User.groups.through, "group_id", ids)
+            permissions = _memberships(User.user_permissions.through, "permission_id", ids)
+            ArchivedUser.objects.bulk_create(
+                [
+                    ArchivedUser(
+                        id=user.pk,
+                        username=user.username,
+                        email=user.email,
+                        last_seen=user.last_login or user.date_joined,
+                        data=_snapshot(user, groups, permissions),
+                    )
+                    for user in users
+                ]
+            )
+            User.objects.filter(pk__in=ids).delete()
+            archived += len(users)
+
+
+def _batched_delete(queryset, batch_size):
+    deleted = 0
+    while pks := list(queryset.values_list("pk", flat=True)[:batch_size]):
+        deleted += queryset.model.objects.filter(pk__in=pks).delete()[0]
+    return deleted
+
+
+def purge_expired_sessions(batch_size=1000):
+    """Delete expired database sessions in batches; a no-op for other session engines."""
+    if settings.SESSION_ENGINE not in DB_SESSION_ENGINES:
+        return 0
+    return _batched_delete(Session.objects.filter(expire_date__lt=timezone.now()), batch_size)
+
+
+def purge_stale_tokens(cutoff, batch_size=1000):
+    """Delete API tokens of deactivated users, and tokens issued before ``cutoff`` to users not seen since."""
+    stale = Token.objects.alias(last_seen=Coalesce("user__last_login", "user__date_joined")).filter(
+        Q(user__is_active=False) | Q(created__lt=cutoff, last_seen__lt=cutoff)
+    )
+    return _batched_delete(stale, batch_size)
+
+
+def _value(model, name, value):
+    return model._meta.get_field(name).to_python(value)
+
+
+@transaction.atomic
+def restore_user(archived):
+    """Recreate an archived user, with their profile, under the original ids."""
+    data = archived.data
+    profile_fields = dict(data["profile"] or {})
+    user = User(id=archived.pk, **{name: _value(User, name, value) for name, value in data["user"].items()})
+    # Read by the post_save signal that creates the empty profile (absent from older archives)
+    user._restored_profile_id = profile_fields.pop("id", None)
+    user.save(force_insert=True)
+    user.groups.set(Group.objects.filter(pk__in=data["groups"]))
+    user.user_permissions.set(Permission.objects.filter(pk__in=data["permissions"]))
+    if data["profile"] is not None:
+        profile = Profile.objects.get(user=user)
+        for name, value in profile_fields.items():
+            setattr(profile, name, _value(Profile, name, value))
+        profile.save()
+    if data["token_generation"]:
+        TokenGeneration.objects.create(user=user, generation=data["token_generation"])
+    archived.delete()
+    return user
+
+
+def restore_by_email(email):
+    """Restore the active archived accounts registered with ``email``; return how many."""
+    restored = 0
+    for archived in ArchivedUser.objects.filter(email__iexact=email):
+        if not archived.data["user"]["is_active"]:
+            continue
+        try:
+            restore_user(archived)
+        except IntegrityError:
+            # Restored by a concurrent login or reset
+            continue
+        restored += 1
+    return restored
+
+
+def username_reserved(username):
+    """Whether an archived account holds this username (case-insensitively, as registration checks)."""
+    return ArchivedUser.objects.filter(username__iexact=username).exists()
+
+
+def email_reserved(email):
+    return ArchivedUser.objects.filter(email=email).exists()
+
+
+class ArchiveBackend(ModelBackend):
+    """``ModelBackend`` that restores an archived account on a successful login."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username=username, password=password, **kwargs)
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if user is not None or username is None or password is None:
+            return user
+        archived = ArchivedUser.objects.filter(username=username).first()
+        if archived is None:
+            # Hash anyway, as ModelBackend does for unknown users, so the
+            # response time does not tell which usernames are archived.
+            User().set_password(password)
+            return None
+        if not check_password(password, archived.data["user"]["password"]) or not archived.data["user"]["is_active"]:
+            return None
+        try:
+            user = restore_user(archived)
+        except IntegrityError:
+            # Restored by a concurrent login
+            user = User.objects.filter(username=username).first()
+        return user if user is not None and self.user_can_authenticate(user) else None
@@ -0,0 +1,80 @@
+import re
+from functools import cache
+
+from django.conf import settings
+
+# Project stylesheets, concatenated in this order into the bundle.
+CSS_SOURCES = ["css/main.css"]
+BUNDLE_NAME = "dist/css/bundle.min.css"
+CRITICAL_NAME = "dist/css/critical.min.css"
+
+# Sections of main.css ("/* --- Name --- */") needed to render the page
+# shell above the fold; they are inlined into base.html.
+CRITICAL_SECTIONS = {"CSS Variables", "Skip to Content", "Reset & Base", "Navbar", "Page Wrapper"}
+
+_TOKEN_RE = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|(/\*.*?\*/)""", re.DOTALL)
+_SECTION_RE = re.compile(r"^/\* --- (.+?) --- \*/$", re.MULTILINE)
+
+
+def _squeeze(text):
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+    text = re.sub(r":\s+", ":", text)
+    return text.replace(";}", "}")
+
+
+def minify_css(css):
+    """Strip comments and redundant whitespace, leaving string literals intact."""
+    parts = []
+    position = 0
+    for match in _TOKEN_RE.finditer(css):
+        parts.append(_squeeze(css[position : match.start()]))
+        if match.group(1):
+            parts.append(match.group(1))
+        position = match.end()
+    parts.append(_squeeze(css[position:]))
+    return "".join(parts).strip()
+
+
+def split_sections(css):
+    """Map each "/* --- Name --- */" section of a stylesheet to its rules."""
+    headers = list(_SECTION_RE.finditer(css))
+    sections = {}
+    for index, header in enumerate(headers):
+        end = headers[index + 1].start() if index + 1 < len(headers) else len(css)
+        sections[header.group(1)] = css[header.end() : end]
+    return sections
+
+
+def static_dir():
+    return settings.STATICFILES_DIRS[0]
+
+
+def build_assets(directory=None):
+    """Write the minified bundle and critical CSS; returns the written paths.
+
+    Outputs go to ``dist/`` inside the project static directory so that
+    collectstatic hashes and precompresses them like any other file.
+    """
+    directory = directory or static_dir()
+    sources = [(directory / name).read_text(encoding="utf-8") for name in CSS_SOURCES]
+
+    critical = "".join(
+        rules for css in sources for name, rules in split_sections(css).items() if name in CRITICAL_SECTIONS
+    )
+    outputs = {BUNDLE_NAME: "\n".join(sources), CRITICAL_NAME: critical}
+
+    written = []
+    for name, css in outputs.items():
+        path = directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(minify_css(css), encoding="utf-8")
+        written.append(path)
+    return written
+
+
+@cache
+def critical_css():
+    """Return the built critical CSS, or an empty string if assets were not built."""
+    path = static_dir() / CRITICAL_NAME
+    return path.read_text(encoding="utf-8") if path.exists() else ""
@@ -0,0 +1,46 @@
+from drf_spectacular.extensions import OpenApiAuthenticationExtension
+from rest_framework import authentication, exceptions
+
+from .signed_tokens import ACCESS, TokenError, current_generation, verify
+from .usercache import get_cached_user
+
+
+class SignedTokenAuthentication(authentication.BaseAuthentication):
+    """Authenticate ``Authorization: Bearer <access token>`` signed tokens.
+
+    The signature and expiry are checked in-process; the revocation
+    generation and the user come from the cache, so a warm request makes no
+    database query. Requests with other schemes are left to the next class.
+    """
+
+    keyword = "Bearer"
+
+    def authenticate(self, request):
+        auth = authentication.get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+        try:
+            claims = verify(auth[1].decode("ascii"), ACCESS)
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed("Invalid token.") from None
+        except TokenError as exc:
+            raise exceptions.AuthenticationFailed(str(exc)) from None
+        user = get_cached_user(claims.user_id)
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+        if claims.generation != current_generation(claims.user_id):
+            raise exceptions.AuthenticationFailed("Token has been revoked.")
+        return user, claims
+
+    def authenticate_header(self, request):
+        return f'{self.keyword} realm="api"'
+
+
+class SignedTokenAuthenticationScheme(OpenApiAuthenticationExtension):
+    target_class = SignedTokenAuthentication
+    name = "signedTokenAuth"
+
+    def get_security_definition(self, auto_schema):
+        return {"type": "http", "scheme": "bearer", "description": "Signed access token from /api/token/"}
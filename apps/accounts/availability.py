@@ -0,0 +1,136 @@
+"""Username and email availability checks for live registration validation.
+
+Each worker keeps an in-memory Bloom filter of the normalized usernames and
+emails in use. A miss means "available" without touching the database; only
+a possible hit is confirmed with the query the registration form itself runs,
+so false positives and deleted users cost one indexed lookup.
+
+The filter is built from the users and archived users tables on first use
+and updated by user saves in this process. Every ``SYNC_INTERVAL`` seconds it also adds the users
+created through other workers since (a primary key range query), and it is
+rebuilt when it fills up or every ``REBUILD_INTERVAL`` seconds, which picks
+up emails changed elsewhere.
+"""
+
+import hashlib
+import threading
+import time
+
+from django.contrib.auth.models import User
+
+from .archive import email_reserved, username_reserved
+from .breached import filter_size, positions
+from .models import ArchivedUser
+
+USERNAME = "username"
+EMAIL = "email"
+# The User fields the filter holds
+TAKEN_FIELDS = frozenset({USERNAME, EMAIL})
+ERROR_RATE = 0.01
+# The filter is sized for twice the current users, and at least this many
+MIN_CAPACITY = 10_000
+SYNC_INTERVAL = 30
+REBUILD_INTERVAL = 3600
+
+
+def normalize(kind, value):
+    value = value.strip()
+    return value.casefold() if kind == USERNAME else value.lower()
+
+
+def _digest(kind, value):
+    return hashlib.blake2b(f"{kind}:{normalize(kind, value)}".encode(), digest_size=16).digest()
+
+
+class TakenFilter:
+    """Bloom filter of (kind, value) pairs; ``(kind, value) in taken`` may give false positives."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.count = 0
+        self.m, self.k = filter_size(capacity, ERROR_RATE)
+        self.bits = bytearray(self.m // 8)
+
+    def add(self, kind, value):
+        if not value:
+            return
+        bits = self.bits
+        added = False
+        for pos in positions(_digest(kind, value), self.m, self.k):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                bits[pos >> 3] |= 1 << (pos & 7)
+                added = True
+        # Values already in the filter (e.g. saved again) do not fill it up
+        self.count += added
+
+    def add_user(self, username, email):
+        self.add(USERNAME, username)
+        self.add(EMAIL, email)
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in positions(_digest(*item), self.m, self.k))
+
+    @property
+    def full(self):
+        return self.count > self.capacity
+
+
+_lock = threading.Lock()
+_filter = None
+_last_id = 0
+_sync_at = 0.0
+_rebuild_at = 0.0
+
+
+def _add_users_after(taken, last_id):
+    for pk, username, email in (
+        User.objects.filter(pk__gt=last_id).order_by("pk").values_list("pk", "username", "email").iterator()
+    ):
+        taken.add_user(username, email)
+        last_id = pk
+    return last_id
+
+
+def get_filter():
+    """Return this worker's filter, building or topping it up when due."""
+    global _filter, _last_id, _sync_at, _rebuild_at
+    now = time.monotonic()
+    if _filter is not None and now < _sync_at and not _filter.full:
+        return _filter
+    with _lock:
+        if _filter is None or _filter.full or now >= _rebuild_at:
+            # Two entries per user
+            taken = TakenFilter(max(4 * (User.objects.count() + ArchivedUser.objects.count()), MIN_CAPACITY))
+            for username, email in ArchivedUser.objects.values_list("username", "email").iterator():
+                taken.add_user(username, email)
+            _last_id = _add_users_after(taken, 0)
+            _filter = taken
+            _rebuild_at = now + REBUILD_INTERVAL
+        elif now >= _sync_at:
+            _last_id = _add_users_after(_filter, _last_id)
+        _sync_at = now + SYNC_INTERVAL
+        return _filter
+
+
+def reset_filter():
+    """Drop the filter so the next check rebuilds it."""
+    global _filter
+    _filter = None
+
+
+def user_saved(username, email):
+    # A filter that is not loaded yet reads the committed users when built.
+    taken = _filter
+    if taken is not None:
+        taken.add_user(username, email)
+
+
+def is_taken(kind, value):
+    """Whether registering with this username or email would fail the form's uniqueness check."""
+    if (kind, value) not in get_filter():
+        return False
+    value = value.strip()
+    if kind == USERNAME:
+        return User.objects.filter(username__iexact=value).exists() or username_reserved(value)
+    return User.objects.filter(email=value).exists() or email_reserved(value)
@@ -0,0 +1,257 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+AVATAR_SIZES = (32, 64, 128)
+MAX_SOURCE_BYTES = 5 * 1024 * 1024
+# Decoding allocates about 4 bytes per pixel, whatever the compressed size
+MAX_SOURCE_PIXELS = 4096 * 4096
+FETCH_TIMEOUT = 5
+# Seconds before a URL that could not be cached is tried again
+FAILURE_TTL = 3600
+# Seconds between eviction scans in a process
+EVICT_INTERVAL = 300
+
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = set()
+_next_evict = 0.0
+
+
+class AvatarError(Exception):
+    pass
+
+
+class _PinnedAddress:
+    """Connect to an address that has already been checked, not to whatever the host resolves to now.
+
+    The Host header, and for HTTPS the SNI name and certificate check, still use the host name.
+    """
+
+    def __init__(self, host, address, **kwargs):
+        super().__init__(host, **kwargs)
+        self._create_connection = lambda target, *args: socket.create_connection((address, target[1]), *args)
+
+
+class _PinnedHTTPConnection(_PinnedAddress, http.client.HTTPConnection):
+    pass
+
+
+class _PinnedHTTPSConnection(_PinnedAddress, http.client.HTTPSConnection):
+    pass
+
+
+def cache_dir():
+    return settings.AVATAR_CACHE_DIR
+
+
+def url_key(url):
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def _index_path(url):
+    key = url_key(url)
+    return cache_dir() / "index" / key[:2] / key
+
+
+def variant_path(digest, size):
+    return cache_dir() / digest[:2] / f"{digest}-{size}.webp"
+
+
+def cached_digest(url):
+    """Return the content digest cached for ``url``, or None if not fetched yet."""
+    try:
+        return _index_path(url).read_text()
+    except FileNotFoundError:
+        return None
+
+
+def avatar_urls(url):
+    """Return the local URLs of all size variants of ``url`` by size, or None if it is not cached.
+
+    One file read: an index entry exists only while all its variants do.
+    """
+    digest = cached_digest(url) if url else None
+    if digest is None:
+        return None
+    return {size: reverse("accounts:avatar", args=[digest, size]) for size in AVATAR_SIZES}
+
+
+def avatar_url(url, size):
+    """Return the local URL of the ``size`` variant of ``url`` if it is cached."""
+    urls = avatar_urls(url)
+    return urls[size] if urls else None
+
+
+def _resolve(parts):
+    """Return the address to connect to, refusing hosts that resolve to any non-public address."""
+    infos = socket.getaddrinfo(parts.hostname, parts.port or 443, proto=socket.IPPROTO_TCP)
+    addresses = [info[4][0] for info in infos]
+    if not getattr(settings, "AVATAR_ALLOW_PRIVATE_HOSTS", False):
+        for address in addresses:
+            if not ipaddress.ip_address(address).is_global:
+                raise AvatarError(f"Avatar host {parts.hostname} is not public")
+    return addresses[0]
+
+
+def _download(url):
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise AvatarError(f"Unsupported avatar URL {url!r}")
+    # The checked address is the one connected to; resolving again could
+    # return an internal address (DNS rebinding).
+    connection_class = _PinnedHTTPSConnection if parts.scheme == "https" else _PinnedHTTPConnection
+    connection = connection_class(parts.hostname, _resolve(parts), port=parts.port, timeout=FETCH_TIMEOUT)
+    path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    try:
+        connection.request("GET", path, headers={"User-Agent": "AuthProfile avatar fetcher"})
+        response = connection.getresponse()
+        # Redirects are refused: the target would skip the address check.
+        if response.status != 200:
+            raise AvatarError(f"{url} returned HTTP {response.status}")
+        if not response.headers.get_content_type().startswith("image/"):
+            raise AvatarError(f"{url} is not an image")
+        data = response.read(MAX_SOURCE_BYTES + 1)
+    except (OSError, http.client.HTTPException) as exc:
+        raise AvatarError(f"Could not download {url}: {exc}") from exc
+    finally:
+        connection.close()
+    if len(data) > MAX_SOURCE_BYTES:
+        raise AvatarError(f"{url} exceeds {MAX_SOURCE_BYTES} bytes")
+    return data
+
+
+def _resize(data, sizes):
+    """Decode ``data`` once and return a WebP thumbnail for each of ``sizes``."""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        width, height = image.size
+        if width * height > MAX_SOURCE_PIXELS:
+            raise AvatarError(f"Image of {width}x{height} pixels is too large")
+        image = ImageOps.exif_transpose(image).convert("RGBA")
+    thumbnails = {}
+    for size in sizes:
+        out = io.BytesIO()
+        ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS).save(out, "WEBP", quality=85)
+        thumbnails[size] = out.getvalue()
+    return thumbnails
+
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def fetch_avatar(url):
+    """Download, validate and store all size variants of ``url``; returns the digest."""
+    from PIL import Image
+
+    data = _download(url)
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.verify()
+    except Exception as exc:
+        raise AvatarError(f"{url} is not a valid image") from exc
+
+    digest = hashlib.sha256(data).hexdigest()
+    missing = [size for size in AVATAR_SIZES if not variant_path(digest, size).exists()]
+    if missing:
+        for size, thumbnail in _resize(data, missing).items():
+            _write_atomic(variant_path(digest, size), thumbnail)
+    # The index entry is written last so readers never see a partial set.
+    _write_atomic(_index_path(url), digest.encode())
+    return digest
+
+
+def evict(max_bytes=None):
+    """Delete the least recently used variant sets until the cache fits ``max_bytes``.
+
+    Serving a variant refreshes its mtime, which serves as the LRU clock.
+    The index entries pointing at an evicted set are removed before its
+    files, so an index entry always has all its variants. Returns the number
+    of files removed.
+    """
+    max_bytes = max_bytes if max_bytes is not None else settings.AVATAR_CACHE_MAX_BYTES
+    sets = defaultdict(lambda: [0.0, 0, []])
+    for path in cache_dir().glob("*/*.webp"):
+        stat = path.stat()
+        entry = sets[path.name.partition("-")[0]]
+        entry[0] = max(entry[0], stat.st_mtime)
+        entry[1] += stat.st_size
+        entry[2].append(path)
+    total = sum(size for _, size, _ in sets.values())
+    evicted = []
+    for digest, (_, size, _) in sorted(sets.items(), key=lambda item: item[1][0]):
+        if total <= max_bytes:
+            break
+        evicted.append(digest)
+        total -= size
+    if not evicted:
+        return 0
+    evicted_set = set(evicted)
+    for index in cache_dir().glob("index/*/*"):
+        try:
+            if index.read_text() in evicted_set:
+                index.unlink(missing_ok=True)
+        except FileNotFoundError:
+            pass
+    removed = 0
+    for digest in evicted:
+        for path in sets[digest][2]:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+def _failure_key(url):
+    return f"avatar:failed:{url_key(url)}"
+
+
+def _fetch_in_background(url):
+    global _next_evict
+    try:
+        fetch_avatar(url)
+    except Exception:
+        logger.warning("Could not cache avatar %s", url, exc_info=True)
+        # Without this every page showing the avatar would fetch it again.
+        cache.set(_failure_key(url), True, FAILURE_TTL)
+    else:
+        # Scanning the whole cache after every fetch would cost more than the fetch.
+        if time.monotonic() >= _next_evict:
+            _next_evict = time.monotonic() + EVICT_INTERVAL
+            evict()
+    finally:
+        with _executor_lock:
+            _in_flight.discard(url)
+
+
+def schedule_fetch(url):
+    """Queue ``url`` for fetching on the avatar thread pool unless already queued or recently failed."""
+    global _executor
+    if cache.get(_failure_key(url)):
+        return None
+    with _executor_lock:
+        if url in _in_flight:
+            return None
+        _in_flight.add(url)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="avatar")
+    return _executor.submit(_fetch_in_background, url)
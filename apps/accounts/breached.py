@@ -0,0 +1,173 @@
+"""Breached and common password checks against a memory-mapped Bloom filter.
+
+The filter holds SHA-1 digests, the format of the Have I Been Pwned
+password lists. It is compiled ahead of time by
+``build_password_filter`` and opened with ``mmap``. All workers on a host
+share the page cache instead of each loading a list into a Python set. A
+lookup reads ``k`` bytes, so it takes microseconds even for hundreds of
+millions of entries. False positives happen at the rate chosen at build
+time; false negatives never do.
+
+File layout: ``MAGIC``, then the bit count ``m``, the probe count ``k`` and
+the entry count ``n`` as little-endian unsigned integers, then ``m / 8``
+bytes of bits.
+"""
+
+import gzip
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from functools import cache
+from pathlib import Path
+
+import django.contrib.auth
+from django.conf import settings
+from django.contrib.auth.password_validation import CommonPasswordValidator
+from django.core.exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PWBLOOM1"
+HEADER = struct.Struct("<8sQIQ")
+# Seconds between checks for a rebuilt filter file
+RELOAD_INTERVAL = 60
+# The list CommonPasswordValidator loads by default
+COMMON_PASSWORDS_PATH = Path(django.contrib.auth.__file__).resolve().parent / "common-passwords.txt.gz"
+
+
+def password_digest(password):
+    return hashlib.sha1(password.encode()).digest()  # noqa: S324 - the lists are SHA-1
+
+
+def positions(digest, m, k):
+    # SHA-1 output is uniform, so two of its words drive double hashing directly.
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:16], "little") | 1
+    return [(h1 + i * h2) % m for i in range(k)]
+
+
+class BloomFilter:
+    """Read-only view of a filter file; ``digest in bloom`` tests membership."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.m, self.k, self.n = HEADER.unpack_from(self._map)
+        if magic != MAGIC or len(self._map) != HEADER.size + self.m // 8:
+            self._map.close()
+            raise ValueError(f"{self.path} is not a password filter file.")
+        self.mtime = os.stat(self.path).st_mtime_ns
+
+    def __contains__(self, digest):
+        bits = self._map
+        offset = HEADER.size
+        return all(bits[offset + (pos >> 3)] & (1 << (pos & 7)) for pos in positions(digest, self.m, self.k))
+
+    def close(self):
+        self._map.close()
+
+
+def filter_size(count, error_rate):
+    """Return (bits, probes) for ``count`` entries at the given false positive rate."""
+    count = max(count, 1)
+    bits = math.ceil(-count * math.log(error_rate) / math.log(2) ** 2)
+    bits = (bits + 7) // 8 * 8
+    probes = min(max(round(bits / count * math.log(2)), 1), 30)
+    return bits, probes
+
+
+def build_filter(digests, count, path, error_rate=0.001):
+    """Write a filter of the SHA-1 ``digests`` (about ``count`` of them) to ``path``.
+
+    The file is written next to the target and moved into place, so workers
+    that have the old file mapped keep reading it until they reload.
+    """
+    m, k = filter_size(count, error_rate)
+    bits = bytearray(m // 8)
+    added = 0
+    for digest in digests:
+        for pos in positions(digest, m, k):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        added += 1
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as fh:
+        fh.write(HEADER.pack(MAGIC, m, k, added))
+        fh.write(bits)
+    os.replace(tmp, path)
+    return added
+
+
+def common_password_digests():
+    """SHA-1 digests of Django's built-in common password list."""
+    with gzip.open(COMMON_PASSWORDS_PATH, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            yield password_digest(line.strip())
+
+
+_lock = threading.Lock()
+_filters = {}
+
+
+def get_filter(path=None):
+    """Return the shared filter for ``path`` (default ``PASSWORD_FILTER_PATH``), or None if not built.
+
+    A rebuilt file is picked up within ``RELOAD_INTERVAL`` seconds.
+    """
+    path = Path(path or settings.PASSWORD_FILTER_PATH)
+    now = time.monotonic()
+    entry = _filters.get(path)
+    if entry is not None and now < entry[1]:
+        return entry[0]
+    with _lock:
+        current = entry[0] if entry else None
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime is None:
+            current = None
+        elif current is None or current.mtime != mtime:
+            try:
+                current = BloomFilter(path)
+            except ValueError:
+                logger.exception("Ignoring invalid password filter")
+                current = None
+        _filters[path] = (current, now + RELOAD_INTERVAL)
+        return current
+
+
+class BreachedPasswordValidator:
+    """Reject passwords found in the breached/common password filter.
+
+    Replaces Django's ``CommonPasswordValidator`` once the filter is built
+    (``build_password_filter --common`` covers the same list). Until then
+    it falls back to that validator, so common passwords stay rejected.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+
+    def validate(self, password, user=None):
+        bloom = get_filter(self.path)
+        if bloom is None:
+            _fallback().validate(password, user)
+        elif any(password_digest(variant) in bloom for variant in {password, password.lower().strip()}):
+            raise ValidationError(
+                "This password is too common or has appeared in a data breach.",
+                code="password_breached",
+            )
+
+    def get_help_text(self):
+        return "Your password can’t be a commonly used or previously breached password."
+
+
+@cache
+def _fallback():
+    return CommonPasswordValidator()
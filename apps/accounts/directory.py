@@ -0,0 +1,97 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import UserDirectory
+
+BIO_SNIPPET_LENGTH = 100
+# User fields copied into the directory; saves touching only other fields
+# (e.g. login updating last_login) leave the directory alone.
+USER_FIELDS = {"username", "first_name", "last_name", "email", "date_joined"}
+# Profile columns of a user without a profile.
+EMPTY_PROFILE = {
+    "profile_id": None,
+    "location": "",
+    "bio_snippet": "",
+    "profile_created_at": None,
+    "profile_updated_at": None,
+    "profile_search_key": "",
+}
+
+
+def search_key(*values):
+    return " ".join(value.lower() for value in values if value)
+
+
+def directory_fields(user, profile=None):
+    """Return the UserDirectory column values for ``user`` and its profile."""
+    fields = {
+        "username": user.username,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "email": user.email,
+        "date_joined": user.date_joined,
+        "user_search_key": search_key(user.username, user.first_name, user.last_name),
+        **EMPTY_PROFILE,
+    }
+    if profile is not None:
+        fields.update(
+            profile_id=profile.pk,
+            location=profile.location,
+            bio_snippet=profile.bio[:BIO_SNIPPET_LENGTH],
+            profile_created_at=profile.created_at,
+            profile_updated_at=profile.updated_at,
+            profile_search_key=search_key(user.username, profile.location, profile.bio),
+        )
+    return fields
+
+
+def _upsert(rows, batch_size=1000):
+    # INSERT ... ON CONFLICT DO UPDATE: one statement per batch, no prior SELECT.
+    UserDirectory.objects.bulk_create(
+        rows,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=list(directory_fields(User())),
+    )
+
+
+def sync_directory(user, profile=None):
+    """Upsert the directory row of ``user`` from already-loaded instances."""
+    _upsert([UserDirectory(user_id=user.pk, **directory_fields(user, profile))])
+
+
+def sync_users(user_ids, batch_size=1000):
+    """Upsert directory rows for many users, for bulk paths that bypass signals."""
+    users = User.objects.filter(pk__in=user_ids).select_related("profile")
+    rows = [UserDirectory(user_id=user.pk, **directory_fields(user, getattr(user, "profile", None))) for user in users]
+    _upsert(rows, batch_size)
+    return len(rows)
+
+
+def clear_profile(user_id):
+    """Drop the profile columns of a user's row after the profile is deleted.
+
+    This only updates, so it is safe while the user itself is being deleted.
+    """
+    UserDirectory.objects.filter(user_id=user_id).update(**EMPTY_PROFILE)
+
+
+def rebuild_directory(batch_size=1000):
+    """Recreate the whole directory from User and Profile; returns the row count."""
+    total = 0
+    with transaction.atomic():
+        UserDirectory.objects.all().delete()
+        last_pk = 0
+        while True:
+            users = list(User.objects.filter(pk__gt=last_pk).select_related("profile").order_by("pk")[:batch_size])
+            if not users:
+                break
+            rows = [
+                UserDirectory(user_id=user.pk, **directory_fields(user, getattr(user, "profile", None)))
+                for user in users
+            ]
+            UserDirectory.objects.bulk_create(rows)
+            total += len(rows)
+            last_pk = users[-1].pk
+    return total
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import threading
+
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 100
+
+
+class Subscriber:
+    """A single stream client: a bounded queue bound to the client's event loop."""
+
+    def __init__(self, loop, profile_ids=None, maxsize=QUEUE_SIZE):
+        self.loop = loop
+        self.profile_ids = profile_ids
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def wants(self, event):
+        return self.profile_ids is None or event["id"] in self.profile_ids
+
+    def offer(self, event):
+        """Queue ``event``; a client that has fallen ``maxsize`` events behind is dropped.
+
+        Must run on the subscriber's loop.
+        """
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class EventHub:
+    """In-process fan-out of profile change events to stream subscribers.
+
+    Events are published from synchronous code (signal handlers) and handed
+    to each subscriber's event loop, so an idle subscriber costs one queue
+    and one suspended coroutine. Only clients connected to the process that
+    performed the write see the event.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self, profile_ids=None, maxsize=QUEUE_SIZE):
+        subscriber = Subscriber(asyncio.get_running_loop(), profile_ids, maxsize)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = [subscriber for subscriber in self._subscribers if subscriber.wants(event)]
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+            except RuntimeError:
+                # The client's loop has shut down.
+                self.unsubscribe(subscriber)
+
+    async def stream(self, subscriber, heartbeat=HEARTBEAT_SECONDS):
+        """Yield server-sent event frames for ``subscriber`` until it is dropped."""
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+                except TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                if event is None:
+                    yield "event: dropped\ndata: {}\n\n"
+                    return
+                yield f"event: profile\ndata: {json.dumps(event)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+hub = EventHub()
@@ -0,0 +1,49 @@
+from rest_framework import filters
+
+from .models import UserDirectory
+
+
+class DirectorySearchFilter(filters.SearchFilter):
+    """Search the precomputed lowercase search key of the UserDirectory.
+
+    The view names the column in ``directory_search_field``. Terms are
+    lowercased and matched with a plain ``contains`` on that one column, which
+    is equivalent to ``icontains`` across the fields the key was built from.
+    Querysets of other models are left untouched.
+    """
+
+    def get_search_fields(self, view, request):
+        return [view.directory_search_field]
+
+    def get_search_terms(self, request):
+        return [term.lower() for term in super().get_search_terms(request)]
+
+    def construct_search(self, field_name, queryset):
+        return f"{field_name}__contains"
+
+    def filter_queryset(self, request, queryset, view):
+        if queryset.model is not UserDirectory:
+            return queryset
+        return super().filter_queryset(request, queryset, view)
+
+
+class DirectoryOrderingFilter(filters.OrderingFilter):
+    """OrderingFilter that maps the view's public ordering fields to directory columns.
+
+    ``directory_ordering_map`` on the view maps API names to UserDirectory
+    columns where they differ.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if queryset.model is not UserDirectory:
+            return super().filter_queryset(request, queryset, view)
+        ordering = self.get_ordering(request, queryset, view)
+        if not ordering:
+            return queryset
+        mapping = getattr(view, "directory_ordering_map", {})
+        columns = []
+        for term in ordering:
+            descending = term.startswith("-")
+            column = mapping.get(term.lstrip("-"), term.lstrip("-"))
+            columns.append(f"-{column}" if descending else column)
+        return queryset.order_by(*columns)
@@ -1,8 +1,15 @@
 from django import forms
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import PasswordResetForm, UserCreationForm
 from django.contrib.auth.models import User
+from django.template.loader import render_to_string
+from django.urls import reverse_lazy
 
+from apps.jobs.queue import enqueue
+
+from .archive import email_reserved, restore_by_email, username_reserved
 from .models import Profile
+from .tasks import send_email
+from .tracking import record_write
 
 
 class RegisterForm(UserCreationForm):
@@ -14,9 +21,22 @@ class RegisterForm(UserCreationForm):
         model = User
         fields = ["username", "first_name", "last_name", "email", "password1", "password2"]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Checked live against /api/availability/ before the form is posted
+        for name in ("username", "email"):
+            self.fields[name].widget.attrs["data-availability"] = name
+
+    def clean_username(self):
+        username = super().clean_username()
+        # Held by an archived account until it logs in again
+        if username and username_reserved(username):
+            raise self.instance.unique_error_message(User, ["username"])
+        return username
+
     def clean_email(self):
         email = self.cleaned_data.get("email")
-        if User.objects.filter(email=email).exists():
+        if User.objects.filter(email=email).exists() or email_reserved(email):
             raise forms.ValidationError("A user with this email already exists.")
         return email
 
@@ -27,6 +47,14 @@ class ProfileForm(forms.ModelForm):
         fields = ["bio", "avatar_url", "location", "phone"]
         widgets = {
             "bio": forms.Textarea(attrs={"rows": 4}),
+            # Suggestions are filled in from /api/locations/ as the user types
+            "location": forms.TextInput(
+                attrs={
+                    "list": "location-suggestions",
+                    "autocomplete": "off",
+                    "data-suggest-url": reverse_lazy("location-autocomplete"),
+                }
+            ),
         }
 
 
@@ -42,3 +70,37 @@ class UserUpdateForm(forms.ModelForm):
         if User.objects.filter(email=email).exclude(pk=self.instance.pk).exists():
             raise forms.ValidationError("A user with this email already exists.")
         return email
+
+    def save(self, commit=True):
+        """Write only the changed columns, and nothing at all if the form is unchanged."""
+        if not commit:
+            return super().save(commit=False)
+        record_write(User._meta.label, self.has_changed())
+        if self.has_changed():
+            self.instance.save(update_fields=self.changed_data)
+        return self.instance
+
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    """Render the reset email in the request and leave delivery to a job."""
+
+    def get_users(self, email):
+        # Archived accounts come back, so their owners can reset and sign in
+        restore_by_email(email)
+        return super().get_users(email)
+
+    def send_mail(
+        self, subject_template_name, email_template_name, context, from_email, to_email, html_email_template_name=None
+    ):
+        subject = "".join(render_to_string(subject_template_name, context).splitlines())
+        body = render_to_string(email_template_name, context)
+        html = render_to_string(html_email_template_name, context) if html_email_template_name else None
+        enqueue(
+            send_email,
+            subject=subject,
+            body=body,
+            from_email=from_email,
+            recipients=[to_email],
+            html_message=html,
+            priority=10,
+        )
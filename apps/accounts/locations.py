@@ -0,0 +1,114 @@
+"""In-process prefix index of profile locations for autocomplete.
+
+Locations are folded to a normalized key (case-folded, whitespace collapsed)
+and the distinct keys kept in a sorted list, so a prefix lookup is a bisect
+plus a scan of the matching run, with no database access. Each key remembers
+how many profiles use each spelling; the most common one is displayed.
+
+The index is loaded from the location counters kept by ``stats`` (one
+indexed query), adjusted in place as profiles are saved in this process and
+reloaded every ``REFRESH_INTERVAL`` seconds to pick up saves made by other
+workers.
+"""
+
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+
+from .models import StatCounter
+
+# Seconds before the index is reloaded from the counters
+REFRESH_INTERVAL = 300
+# Sorts after any character a normalized location can contain
+_HIGHEST = "\U0010ffff"
+
+
+def normalize(location):
+    return " ".join(location.split()).casefold()
+
+
+class LocationIndex:
+    """Distinct locations with user counts, searchable by prefix."""
+
+    def __init__(self, counts=()):
+        self._lock = threading.Lock()
+        self._spellings = {}
+        for location, users in counts:
+            key = normalize(location)
+            if key and users > 0:
+                self._spellings.setdefault(key, Counter())[location.strip()] += users
+        self._keys = sorted(self._spellings)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def adjust(self, location, delta):
+        """Add ``delta`` users to ``location``, inserting or dropping its key as needed."""
+        key = normalize(location)
+        if not key or not delta:
+            return
+        with self._lock:
+            spellings = self._spellings.get(key)
+            if spellings is None:
+                if delta < 0:
+                    return
+                spellings = self._spellings[key] = Counter()
+                insort(self._keys, key)
+            spelling = location.strip()
+            spellings[spelling] += delta
+            if spellings[spelling] <= 0:
+                del spellings[spelling]
+            if not spellings:
+                del self._spellings[key]
+                del self._keys[bisect_left(self._keys, key)]
+
+    def search(self, prefix="", limit=10):
+        """The ``limit`` most used locations starting with ``prefix``, as (location, users) pairs."""
+        key = normalize(prefix)
+        keys = self._keys
+        matches = keys[bisect_left(keys, key) : bisect_left(keys, key + _HIGHEST)]
+        rows = []
+        for match in matches:
+            spellings = self._spellings.get(match)
+            if spellings:
+                rows.append((spellings.most_common(1)[0][0], spellings.total()))
+        return heapq.nsmallest(limit, rows, key=lambda row: (-row[1], normalize(row[0])))
+
+
+_lock = threading.Lock()
+_index = None
+_expires = 0.0
+
+
+def load_index():
+    counters = StatCounter.objects.filter(kind=StatCounter.Kind.LOCATION, value__gt=0)
+    return LocationIndex(counters.values_list("key", "value"))
+
+
+def get_index():
+    """Return this process's index, loading it when missing or due for a refresh."""
+    global _index, _expires
+    now = time.monotonic()
+    if _index is not None and now < _expires:
+        return _index
+    with _lock:
+        if _index is None or now >= _expires:
+            _index = load_index()
+            _expires = now + REFRESH_INTERVAL
+        return _index
+
+
+def reset_index():
+    """Drop the index so the next lookup reloads it."""
+    global _index
+    _index = None
+
+
+def location_changed(location, delta):
+    # Only an index that is already loaded needs adjusting; a new one reads
+    # the committed counters.
+    index = _index
+    if index is not None:
+        index.adjust(location, delta)
@@ -0,0 +1,266 @@
+import hashlib
+import ipaddress
+import os
+import sqlite3
+import threading
+import time
+from functools import cache, wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.shortcuts import redirect
+
+# Failures allowed per key kind within the shortest window. Longer windows
+# allow proportionally more (see LOGIN_GUARD_WINDOWS), which makes the
+# lockout progressive: a key that keeps failing stays locked for longer.
+# Only pairs and usernames are ever locked; an IP or subnet over its limit
+# tightens the pair and username limits of its requests to SUSPECT_LIMITS.
+DEFAULT_LIMITS = {"pair": 5, "username": 20, "ip": 50, "subnet": 200}
+SUSPECT_LIMITS = {"pair": 2, "username": 10}
+# (window seconds, limit multiplier)
+DEFAULT_WINDOWS = [(300, 1), (3600, 4), (86400, 16)]
+LOCKED_KINDS = ("pair", "username")
+SOURCE_KINDS = ("ip", "subnet")
+# Cells per query, well below SQLite's bound parameter limit
+QUERY_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sketch_cells (cell INTEGER PRIMARY KEY, period INTEGER NOT NULL, count INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS hot_keys (kind TEXT NOT NULL, key TEXT NOT NULL, count REAL NOT NULL, seen REAL NOT NULL,
+    PRIMARY KEY (kind, key));
+"""
+
+
+class LoginGuard:
+    """Track failed logins per (username, IP), username, IP and subnet.
+
+    Counts live in a count-min sketch in a SQLite file shared by all workers
+    on a host: per window, ``depth`` rows of ``width`` counters for the
+    current and the previous period. The file therefore holds at most
+    ``2 * len(windows) * depth * width`` counters however many distinct keys
+    an attack uses, and it is not the cache, so a flood of keys cannot push
+    other state out. A check is one query and a failure one transaction of
+    fixed size. The estimate per window is the current period plus the
+    previous one weighted by how much of it the window still covers;
+    collisions can overcount, never undercount. Cells are chosen by a hash
+    keyed with ``secret``.
+
+    The hottest keys, in plain text for the staff view, are kept in a table
+    of at most ``hot_size`` rows. Their ranking decays over the longest
+    window, so keys that stopped failing make room for new ones.
+    """
+
+    def __init__(
+        self,
+        limits=None,
+        windows=None,
+        suspect_limits=None,
+        width=1 << 15,
+        depth=4,
+        hot_size=50,
+        secret=b"",
+        path=":memory:",
+    ):
+        self.limits = limits or DEFAULT_LIMITS
+        self.suspect_limits = suspect_limits or SUSPECT_LIMITS
+        self.windows = windows or DEFAULT_WINDOWS
+        self.width = width
+        self.depth = depth
+        self.hot_size = hot_size
+        self.secret = secret[:64]
+        self.path = str(path)
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # Connections are per thread and reopened after a fork, as in TieredCache.
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def keys_for(username, ip):
+        """The keys of an attempt; without a valid address there is no ip or subnet key to share."""
+        username = (username or "").strip().lower()
+        keys = {"pair": f"{username}|{ip}", "username": username}
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return keys
+        subnet = ipaddress.ip_network(f"{ip}/{24 if address.version == 4 else 64}", strict=False)
+        return {**keys, "ip": ip, "subnet": str(subnet)}
+
+    def _columns(self, kind, key):
+        digest = hashlib.blake2b(f"{kind}:{key}".encode(), digest_size=4 * self.depth, key=self.secret).digest()
+        return [
+            row * self.width + int.from_bytes(digest[4 * row : 4 * row + 4], "little") % self.width
+            for row in range(self.depth)
+        ]
+
+    def _cell(self, window_index, period, column):
+        # Two slots per window, alternating by period: current and previous
+        return (window_index * 2 + period % 2) * self.depth * self.width + column
+
+    def _read(self, db, cells):
+        values = {}
+        cells = list(dict.fromkeys(cells))
+        for start in range(0, len(cells), QUERY_CHUNK):
+            chunk = cells[start : start + QUERY_CHUNK]
+            rows = db.execute(
+                f"SELECT cell, period, count FROM sketch_cells WHERE cell IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            values.update((cell, (period, count)) for cell, period, count in rows)
+        return values
+
+    def _counts(self, db, entries, now):
+        """Estimates per window for each (kind, key) of ``entries``."""
+        columns = {entry: self._columns(*entry) for entry in entries}
+        periods = [int(now // window) for window, _ in self.windows]
+        values = self._read(
+            db,
+            [
+                self._cell(index, period - back, column)
+                for entry_columns in columns.values()
+                for index, period in enumerate(periods)
+                for back in (0, 1)
+                for column in entry_columns
+            ],
+        )
+
+        def count(index, period, column):
+            stored_period, stored = values.get(self._cell(index, period, column), (None, 0))
+            return stored if stored_period == period else 0
+
+        return {
+            entry: [
+                min(
+                    count(index, period, column) + count(index, period - 1, column) * (1 - now % window / window)
+                    for column in entry_columns
+                )
+                for index, (period, (window, _)) in enumerate(zip(periods, self.windows, strict=True))
+            ]
+            for entry, entry_columns in columns.items()
+        }
+
+    def _over_limit(self, limit, counts):
+        return any(count >= limit * multiplier for count, (_, multiplier) in zip(counts, self.windows, strict=True))
+
+    def _locked(self, keys, counts):
+        suspect = any(
+            self._over_limit(self.limits[kind], counts[kind, keys[kind]]) for kind in SOURCE_KINDS if kind in keys
+        )
+        limits = self.suspect_limits if suspect else self.limits
+        return any(self._over_limit(limits[kind], counts[kind, keys[kind]]) for kind in LOCKED_KINDS)
+
+    def is_locked(self, username, ip):
+        keys = self.keys_for(username, ip)
+        return self._locked(keys, self._counts(self._db, keys.items(), time.time()))
+
+    def record_failure(self, username, ip):
+        now = time.time()
+        keys = self.keys_for(username, ip)
+        periods = [int(now // window) for window, _ in self.windows]
+        cells = [
+            (self._cell(index, period, column), period)
+            for entry in keys.items()
+            for column in self._columns(*entry)
+            for index, period in enumerate(periods)
+        ]
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "INSERT INTO sketch_cells (cell, period, count) VALUES (?, ?, 1) ON CONFLICT (cell) DO UPDATE SET "
+                "count = CASE WHEN period = excluded.period THEN count + 1 ELSE 1 END, period = excluded.period",
+                cells,
+            )
+            counts = self._counts(db, keys.items(), now)
+            self._track_hot(db, {entry: counts[entry][-1] for entry in keys.items()}, now)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _track_hot(self, db, counts, now):
+        db.executemany(
+            "INSERT INTO hot_keys (kind, key, count, seen) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (kind, key) DO UPDATE SET count = excluded.count, seen = excluded.seen",
+            [(kind, key, count, now) for (kind, key), count in counts.items()],
+        )
+        decayed = "count * (1 - (? - seen) / ?)"
+        longest = self.windows[-1][0]
+        db.execute(f"DELETE FROM hot_keys WHERE {decayed} <= 0", (now, longest))
+        db.execute(
+            f"DELETE FROM hot_keys WHERE rowid NOT IN (SELECT rowid FROM hot_keys ORDER BY {decayed} DESC LIMIT ?)",
+            (now, longest, self.hot_size),
+        )
+
+    def hot_keys(self):
+        """Return the hottest keys with their current per-window estimates.
+
+        ``over_limit`` locks a pair or username; for an IP or subnet it
+        means its requests get the tighter ``suspect_limits``.
+        """
+        now = time.time()
+        db = self._db
+        entries = [
+            (kind, key)
+            for kind, key in db.execute(
+                "SELECT kind, key FROM hot_keys WHERE count * (1 - (? - seen) / ?) > 0", (now, self.windows[-1][0])
+            )
+        ]
+        counts = self._counts(db, entries, now)
+        rows = [
+            {
+                "kind": kind,
+                "key": key,
+                "counts": [round(count) for count in counts[kind, key]],
+                "over_limit": self._over_limit(self.limits[kind], counts[kind, key]),
+            }
+            for kind, key in entries
+        ]
+        rows.sort(key=lambda row: row["counts"][-1], reverse=True)
+        return rows
+
+
+@cache
+def get_guard():
+    return LoginGuard(
+        limits=getattr(settings, "LOGIN_GUARD_LIMITS", None),
+        windows=getattr(settings, "LOGIN_GUARD_WINDOWS", None),
+        suspect_limits=getattr(settings, "LOGIN_GUARD_SUSPECT_LIMITS", None),
+        width=getattr(settings, "LOGIN_GUARD_WIDTH", 1 << 15),
+        secret=settings.SECRET_KEY.encode(),
+        path=settings.LOGIN_GUARD_PATH,
+    )
+
+
+def login_guard(view_func):
+    """Refuse POSTs for locked keys and count failed login attempts.
+
+    A login POST that does not redirect (the form was re-rendered with
+    errors) counts as a failure.
+    """
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method != "POST":
+            return view_func(request, *args, **kwargs)
+        guard = get_guard()
+        username = request.POST.get("username", "")
+        ip = request.META.get("REMOTE_ADDR", "")
+        if guard.is_locked(username, ip):
+            messages.error(request, "Too many attempts. Please try again later.")
+            return redirect(request.path)
+        response = view_func(request, *args, **kwargs)
+        if response.status_code == 200:
+            guard.record_failure(username, ip)
+        return response
+
+    return wrapper
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from apps.accounts.archive import (
+    archive_cutoff,
+    archive_users,
+    cold_users,
+    purge_expired_sessions,
+    purge_stale_tokens,
+)
+
+
+class Command(BaseCommand):
+    help = "Purge expired sessions and stale API tokens, then move long-inactive accounts to the archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, help="Archive users not seen for this many days (default: ARCHIVE_AFTER_DAYS)"
+        )
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows per transaction (default: 500)")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many accounts are cold")
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options["days"])
+        if options["dry_run"]:
+            self.stdout.write(f"{cold_users(cutoff).count()} account(s) would be archived.")
+            return
+        batch_size = options["batch_size"]
+        sessions = purge_expired_sessions(batch_size)
+        tokens = purge_stale_tokens(cutoff, batch_size)
+        archived = archive_users(cutoff, batch_size)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Purged {sessions} expired session(s) and {tokens} stale token(s); archived {archived} account(s)."
+            )
+        )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from apps.accounts.profiles import provision_profiles, users_without_profile
+
+
+class Command(BaseCommand):
+    help = "Create missing profiles for users that do not have one"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Users processed per batch (default: 500)")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many profiles are missing")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if options["dry_run"]:
+            missing = users_without_profile().count()
+            self.stdout.write(self.style.WARNING(f"{missing} user(s) without a profile."))
+            return
+
+        total = 0
+        last_pk = 0
+        while True:
+            batch = list(users_without_profile().filter(pk__gt=last_pk).order_by("pk").only("pk")[:batch_size])
+            if not batch:
+                break
+            total += provision_profiles(batch, batch_size=batch_size)
+            last_pk = batch[-1].pk
+
+        self.stdout.write(self.style.SUCCESS(f"Created {total} profile(s)."))
@@ -0,0 +1,102 @@
+import hashlib
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.staticfiles.finders import get_finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+from apps.accounts.assets import build_assets
+from apps.accounts.breached import build_filter, common_password_digests
+from apps.accounts.schema import artifact_path, write_schema
+
+STATIC_FINGERPRINT_FILE = ".source-fingerprint"
+
+
+def pending_migrations(database=DEFAULT_DB_ALIAS):
+    """Return the migration plan needed to bring the database up to date."""
+    executor = MigrationExecutor(connections[database])
+    return executor.migration_plan(executor.loader.graph.leaf_nodes())
+
+
+def static_fingerprint():
+    """Hash every collectable static file together with the storage backend."""
+    digest = hashlib.sha256(settings.STORAGES["staticfiles"]["BACKEND"].encode())
+    files = {}
+    for finder in get_finders():
+        for path, storage in finder.list([]):
+            # The first finder to provide a path wins, as in collectstatic.
+            files.setdefault(path, storage)
+    for path in sorted(files):
+        digest.update(path.encode())
+        with files[path].open(path) as fh:
+            for chunk in iter(lambda: fh.read(65536), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = "Prepare the app for serving: migrate, seed, build and collect static files and build the API schema only when needed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", action="store_true", help="Run seed_users after migrating")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self._step("migrate", self._migrate)
+        if options["seed"]:
+            self._step("seed_users", self._seed)
+        self._step("build_assets", self._build_assets)
+        self._step("collectstatic", self._collectstatic)
+        self._step("build_schema", self._build_schema)
+        self._step("build_password_filter", self._build_password_filter)
+        self.stdout.write(self.style.SUCCESS(f"Boot complete in {time.perf_counter() - started:.2f}s"))
+
+    def _step(self, name, func):
+        started = time.perf_counter()
+        result = func()
+        self.stdout.write(f"==> {name}: {result} ({time.perf_counter() - started:.2f}s)")
+
+    def _migrate(self):
+        plan = pending_migrations()
+        if not plan:
+            return "skipped, no pending migrations"
+        call_command("migrate", interactive=False, verbosity=0)
+        return f"applied {len(plan)} migration(s)"
+
+    def _seed(self):
+        # Seeding is best effort, as it was in startup.sh.
+        try:
+            call_command("seed_users", stdout=StringIO())
+        except Exception as exc:
+            return f"failed ({exc})"
+        return "done"
+
+    def _build_assets(self):
+        build_assets()
+        return "built"
+
+    def _collectstatic(self):
+        fingerprint = static_fingerprint()
+        marker = settings.STATIC_ROOT / STATIC_FINGERPRINT_FILE
+        if marker.exists() and marker.read_text() == fingerprint:
+            return "skipped, static files unchanged"
+        call_command("collectstatic", interactive=False, verbosity=0)
+        marker.write_text(fingerprint)
+        return "collected"
+
+    def _build_schema(self):
+        if artifact_path().exists():
+            return "skipped, schema is current"
+        write_schema()
+        return "built"
+
+    def _build_password_filter(self):
+        # A filter built from breach lists is left alone; this only seeds the common-password one.
+        if settings.PASSWORD_FILTER_PATH.exists():
+            return "skipped, filter exists"
+        added = build_filter(common_password_digests(), 20_000, settings.PASSWORD_FILTER_PATH)
+        return f"built from {added} common passwords"
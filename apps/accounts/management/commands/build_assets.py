@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.accounts.assets import build_assets
+
+
+class Command(BaseCommand):
+    help = "Minify and bundle the project CSS and extract the critical CSS inlined into base.html"
+
+    def handle(self, *args, **options):
+        for path in build_assets():
+            self.stdout.write(self.style.SUCCESS(f"Wrote {path} ({path.stat().st_size} bytes)"))
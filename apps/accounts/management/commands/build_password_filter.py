@@ -0,0 +1,59 @@
+import hashlib
+import itertools
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.breached import build_filter, common_password_digests
+
+
+def _read_digests(path, plaintext):
+    """Yield SHA-1 digests from a HIBP-style ``HASH[:count]`` list or a plaintext list."""
+    with open(path, encoding="utf-8", errors="replace") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            if plaintext:
+                yield hashlib.sha1(line.encode()).digest()  # noqa: S324
+                continue
+            try:
+                yield bytes.fromhex(line.partition(":")[0][:40])
+            except ValueError:
+                continue
+
+
+def _count_lines(path):
+    with open(path, "rb") as fh:
+        return sum(chunk.count(b"\n") for chunk in iter(lambda: fh.read(1 << 20), b"")) + 1
+
+
+class Command(BaseCommand):
+    help = "Compile the breached/common password Bloom filter used by BreachedPasswordValidator"
+
+    def add_arguments(self, parser):
+        parser.add_argument("lists", nargs="*", help="Local hash lists (SHA-1 hex, optionally ':count' suffixed)")
+        parser.add_argument("--plaintext", action="store_true", help="The lists hold plaintext passwords, not hashes")
+        parser.add_argument("--common", action="store_true", help="Include Django's common password list")
+        parser.add_argument(
+            "--error-rate", type=float, default=0.001, help="False positive rate of the filter (default: 0.001)"
+        )
+        parser.add_argument("--output", help="Filter file to write (default: PASSWORD_FILTER_PATH)")
+
+    def handle(self, *args, **options):
+        if not options["lists"] and not options["common"]:
+            raise CommandError("Give at least one hash list or --common.")
+        if not 0 < options["error_rate"] < 1:
+            raise CommandError("--error-rate must be between 0 and 1.")
+        sources = [_read_digests(path, options["plaintext"]) for path in options["lists"]]
+        # Size the filter up front; a line count is an upper bound on the entries
+        count = sum(_count_lines(path) for path in options["lists"])
+        if options["common"]:
+            sources.append(common_password_digests())
+            count += 20_000
+        output = options["output"] or settings.PASSWORD_FILTER_PATH
+        try:
+            added = build_filter(itertools.chain(*sources), count, output, options["error_rate"])
+        except OSError as exc:
+            raise CommandError(str(exc)) from exc
+        self.stdout.write(self.style.SUCCESS(f"Wrote {added} password hash(es) to {output}."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.accounts.schema import code_version, write_schema
+
+
+class Command(BaseCommand):
+    help = "Generate the OpenAPI schema artifact served at /api/schema/"
+
+    def handle(self, *args, **options):
+        path = write_schema()
+        self.stdout.write(self.style.SUCCESS(f"Schema for version {code_version()} written to {path}"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.accounts.changelog import compact_changelog
+
+
+class Command(BaseCommand):
+    help = "Remove superseded change feed entries and expired deletion tombstones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tombstone-days", type=int, default=30, help="Keep deletion entries this many days (default: 30)"
+        )
+
+    def handle(self, *args, **options):
+        removed = compact_changelog(options["tombstone_days"])
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} change log entr{'y' if removed == 1 else 'ies'}."))
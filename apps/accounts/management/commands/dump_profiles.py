@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from apps.accounts.profiling import report, reset
+
+
+def _size(value):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(value) < 1024:
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GiB"
+
+
+class Command(BaseCommand):
+    help = "Print the per-endpoint allocation and stack sampling profiles collected by all workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=10, help="Allocation sites and frames per endpoint")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+        parser.add_argument("--reset", action="store_true", help="Delete the collected profiles afterwards")
+
+    def handle(self, *args, **options):
+        rows = report(options["top"])
+        if options["json"]:
+            self.stdout.write(json.dumps(rows, indent=2))
+        elif not rows:
+            self.stdout.write("No profiles collected; set PROFILING_SAMPLE_RATE to enable the profiler.")
+        else:
+            for row in rows:
+                self._write_row(row)
+        if options["reset"]:
+            reset()
+            self.stdout.write(self.style.SUCCESS("Profiles reset."))
+
+    def _write_row(self, row):
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(row["endpoint"])
+            + f"  requests={row['requests']} avg={row['avg_ms']}ms"
+            + f" retained/request={_size(row['avg_retained_bytes'])} peak={_size(row['peak_bytes'])}"
+            + f" stack samples={row['stack_samples']}"
+        )
+        self.stdout.write("  top allocation sites (retained):")
+        for site in row["allocations"]:
+            self.stdout.write(f"    {_size(site['bytes']):>10}  {site['blocks']:>6} blocks  {site['site']}")
+        self.stdout.write("  hot frames (self/total samples):")
+        for frame in row["hot_frames"]:
+            self.stdout.write(f"    {frame['self']:>5}/{frame['total']:<5} {frame['frame']}")
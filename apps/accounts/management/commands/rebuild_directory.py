@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.accounts.directory import rebuild_directory
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized user directory used by the list endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Users processed per batch (default: 1000)")
+
+    def handle(self, *args, **options):
+        total = rebuild_directory(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Directory rebuilt with {total} user(s)."))
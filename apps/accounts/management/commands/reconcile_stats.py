@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.accounts.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recount the directory statistics from scratch, fixing any drift in the counters"
+
+    def handle(self, *args, **options):
+        wrong = reconcile()
+        self.stdout.write(self.style.SUCCESS(f"Statistics reconciled; {wrong} counter(s) were off."))
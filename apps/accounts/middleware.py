@@ -0,0 +1,69 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .routers import pin_to_primary, replica_aliases
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+_END = object()
+
+
+def _pinned_chunks(iterator):
+    while True:
+        with pin_to_primary():
+            chunk = next(iterator, _END)
+        if chunk is _END:
+            return
+        yield chunk
+
+
+async def _apinned_chunks(iterator):
+    while True:
+        with pin_to_primary():
+            chunk = await anext(iterator, _END)
+        if chunk is _END:
+            return
+        yield chunk
+
+
+class ReplicaPinMiddleware:
+    """Give clients read-your-writes consistency when replicas are configured.
+
+    Unsafe requests run against the primary and set a short-lived cookie;
+    while the cookie is valid the client's reads also stay on the primary,
+    covering the window in which replicas may still be catching up.
+    Streamed bodies are generated after the view returns, so each chunk of
+    a pinned response is produced under the pin as well.
+    """
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.cookie_name = getattr(settings, "REPLICA_PIN_COOKIE_NAME", "replica_pin")
+        self.pin_seconds = getattr(settings, "REPLICA_PIN_SECONDS", 5)
+
+    def __call__(self, request):
+        is_write = request.method not in SAFE_METHODS
+        pinned = is_write or self._is_pinned(request)
+        with pin_to_primary(pinned):
+            response = self.get_response(request)
+        if pinned and response.streaming:
+            chunks = _apinned_chunks if response.is_async else _pinned_chunks
+            response.streaming_content = chunks(response.streaming_content)
+        if is_write:
+            response.set_cookie(
+                self.cookie_name,
+                str(int(time.time()) + self.pin_seconds),
+                max_age=self.pin_seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def _is_pinned(self, request):
+        try:
+            return int(request.COOKIES.get(self.cookie_name, 0)) > time.time()
+        except ValueError:
+            return False
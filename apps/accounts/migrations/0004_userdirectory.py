@@ -0,0 +1,78 @@
+# Generated by Django 5.2.11 on 2026-10-19 02:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_directory(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Profile = apps.get_model("accounts", "Profile")
+    UserDirectory = apps.get_model("accounts", "UserDirectory")
+
+    def key(*values):
+        return " ".join(value.lower() for value in values if value)
+
+    profiles = {profile.user_id: profile for profile in Profile.objects.all()}
+    rows = []
+    for user in User.objects.all():
+        profile = profiles.get(user.pk)
+        row = UserDirectory(
+            user_id=user.pk,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            email=user.email,
+            date_joined=user.date_joined,
+            user_search_key=key(user.username, user.first_name, user.last_name),
+        )
+        if profile is not None:
+            row.profile_id = profile.pk
+            row.location = profile.location
+            row.bio_snippet = profile.bio[:100]
+            row.profile_created_at = profile.created_at
+            row.profile_updated_at = profile.updated_at
+            row.profile_search_key = key(user.username, profile.location, profile.bio)
+        rows.append(row)
+    UserDirectory.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0003_changelogentry"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserDirectory",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="directory_entry",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("username", models.CharField(db_index=True, max_length=150)),
+                ("first_name", models.CharField(blank=True, max_length=150)),
+                ("last_name", models.CharField(blank=True, max_length=150)),
+                ("email", models.EmailField(blank=True, max_length=254)),
+                ("date_joined", models.DateTimeField(db_index=True)),
+                ("profile_id", models.BigIntegerField(null=True, unique=True)),
+                ("location", models.CharField(blank=True, max_length=100)),
+                ("bio_snippet", models.CharField(blank=True, max_length=100)),
+                ("profile_created_at", models.DateTimeField(db_index=True, null=True)),
+                ("profile_updated_at", models.DateTimeField(db_index=True, null=True)),
+                ("user_search_key", models.TextField(blank=True)),
+                ("profile_search_key", models.TextField(blank=True)),
+            ],
+            options={
+                "verbose_name_plural": "user directory",
+            },
+        ),
+        migrations.RunPython(populate_directory, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.11 on 2026-10-19 02:49
+
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Profile = apps.get_model("accounts", "Profile")
+    StatCounter = apps.get_model("accounts", "StatCounter")
+
+    counts = Counter()
+    for location, bio, avatar_url, phone in Profile.objects.values_list("location", "bio", "avatar_url", "phone"):
+        counts["total", "profiles"] += 1
+        counts["location", location[:100]] += 1
+        counts["completeness", str(bool(bio) + bool(avatar_url) + bool(phone))] += 1
+    for date_joined in User.objects.values_list("date_joined", flat=True):
+        counts["total", "users"] += 1
+        counts["signups", timezone.localdate(date_joined).isoformat()] += 1
+    StatCounter.objects.bulk_create(
+        [StatCounter(kind=kind, key=key, value=value) for (kind, key), value in counts.items()], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0004_userdirectory"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatCounter",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("total", "Total"),
+                            ("location", "Location"),
+                            ("completeness", "Completeness"),
+                            ("signups", "Signups"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("key", models.CharField(max_length=100)),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "indexes": [models.Index(fields=["kind", "-value"], name="statcounter_top_idx")],
+                "constraints": [models.UniqueConstraint(fields=("kind", "key"), name="statcounter_kind_key_uniq")],
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
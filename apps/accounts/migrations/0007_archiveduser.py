@@ -0,0 +1,24 @@
+# Generated by Django 5.2.11 on 2026-10-19 03:15
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0006_tokengeneration"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedUser",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("username", models.CharField(max_length=150, unique=True)),
+                ("email", models.EmailField(blank=True, db_index=True, max_length=254)),
+                ("last_seen", models.DateTimeField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                ("data", models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.11 on 2026-10-19 03:19
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 1000
+# A frozen copy of apps.accounts.phones.normalize_phone, so later changes there cannot alter this backfill
+FORMATTING = re.compile(r"[\s().\-/]")
+E164 = re.compile(r"^\+[1-9]\d{6,14}$")
+
+
+def normalize_phone(value):
+    number = FORMATTING.sub("", value or "")
+    if number.startswith("00"):
+        number = "+" + number[2:]
+    elif number.startswith("0"):
+        number = f"+{settings.PHONE_DEFAULT_COUNTRY_CODE}{number[1:]}"
+    elif not number.startswith("+"):
+        number = "+" + number
+    return number if E164.match(number) else ""
+
+
+def backfill_phone_normalized(apps, schema_editor):
+    Profile = apps.get_model("accounts", "Profile")
+    alias = schema_editor.connection.alias
+    with_phone = Profile.objects.using(alias).exclude(phone="").order_by("pk")
+    last_pk = 0
+    # One short transaction per batch, so a large table is never locked for the whole backfill
+    while batch := list(with_phone.filter(pk__gt=last_pk).only("pk", "phone")[:BATCH_SIZE]):
+        for profile in batch:
+            profile.phone_normalized = normalize_phone(profile.phone)
+        with transaction.atomic(using=alias):
+            Profile.objects.using(alias).bulk_update(batch, ["phone_normalized"])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("accounts", "0007_archiveduser"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="phone_normalized",
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16),
+        ),
+        migrations.RunPython(backfill_phone_normalized, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.11 on 2026-10-19 03:42
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def number_existing_entries(apps, schema_editor):
+    # Existing cursors were entry ids, so the ids become the sequence numbers.
+    db = schema_editor.connection.alias
+    ChangeLogEntry = apps.get_model("accounts", "ChangeLogEntry")
+    ChangeLogSequence = apps.get_model("accounts", "ChangeLogSequence")
+    ChangeLogEntry.objects.using(db).update(sequence=F("id"))
+    last = ChangeLogEntry.objects.using(db).aggregate(last=Max("id"))["last"] or 0
+    ChangeLogSequence.objects.using(db).create(pk=1, last=last)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0008_profile_phone_normalized"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeLogSequence",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("last", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="changelogentry",
+            name="sequence",
+            field=models.BigIntegerField(null=True, unique=True),
+        ),
+        migrations.RunPython(number_existing_entries, migrations.RunPython.noop),
+    ]
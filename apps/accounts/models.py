@@ -1,27 +1,169 @@
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import RegexValidator
 from django.db import models
 
+from .phones import normalize_phone
+from .tracking import TrackedFieldsMixin
+
 phone_validator = RegexValidator(
     regex=r"^\+?\d{7,15}$",
     message="Enter a valid phone number (7-15 digits, optional leading +).",
 )
 
 
-class Profile(models.Model):
+class Profile(TrackedFieldsMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
     bio = models.TextField(max_length=500, blank=True)
     avatar_url = models.URLField(max_length=300, blank=True)
     location = models.CharField(max_length=100, blank=True)
     phone = models.CharField(max_length=20, blank=True, validators=[phone_validator])
+    # E.164 form of ``phone`` (empty if it does not parse), kept up to date on save
+    phone_normalized = models.CharField(max_length=16, blank=True, db_index=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.username}'s profile"
 
+    def save(self, *args, update_fields=None, **kwargs):
+        self.phone_normalized = normalize_phone(self.phone)
+        if update_fields is not None and "phone" in update_fields:
+            update_fields = [*update_fields, "phone_normalized"]
+        super().save(*args, update_fields=update_fields, **kwargs)
+
     @property
     def avatar_initial(self):
         if self.user.first_name:
             return self.user.first_name[0].upper()
         return self.user.username[0].upper()
+
+
+class ChangeLogEntry(models.Model):
+    """Append-only log of profile and user writes, read by the change feed.
+
+    ``sequence`` is the sync cursor. It is assigned after the entry has
+    committed (see ``apps.accounts.changelog.sequence_changes``), so it
+    follows commit order where ids follow insert order. Entries superseded by
+    a newer entry for the same object are removed by ``compact_changelog``.
+    """
+
+    class Action(models.TextChoices):
+        CREATED = "created"
+        UPDATED = "updated"
+        DELETED = "deleted"
+
+    class Kind(models.TextChoices):
+        PROFILE = "profile"
+        USER = "user"
+
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=Action.choices)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    sequence = models.BigIntegerField(null=True, unique=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["kind", "object_id", "id"], name="changelog_object_idx")]
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} {self.object_id} {self.action}"
+
+
+class ChangeLogSequence(models.Model):
+    """The last change log sequence number handed out (a single row, locked while numbering)."""
+
+    last = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.last)
+
+
+class UserDirectory(models.Model):
+    """Flat read model of a user and their profile for list, search and ordering.
+
+    Kept in sync from User/Profile signals (see ``apps.accounts.directory``)
+    and rebuilt with ``rebuild_directory``. The search keys hold the
+    lowercased searchable fields joined by spaces, so a search is a single
+    ``LIKE`` on one column with no join.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="directory_entry")
+    username = models.CharField(max_length=150, db_index=True)
+    first_name = models.CharField(max_length=150, blank=True)
+    last_name = models.CharField(max_length=150, blank=True)
+    email = models.EmailField(blank=True)
+    date_joined = models.DateTimeField(db_index=True)
+    profile_id = models.BigIntegerField(null=True, unique=True)
+    location = models.CharField(max_length=100, blank=True)
+    bio_snippet = models.CharField(max_length=100, blank=True)
+    profile_created_at = models.DateTimeField(null=True, db_index=True)
+    profile_updated_at = models.DateTimeField(null=True, db_index=True)
+    user_search_key = models.TextField(blank=True)
+    profile_search_key = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name_plural = "user directory"
+
+    def __str__(self):
+        return self.username
+
+
+class StatCounter(models.Model):
+    """Incrementally maintained directory statistic (see ``apps.accounts.stats``).
+
+    Updated from User/Profile signals in the writing transaction, so reading
+    a statistic never scans users or profiles. ``reconcile_stats`` recounts
+    everything to repair drift from writes that bypass signals.
+    """
+
+    class Kind(models.TextChoices):
+        TOTAL = "total"
+        LOCATION = "location"
+        COMPLETENESS = "completeness"
+        SIGNUPS = "signups"
+
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    key = models.CharField(max_length=100)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["kind", "key"], name="statcounter_kind_key_uniq")]
+        indexes = [models.Index(fields=["kind", "-value"], name="statcounter_top_idx")]
+
+    def __str__(self):
+        return f"{self.kind}:{self.key} = {self.value}"
+
+
+class TokenGeneration(models.Model):
+    """Revocation generation of a user's signed API tokens.
+
+    Tokens carry the generation they were issued under; bumping it (see
+    ``apps.accounts.signed_tokens.revoke_tokens``) invalidates all of them.
+    Users without a row are at generation 0.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="token_generation")
+    generation = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.generation}"
+
+
+class ArchivedUser(models.Model):
+    """A cold account moved out of the auth tables by ``archive_accounts``.
+
+    ``data`` holds the user, profile, group, permission and token generation
+    fields needed to recreate the account under its original id; see
+    ``apps.accounts.archive``. Logging in restores it.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    username = models.CharField(max_length=150, unique=True)
+    email = models.EmailField(blank=True, db_index=True)
+    last_seen = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+
+    def __str__(self):
+        return self.username
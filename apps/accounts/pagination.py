@@ -0,0 +1,62 @@
+from django.core.paginator import InvalidPage
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class DirectoryPagination(PageNumberPagination):
+    """Page-number pagination with a client ``page_size`` and a streaming mode.
+
+    Staff may request pages of up to ``staff_max_page_size`` for exports.
+    Pages of ``stream_page_size`` or more are streamed: the page's queryset
+    is left unevaluated and the rows are written one by one into the usual
+    ``count``/``next``/``previous``/``results`` envelope.
+    """
+
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    staff_max_page_size = 10_000
+    stream_page_size = 500
+
+    def get_page_size(self, request):
+        self.max_page_size = self.staff_max_page_size if request.user.is_staff else type(self).max_page_size
+        return super().get_page_size(request)
+
+    def should_stream(self, request):
+        return self.get_page_size(request) >= self.stream_page_size
+
+    def paginate_queryset_lazily(self, queryset, request):
+        """Like ``paginate_queryset``, but return the page's queryset unevaluated."""
+        self.request = request
+        paginator = self.django_paginator_class(queryset, self.get_page_size(request))
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc))) from exc
+        return self.page.object_list
+
+    def get_streaming_response(self, rows):
+        """Stream ``rows`` (an iterable of serialized dicts) inside the page envelope."""
+        # Same output as DRF's JSONRenderer with its default COMPACT_JSON/UNICODE_JSON
+        encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+        envelope = encoder.encode(
+            {
+                "count": self.page.paginator.count,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": [],
+            }
+        )
+        head, tail = envelope[:-2], envelope[-2:]
+
+        def generate():
+            yield head
+            separator = ""
+            for row in rows:
+                yield separator + encoder.encode(row)
+                separator = ","
+            yield tail
+
+        return StreamingHttpResponse(generate(), content_type="application/json")
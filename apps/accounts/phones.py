@@ -0,0 +1,26 @@
+"""Phone number normalization to E.164 (``+`` then up to 15 digits).
+
+Formatting characters are dropped and an international ``00`` prefix
+becomes ``+``. A number written with a national trunk ``0`` gets
+``PHONE_DEFAULT_COUNTRY_CODE`` in its place. Bare digits are taken to
+already start with a country code. Anything that does not come out as 7-15
+digits normalizes to ``""``.
+"""
+
+import re
+
+from django.conf import settings
+
+FORMATTING = re.compile(r"[\s().\-/]")
+E164 = re.compile(r"^\+[1-9]\d{6,14}$")
+
+
+def normalize_phone(value, country_code=None):
+    number = FORMATTING.sub("", value or "")
+    if number.startswith("00"):
+        number = "+" + number[2:]
+    elif number.startswith("0"):
+        number = f"+{country_code or settings.PHONE_DEFAULT_COUNTRY_CODE}{number[1:]}"
+    elif not number.startswith("+"):
+        number = "+" + number
+    return number if E164.match(number) else ""
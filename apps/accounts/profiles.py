@@ -0,0 +1,60 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .changelog import record_changes
+from .directory import sync_users
+from .models import ChangeLogEntry, Profile
+from .stats import Kind, bump_many
+
+
+def get_profile(user):
+    """Return the user's profile without issuing any write.
+
+    Users created before the signal existed, loaded from fixtures or inserted
+    with ``bulk_create`` may have no profile row. For them an unsaved
+    ``Profile`` is returned and cached on the user, so templates and forms
+    work unchanged and the row is only inserted when it is first saved.
+    """
+    try:
+        return user.profile
+    except Profile.DoesNotExist:
+        profile = Profile(user=user)
+        user.profile = profile
+        return profile
+
+
+def ensure_profile(user):
+    """Return the user's saved profile, creating it if needed (write paths only)."""
+    profile = get_profile(user)
+    if profile.pk is None:
+        profile, _ = Profile.objects.get_or_create(user=user)
+        user.profile = profile
+    return profile
+
+
+def provision_profiles(users, batch_size=500):
+    """Create missing profiles for already-saved users in bulk.
+
+    Signals do not fire on ``User.objects.bulk_create``, so bulk import paths
+    must call this afterwards. The users' directory rows, the profile
+    statistics and the change feed are updated in the same transaction.
+    Returns the number of profiles inserted.
+    """
+    user_ids = [user.pk for user in users]
+    with transaction.atomic():
+        existing = set(Profile.objects.filter(user_id__in=user_ids).values_list("user_id", flat=True))
+        missing = [Profile(user_id=user_id) for user_id in user_ids if user_id not in existing]
+        Profile.objects.bulk_create(missing, batch_size=batch_size, ignore_conflicts=True)
+        if missing:
+            # New profiles are empty: no location and nothing filled in
+            empty = [(Kind.TOTAL, "profiles"), (Kind.LOCATION, ""), (Kind.COMPLETENESS, "0")]
+            bump_many([(kind, key, len(missing)) for kind, key in empty])
+            # ignore_conflicts leaves the new primary keys unset
+            created = Profile.objects.filter(user_id__in=[profile.user_id for profile in missing])
+            record_changes("profile", created.values_list("pk", flat=True), ChangeLogEntry.Action.CREATED, batch_size)
+        sync_users(user_ids, batch_size=batch_size)
+    return len(missing)
+
+
+def users_without_profile():
+    return User.objects.filter(profile__isnull=True)
@@ -0,0 +1,256 @@
+"""Opt-in sampling profiler for finding what allocates and what is slow, per endpoint.
+
+With ``PROFILING_SAMPLE_RATE`` above 0, that fraction of requests is
+profiled by ``SamplingProfilerMiddleware``. A profiled request runs with
+``tracemalloc`` tracing, and the memory it still holds at the end is
+attributed to source lines. Meanwhile a sampler thread records the request
+thread's stack every ``PROFILING_STACK_INTERVAL`` seconds. Results are
+aggregated per URL name: requests, wall time, retained and peak bytes, top
+allocation sites, and hot frames by self and total samples.
+
+Each process profiles one request at a time; concurrent requests run
+unprofiled. Tracing is process-wide, though, so with threaded workers the
+allocations other threads make meanwhile are counted too.
+
+Aggregates are written to ``PROFILING_DIR`` as one JSON file per process,
+at most every ``FLUSH_INTERVAL`` seconds. The staff endpoint and
+``dump_profiles`` merge the files of all workers. With a sample rate of 0
+the middleware removes itself at startup and costs nothing.
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+# Entries kept per endpoint in each table
+MAX_ENTRIES = 200
+MAX_STACK_DEPTH = 64
+FLUSH_INTERVAL = 30
+COUNTERS = ["requests", "seconds", "retained_bytes", "peak_bytes", "stack_samples"]
+TABLES = ["allocated_bytes", "allocated_blocks", "self_samples", "total_samples"]
+
+_IGNORED_FILES = (tracemalloc.__file__, __file__, threading.__file__)
+
+
+def _short(filename):
+    base = str(settings.BASE_DIR) + os.sep
+    if filename.startswith(base):
+        return filename[len(base) :]
+    _, marker, rest = filename.rpartition(f"site-packages{os.sep}")
+    return rest if marker else filename
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_qualname} ({_short(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """Record the stack of ``thread_id`` every ``interval`` seconds until stopped."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = []
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                if frame.f_code.co_filename not in _IGNORED_FILES:
+                    stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks.append(stack)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        return self.stacks
+
+
+def _empty():
+    return {**dict.fromkeys(COUNTERS, 0), **{table: Counter() for table in TABLES}}
+
+
+def _trim(profile):
+    for table in TABLES:
+        if len(profile[table]) > MAX_ENTRIES:
+            profile[table] = Counter(dict(profile[table].most_common(MAX_ENTRIES)))
+
+
+def _merge(into, profile):
+    for name in COUNTERS:
+        into[name] = max(into[name], profile[name]) if name == "peak_bytes" else into[name] + profile[name]
+    for table in TABLES:
+        into[table].update(profile[table])
+    _trim(into)
+
+
+_lock = threading.Lock()
+_busy = threading.Lock()
+_profiles = {}
+_flushed_at = 0.0
+
+
+def record(name, seconds, allocations, peak_bytes, stacks):
+    """Add one profiled request: ``allocations`` are (site, bytes, blocks) and ``stacks`` innermost first."""
+    profile = _empty()
+    profile.update(requests=1, seconds=seconds, peak_bytes=peak_bytes, stack_samples=len(stacks))
+    for site, size, count in allocations:
+        profile["retained_bytes"] += size
+        profile["allocated_bytes"][site] += size
+        profile["allocated_blocks"][site] += count
+    for stack in stacks:
+        profile["self_samples"][stack[0]] += 1
+        profile["total_samples"].update(set(stack))
+    with _lock:
+        _merge(_profiles.setdefault(name, _empty()), profile)
+    if time.monotonic() - _flushed_at >= FLUSH_INTERVAL:
+        flush()
+
+
+def _snapshot_allocations(snapshot, before=None):
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, path) for path in _IGNORED_FILES])
+    if before is None:
+        stats = [(stat.traceback[0], stat.size, stat.count) for stat in snapshot.statistics("lineno")]
+    else:
+        stats = [
+            (stat.traceback[0], stat.size_diff, stat.count_diff)
+            for stat in snapshot.compare_to(before, "lineno")
+            if stat.size_diff > 0
+        ]
+    return [(f"{_short(frame.filename)}:{frame.lineno}", size, count) for frame, size, count in stats]
+
+
+def profile_call(name, func, *args):
+    """Run ``func(*args)`` under tracemalloc and the stack sampler, recording the result under ``name``.
+
+    ``name`` may be a callable, called after ``func`` returns (the URL name is
+    only known once the request has been resolved).
+    """
+    started_tracing = not tracemalloc.is_tracing()
+    before = None
+    if started_tracing:
+        tracemalloc.start()
+    else:
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+    sampler = StackSampler(threading.get_ident(), settings.PROFILING_STACK_INTERVAL)
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        seconds = time.perf_counter() - started
+        stacks = sampler.stop()
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if started_tracing:
+            tracemalloc.stop()
+        record(name() if callable(name) else name, seconds, _snapshot_allocations(snapshot, before), peak, stacks)
+
+
+def _url_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else "<unresolved>"
+
+
+class SamplingProfilerMiddleware:
+    """Profile a random ``PROFILING_SAMPLE_RATE`` fraction of requests (see module docstring)."""
+
+    def __init__(self, get_response):
+        if settings.PROFILING_SAMPLE_RATE <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.rate = settings.PROFILING_SAMPLE_RATE
+
+    def __call__(self, request):
+        if random.random() >= self.rate or not _busy.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return profile_call(lambda: _url_name(request), self.get_response, request)
+        finally:
+            _busy.release()
+
+
+def _path(directory):
+    return Path(directory or settings.PROFILING_DIR)
+
+
+def flush(directory=None):
+    """Write this process's aggregates to its file in ``PROFILING_DIR``."""
+    global _flushed_at
+    _flushed_at = time.monotonic()
+    with _lock:
+        if not _profiles:
+            return
+        data = json.dumps(_profiles)
+    directory = _path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"profile-{os.getpid()}.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(data)
+    os.replace(tmp, path)
+
+
+def load(directory=None):
+    """Merge the aggregates of every process that has written to ``PROFILING_DIR``."""
+    merged = {}
+    for path in sorted(_path(directory).glob("profile-*.json")):
+        try:
+            profiles = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for name, profile in profiles.items():
+            profile.update({table: Counter(profile[table]) for table in TABLES})
+            _merge(merged.setdefault(name, _empty()), profile)
+    return merged
+
+
+def report(top=10, directory=None):
+    """Per-endpoint summaries with the ``top`` allocation sites and frames, most retained memory first."""
+    flush(directory)
+    rows = []
+    for name, profile in load(directory).items():
+        requests = profile["requests"]
+        rows.append(
+            {
+                "endpoint": name,
+                "requests": requests,
+                "avg_ms": round(profile["seconds"] / requests * 1000, 2),
+                "avg_retained_bytes": profile["retained_bytes"] // requests,
+                "peak_bytes": profile["peak_bytes"],
+                "stack_samples": profile["stack_samples"],
+                "allocations": [
+                    {"site": site, "bytes": size, "blocks": profile["allocated_blocks"][site]}
+                    for site, size in profile["allocated_bytes"].most_common(top)
+                ],
+                "hot_frames": [
+                    {"frame": frame, "self": samples, "total": profile["total_samples"][frame]}
+                    for frame, samples in profile["self_samples"].most_common(top)
+                ],
+            }
+        )
+    rows.sort(key=lambda row: row["avg_retained_bytes"] * row["requests"], reverse=True)
+    return rows
+
+
+def reset(directory=None):
+    """Forget this process's aggregates and delete every process's file."""
+    with _lock:
+        _profiles.clear()
+    for path in _path(directory).glob("profile-*.json"):
+        path.unlink(missing_ok=True)
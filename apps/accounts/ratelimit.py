@@ -20,11 +20,19 @@ def ratelimit(key, limit=5, period=300):
             if request.method == "POST":
                 ip = request.META.get("REMOTE_ADDR", "")
                 cache_key = f"rl:{key}:{ip}"
-                attempts = cache.get(cache_key, 0)
-                if attempts >= limit:
+                # add + incr is atomic, so concurrent workers cannot both slip under the limit.
+                if cache.add(cache_key, 1, period):
+                    attempts = 1
+                else:
+                    try:
+                        attempts = cache.incr(cache_key)
+                    except ValueError:
+                        # The window expired between add() and incr().
+                        cache.set(cache_key, 1, period)
+                        attempts = 1
+                if attempts > limit:
                     messages.error(request, "Too many attempts. Please try again later.")
                     return redirect(request.path)
-                cache.set(cache_key, attempts + 1, period)
             return view_func(request, *args, **kwargs)
 
         return wrapper
@@ -0,0 +1,23 @@
+from django.contrib.auth import login
+from django.db import transaction
+
+from apps.jobs.queue import enqueue
+
+from .tasks import send_welcome_email, track_event
+
+
+def register_user(request, form):
+    """Create the account from a valid ``RegisterForm`` and log the user in.
+
+    All required writes (user, profile and their bookkeeping rows, session,
+    last_login) commit in a single transaction instead of one commit each;
+    the statistics take one upsert per saved row. The welcome email and the
+    analytics event are queued as jobs in the same transaction. Profile
+    enrichment is not done: there is no source to enrich profiles from.
+    """
+    with transaction.atomic():
+        user = form.save()
+        login(request, user)
+        enqueue(send_welcome_email, user_id=user.pk)
+        enqueue(track_event, event="user_registered", user_id=user.pk)
+    return user
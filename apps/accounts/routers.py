@@ -0,0 +1,62 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Apps whose reads may be served by a replica. Sessions, admin logs and
+# content types always stay on the primary.
+ROUTED_APP_LABELS = {"accounts", "auth"}
+
+_pinned_to_primary = ContextVar("pinned_to_primary", default=False)
+
+
+def replica_aliases():
+    """Return the configured replica database aliases."""
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+@contextmanager
+def pin_to_primary(pinned=True):
+    """Send every routed read inside the block to the primary database."""
+    token = _pinned_to_primary.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(token)
+
+
+def is_pinned_to_primary():
+    return _pinned_to_primary.get()
+
+
+class PrimaryReplicaRouter:
+    """Route accounts reads to replicas and all writes to the primary.
+
+    Reads fall back to the primary while the current request is pinned
+    (unsafe method or recent write by the same client) or while the primary
+    connection is inside a transaction, so a request always sees its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APP_LABELS:
+            return None
+        replicas = replica_aliases()
+        if not replicas or is_pinned_to_primary() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
@@ -0,0 +1,95 @@
+import gzip
+import hashlib
+import logging
+from dataclasses import dataclass
+from functools import cache
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_safe
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_CONTENT_TYPE = "application/vnd.oai.openapi+json"
+SOURCE_DIRS = ("apps", "config")
+
+
+@dataclass(frozen=True)
+class SchemaArtifact:
+    body: bytes
+    gzipped: bytes
+    etag: str
+
+
+@cache
+def code_version():
+    """Fingerprint the project sources the schema is generated from."""
+    digest = hashlib.sha256(str(settings.SPECTACULAR_SETTINGS).encode())
+    for directory in SOURCE_DIRS:
+        for path in sorted((settings.BASE_DIR / directory).rglob("*.py")):
+            digest.update(str(path.relative_to(settings.BASE_DIR)).encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def artifact_path(version=None):
+    return settings.OPENAPI_SCHEMA_DIR / f"schema-{version or code_version()}.json"
+
+
+def generate_schema():
+    """Introspect the API and render the OpenAPI document as JSON bytes."""
+    from drf_spectacular.generators import SchemaGenerator
+    from drf_spectacular.renderers import OpenApiJsonRenderer
+
+    schema = SchemaGenerator().get_schema(request=None, public=True)
+    return OpenApiJsonRenderer().render(schema, renderer_context={})
+
+
+def _etag(body):
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def make_artifact(body):
+    return SchemaArtifact(body=body, gzipped=gzip.compress(body, mtime=0), etag=_etag(body))
+
+
+def write_schema(version=None):
+    """Generate the schema and store it with a gzip variant for this code version."""
+    artifact = make_artifact(generate_schema())
+    path = artifact_path(version)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for stale in path.parent.glob("schema-*.json*"):
+        stale.unlink()
+    path.write_bytes(artifact.body)
+    path.with_name(path.name + ".gz").write_bytes(artifact.gzipped)
+    return path
+
+
+@cache
+def load_schema(version):
+    """Return the schema artifact for ``version``, built at most once per process."""
+    path = artifact_path(version)
+    gz_path = path.with_name(path.name + ".gz")
+    if path.exists() and gz_path.exists():
+        body = path.read_bytes()
+        return SchemaArtifact(body=body, gzipped=gz_path.read_bytes(), etag=_etag(body))
+    logger.warning("No prebuilt OpenAPI schema for version %s, generating in-process", version)
+    return make_artifact(generate_schema())
+
+
+@require_safe
+def schema_view(request):
+    """Serve the prebuilt OpenAPI schema with ETag revalidation and gzip."""
+    artifact = load_schema(code_version())
+    if request.headers.get("If-None-Match") == artifact.etag:
+        response = HttpResponseNotModified()
+    elif "gzip" in request.headers.get("Accept-Encoding", ""):
+        response = HttpResponse(artifact.gzipped, content_type=SCHEMA_CONTENT_TYPE)
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(artifact.body, content_type=SCHEMA_CONTENT_TYPE)
+    response["ETag"] = artifact.etag
+    response["Cache-Control"] = "public, no-cache"
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
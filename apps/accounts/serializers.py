@@ -1,7 +1,8 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
 
-from .models import Profile
+from .avatars import avatar_urls
+from .models import ChangeLogEntry, Profile
 
 
 class ProfileSerializer(serializers.ModelSerializer):
@@ -9,15 +10,37 @@ class ProfileSerializer(serializers.ModelSerializer):
 
     Returns profile details including bio, location, phone, and avatar URL.
     The `username` field is read-only and pulled from the related User model.
+    `avatar_thumbnails` maps sizes to locally cached copies of the avatar, or is
+    null until the avatar has been fetched.
     """
 
     username = serializers.CharField(source="user.username", read_only=True)
+    avatar_thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = Profile
-        fields = ["id", "username", "bio", "avatar_url", "location", "phone", "created_at", "updated_at"]
+        fields = [
+            "id",
+            "username",
+            "bio",
+            "avatar_url",
+            "avatar_thumbnails",
+            "location",
+            "phone",
+            "created_at",
+            "updated_at",
+        ]
         read_only_fields = ["id", "created_at", "updated_at"]
 
+    def get_avatar_thumbnails(self, obj) -> dict[str, str] | None:
+        urls = avatar_urls(obj.avatar_url)
+        if urls is None:
+            return None
+        request = self.context.get("request")
+        if request is not None:
+            return {str(size): request.build_absolute_uri(url) for size, url in urls.items()}
+        return {str(size): url for size, url in urls.items()}
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for Django's built-in User model (admin view).
@@ -41,3 +64,36 @@ class UserPublicSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "username", "first_name", "last_name", "profile"]
+
+
+class ChangeLogEntrySerializer(serializers.ModelSerializer):
+    """Serializer for change feed entries.
+
+    `data` holds the current state of the changed object, or null when it was
+    deleted. Objects are looked up from the `objects` context mapping of
+    `(kind, object_id)` to already-serialized data.
+    """
+
+    cursor = serializers.IntegerField(source="sequence", read_only=True)
+    data = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ChangeLogEntry
+        fields = ["cursor", "kind", "object_id", "action", "created_at", "data"]
+
+    def get_data(self, obj) -> dict | None:
+        return self.context["objects"].get((obj.kind, obj.object_id))
+
+
+class SignedTokenPairSerializer(serializers.Serializer):
+    """Access/refresh token pair issued by the signed token endpoints."""
+
+    access = serializers.CharField()
+    refresh = serializers.CharField()
+    token_type = serializers.CharField()
+    expires_in = serializers.IntegerField(help_text="Access token lifetime in seconds")
+    refresh_expires_in = serializers.IntegerField(help_text="Refresh token lifetime in seconds")
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
@@ -1,18 +1,140 @@
-import logging
-
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from .models import Profile
+from .availability import TAKEN_FIELDS, user_saved
+from .avatars import cached_digest, schedule_fetch
+from .changelog import UNLOGGED_USER_FIELDS, record_change
+from .directory import USER_FIELDS, clear_profile, sync_directory
+from .events import hub
+from .models import ChangeLogEntry, Profile
+from .signed_tokens import revoke_tokens
+from .stats import apply_change, profile_contribution, stored_contribution, user_contribution
+from .usercache import invalidate_user
+
+
+@receiver(post_save, sender=User)
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    # Fixture loads carry their own profile rows; anything else missing a
+    # profile is handled lazily by apps.accounts.profiles.get_profile.
+    if created and not raw:
+        # archive.restore_user brings the profile back under its original id
+        Profile.objects.create(user=instance, id=instance.__dict__.pop("_restored_profile_id", None))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Profile)
+def log_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (sender is User and update_fields and update_fields <= UNLOGGED_USER_FIELDS):
+        return
+    action = ChangeLogEntry.Action.CREATED if created else ChangeLogEntry.Action.UPDATED
+    record_change(sender._meta.model_name, instance.pk, action)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Profile)
+def log_deleted(sender, instance, **kwargs):
+    record_change(sender._meta.model_name, instance.pk, ChangeLogEntry.Action.DELETED)
+
+
+@receiver(post_save, sender=Profile)
+def publish_profile_event(sender, instance, raw=False, **kwargs):
+    # Serializing is skipped entirely while nobody in this process is listening.
+    if raw or not len(hub):
+        return
+    from .serializers import ProfileSerializer
+
+    event = dict(ProfileSerializer(instance).data)
+    transaction.on_commit(lambda: hub.publish(event))
+
+
+@receiver(post_save, sender=Profile)
+def cache_profile_avatar(sender, instance, raw=False, **kwargs):
+    url = instance.avatar_url
+    if raw or not url or cached_digest(url):
+        return
+    transaction.on_commit(lambda: schedule_fetch(url))
+
+
+@receiver(post_save, sender=User)
+def sync_user_directory(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # New users get their row from the Profile save triggered by
+    # create_user_profile, which runs first.
+    if raw or created or (update_fields and not USER_FIELDS.intersection(update_fields)):
+        return
+    try:
+        profile = instance.profile
+    except Profile.DoesNotExist:
+        profile = None
+    sync_directory(instance, profile)
+
+
+@receiver(post_save, sender=Profile)
+def sync_profile_directory(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_directory(instance.user, instance)
 
-logger = logging.getLogger(__name__)
+
+@receiver(post_delete, sender=Profile)
+def clear_profile_directory(sender, instance, **kwargs):
+    clear_profile(instance.user_id)
+
+
+@receiver(pre_save, sender=Profile)
+def capture_profile_stats(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._stats_before = stored_contribution(instance)
+
+
+@receiver(post_save, sender=Profile)
+def count_profile_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    apply_change(instance.__dict__.pop("_stats_before", set()), profile_contribution(instance))
+
+
+@receiver(post_delete, sender=Profile)
+def uncount_profile_stats(sender, instance, **kwargs):
+    apply_change(old=stored_contribution(instance))
+
+
+@receiver(post_save, sender=User)
+def count_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        apply_change(new=user_contribution(instance))
+
+
+@receiver(post_delete, sender=User)
+def uncount_user_stats(sender, instance, **kwargs):
+    apply_change(old=user_contribution(instance))
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_password_change(sender, instance, created, raw=False, **kwargs):
+    # set_password() keeps the raw password on _password until the save;
+    # the hash upgrade of check_password() clears it first, so logins pass.
+    if not created and not raw and instance._password is not None:
+        revoke_tokens(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def remember_taken_names(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Added right away: a save that rolls back only leaves a false positive,
+    # which the availability check confirms against the database anyway.
+    # Saves of other fields only (logins) cannot take a new name.
+    if raw or (not created and update_fields and not TAKEN_FIELDS.intersection(update_fields)):
+        return
+    user_saved(instance.username, instance.email)
 
 
 @receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        try:
-            Profile.objects.create(user=instance)
-        except Exception:
-            logger.exception("Failed to create profile for user %s", instance.username)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Cached users carry their profile. Invalidate again on commit, in case a
+    # reader refilled the entry from the old rows meanwhile.
+    user_id, username = (instance.pk, instance.username) if sender is User else (instance.user_id, None)
+    invalidate_user(user_id, username)
+    transaction.on_commit(lambda: invalidate_user(user_id, username))
@@ -0,0 +1,131 @@
+"""Stateless HMAC-signed API tokens.
+
+A token reads ``<kid>.<type>.<user id>.<generation>.<expiry>.<signature>``,
+with the integers in hex and a truncated HMAC-SHA256 signature in base64url.
+Verification is a hash and a few comparisons, with no database access. The
+user's current revocation generation and the user row come from the cache.
+
+Tokens are signed with a key derived from ``SECRET_KEY`` and checked against
+keys derived from ``SECRET_KEY_FALLBACKS`` too. Rotating the secret the
+usual Django way therefore rotates the token keys. ``kid`` names the key
+that signed a token, so verification never has to try several keys.
+"""
+
+import base64
+import hashlib
+import hmac
+import time
+from dataclasses import dataclass
+from functools import cache
+
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.db import transaction
+from django.db.models import F
+from django.utils.crypto import salted_hmac
+
+from .models import TokenGeneration
+from .routers import pin_to_primary
+
+ACCESS = "a"
+REFRESH = "r"
+SIGNATURE_BYTES = 16
+GENERATION_CACHE_SECONDS = 300
+
+
+class TokenError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Claims:
+    type: str
+    user_id: int
+    generation: int
+    expires: int
+
+
+@cache
+def _derive_keys(secrets):
+    keys = {}
+    for secret in secrets:
+        key = salted_hmac("apps.accounts.signed_tokens", "signing key", secret=secret).digest()
+        keys.setdefault(hashlib.sha256(key).hexdigest()[:6], key)
+    return keys
+
+
+def signing_keys():
+    """Map key ids to keys; the first one signs new tokens."""
+    return _derive_keys((settings.SECRET_KEY, *settings.SECRET_KEY_FALLBACKS))
+
+
+def _sign(key, payload):
+    digest = hmac.new(key, payload.encode(), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def issue(user_id, generation, token_type=ACCESS, lifetime=None):
+    if lifetime is None:
+        lifetime = (
+            settings.SIGNED_TOKEN_ACCESS_SECONDS if token_type == ACCESS else settings.SIGNED_TOKEN_REFRESH_SECONDS
+        )
+    kid, key = next(iter(signing_keys().items()))
+    payload = f"{kid}.{token_type}.{user_id:x}.{generation:x}.{int(time.time()) + lifetime:x}"
+    return f"{payload}.{_sign(key, payload)}"
+
+
+def verify(token, token_type=ACCESS):
+    """Return the claims of a valid, unexpired token of ``token_type``, else raise TokenError."""
+    payload, _, signature = token.rpartition(".")
+    kid = payload.partition(".")[0]
+    key = signing_keys().get(kid)
+    if key is None or not hmac.compare_digest(_sign(key, payload), signature):
+        raise TokenError("Invalid token.")
+    try:
+        _, kind, user_id, generation, expires = payload.split(".")
+        claims = Claims(kind, int(user_id, 16), int(generation, 16), int(expires, 16))
+    except ValueError:
+        raise TokenError("Invalid token.") from None
+    if claims.type != token_type:
+        raise TokenError("Wrong token type.")
+    if claims.expires <= time.time():
+        raise TokenError("Token has expired.")
+    return claims
+
+
+def _generation_key(user_id):
+    return f"token-generation:{user_id}"
+
+
+def current_generation(user_id):
+    generation = django_cache.get(_generation_key(user_id))
+    if generation is None:
+        # From the primary: a lagging replica would keep a revoked token valid for the cache lifetime
+        with pin_to_primary():
+            generation = (
+                TokenGeneration.objects.filter(user_id=user_id).values_list("generation", flat=True).first() or 0
+            )
+        django_cache.set(_generation_key(user_id), generation, GENERATION_CACHE_SECONDS)
+    return generation
+
+
+@transaction.atomic
+def revoke_tokens(user_id):
+    """Invalidate every signed token issued to the user so far."""
+    TokenGeneration.objects.get_or_create(user_id=user_id)
+    TokenGeneration.objects.filter(user_id=user_id).update(generation=F("generation") + 1)
+    generation = TokenGeneration.objects.values_list("generation", flat=True).get(user_id=user_id)
+    transaction.on_commit(lambda: django_cache.set(_generation_key(user_id), generation, GENERATION_CACHE_SECONDS))
+    return generation
+
+
+def issue_pair(user_id):
+    """Return a fresh access/refresh token pair for the user."""
+    generation = current_generation(user_id)
+    return {
+        "access": issue(user_id, generation, ACCESS),
+        "refresh": issue(user_id, generation, REFRESH),
+        "token_type": "Bearer",
+        "expires_in": settings.SIGNED_TOKEN_ACCESS_SECONDS,
+        "refresh_expires_in": settings.SIGNED_TOKEN_REFRESH_SECONDS,
+    }
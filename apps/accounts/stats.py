@@ -0,0 +1,147 @@
+"""Directory statistics kept as incremental counters.
+
+Each profile contributes one to its location and one to its completeness
+bucket (how many of bio, avatar and phone are filled); each user contributes
+one to the day they joined. Signals apply the difference between a row's
+previous and new contribution, so reads are a handful of indexed lookups
+regardless of the number of users. ``reconcile`` recounts from scratch.
+"""
+
+from collections import Counter
+from datetime import timedelta
+from functools import partial
+from types import SimpleNamespace
+
+from django.contrib.auth.models import User
+from django.db import connections, router, transaction
+from django.db.models import Case, Count, Q, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .locations import location_changed, reset_index
+from .models import Profile, StatCounter
+
+Kind = StatCounter.Kind
+
+COMPLETENESS_FIELDS = ["bio", "avatar_url", "phone"]
+PROFILE_FIELDS = ["location", *COMPLETENESS_FIELDS]
+LOCATION_KEY_LENGTH = StatCounter._meta.get_field("key").max_length
+
+
+def completeness(profile):
+    return sum(bool(getattr(profile, name)) for name in COMPLETENESS_FIELDS)
+
+
+def profile_contribution(profile):
+    """The counters a saved profile adds one to."""
+    return {
+        (Kind.TOTAL, "profiles"),
+        (Kind.LOCATION, profile.location[:LOCATION_KEY_LENGTH]),
+        (Kind.COMPLETENESS, str(completeness(profile))),
+    }
+
+
+def user_contribution(user):
+    return {(Kind.TOTAL, "users"), (Kind.SIGNUPS, timezone.localdate(user.date_joined).isoformat())}
+
+
+def stored_contribution(profile):
+    """What the saved row of ``profile`` currently contributes (empty if new)."""
+    if profile._state.adding or profile.pk is None:
+        return set()
+    loaded = getattr(profile, "_loaded_values", {})
+    if all(name in loaded for name in PROFILE_FIELDS):
+        return profile_contribution(SimpleNamespace(**loaded))
+    # Loaded with deferred fields: read the row as it is before this save
+    stored = Profile.objects.filter(pk=profile.pk).values(*PROFILE_FIELDS).first()
+    return profile_contribution(SimpleNamespace(**stored)) if stored else set()
+
+
+def apply_change(old=(), new=()):
+    """Move one unit from the counters in ``old`` to those in ``new``."""
+    deltas = Counter(dict.fromkeys(new, 1))
+    deltas.subtract(dict.fromkeys(old, 1))
+    bump_many([(kind, key, delta) for (kind, key), delta in deltas.items() if delta])
+
+
+def bump(kind, key, delta=1):
+    bump_many([(kind, key, delta)])
+
+
+def bump_many(deltas):
+    """Add each ``(kind, key, delta)`` to its counter, creating missing ones, in one statement."""
+    if not deltas:
+        return
+    connection = connections[router.db_for_write(StatCounter)]
+    quote = connection.ops.quote_name
+    table, kind, key, value = (quote(name) for name in (StatCounter._meta.db_table, "kind", "key", "value"))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({kind}, {key}, {value}) VALUES {', '.join(['(%s, %s, %s)'] * len(deltas))} "
+            f"ON CONFLICT ({kind}, {key}) DO UPDATE SET {value} = {table}.{value} + excluded.{value}",
+            [param for row in deltas for param in row],
+        )
+    for kind, key, delta in deltas:
+        if kind == Kind.LOCATION:
+            transaction.on_commit(partial(location_changed, key, delta))
+
+
+def directory_stats(top_locations=20, signup_days=30):
+    """Totals, top locations, completeness buckets and recent daily signups."""
+    counters = StatCounter.objects.filter(value__gt=0)
+    since = (timezone.localdate() - timedelta(days=signup_days - 1)).isoformat()
+    totals = dict(counters.filter(kind=Kind.TOTAL).values_list("key", "value"))
+    buckets = dict(counters.filter(kind=Kind.COMPLETENESS).values_list("key", "value"))
+    return {
+        "users": totals.get("users", 0),
+        "profiles": totals.get("profiles", 0),
+        "locations": [
+            {"location": key, "users": value}
+            for key, value in counters.filter(kind=Kind.LOCATION)
+            .order_by("-value", "key")
+            .values_list("key", "value")[:top_locations]
+        ],
+        "completeness": [
+            {"filled": filled, "of": len(COMPLETENESS_FIELDS), "profiles": buckets.get(str(filled), 0)}
+            for filled in range(len(COMPLETENESS_FIELDS) + 1)
+        ],
+        "signups": [
+            {"date": key, "users": value}
+            for key, value in counters.filter(kind=Kind.SIGNUPS, key__gte=since)
+            .order_by("key")
+            .values_list("key", "value")
+        ],
+    }
+
+
+def count_all():
+    """Recount every statistic from the users and profiles tables."""
+    counts = Counter()
+    profiles = Profile.objects.order_by()
+    counts[Kind.TOTAL, "profiles"] = profiles.count()
+    for location, total in profiles.values_list("location").annotate(total=Count("id")):
+        counts[Kind.LOCATION, location[:LOCATION_KEY_LENGTH]] += total
+    filled = sum(
+        (Case(When(~Q(**{name: ""}), then=Value(1)), default=Value(0)) for name in COMPLETENESS_FIELDS), Value(0)
+    )
+    for bucket, total in profiles.annotate(filled=filled).values_list("filled").annotate(total=Count("id")):
+        counts[Kind.COMPLETENESS, str(bucket)] += total
+    users = User.objects.order_by()
+    counts[Kind.TOTAL, "users"] = users.count()
+    for day, total in users.annotate(day=TruncDate("date_joined")).values_list("day").annotate(total=Count("id")):
+        counts[Kind.SIGNUPS, day.isoformat()] += total
+    return counts
+
+
+@transaction.atomic
+def reconcile():
+    """Overwrite the counters with a full recount; return how many were wrong."""
+    actual = count_all()
+    stored = {(row.kind, row.key): row for row in StatCounter.objects.select_for_update()}
+    wrong = [key for key in actual.keys() | stored.keys() if actual.get(key, 0) != getattr(stored.get(key), "value", 0)]
+    StatCounter.objects.all().delete()
+    StatCounter.objects.bulk_create(
+        [StatCounter(kind=kind, key=key, value=value) for (kind, key), value in actual.items() if value]
+    )
+    transaction.on_commit(reset_index)
+    return len(wrong)
@@ -0,0 +1,39 @@
+"""Background jobs of the accounts app, run by ``manage.py run_workers``."""
+
+import logging
+
+from django.contrib.auth.models import User
+from django.core.mail import EmailMultiAlternatives, send_mail
+from django.template.loader import render_to_string
+
+from apps.jobs.queue import job
+
+analytics_logger = logging.getLogger("apps.accounts.analytics")
+
+
+@job
+def send_welcome_email(user_id):
+    user = User.objects.filter(pk=user_id).only("username", "first_name", "email").first()
+    if user is None or not user.email:
+        return
+    context = {"user": user}
+    send_mail(
+        render_to_string("accounts/welcome_subject.txt", context).strip(),
+        render_to_string("accounts/welcome_email.txt", context),
+        None,
+        [user.email],
+    )
+
+
+@job
+def send_email(subject, body, from_email, recipients, html_message=None):
+    """Deliver an email rendered during the request."""
+    message = EmailMultiAlternatives(subject, body, from_email, recipients)
+    if html_message:
+        message.attach_alternative(html_message, "text/html")
+    message.send()
+
+
+@job
+def track_event(event, **properties):
+    analytics_logger.info("%s %s", event, " ".join(f"{key}={value}" for key, value in sorted(properties.items())))
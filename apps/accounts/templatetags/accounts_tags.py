@@ -1,4 +1,9 @@
 from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.safestring import mark_safe
+
+from apps.accounts import assets, avatars, stats
 
 register = template.Library()
 
@@ -9,3 +14,45 @@ def avatar_initial(user):
     if user.first_name:
         return user.first_name[0].upper()
     return user.username[0].upper()
+
+
+@register.filter
+def avatar_src(url, size=64):
+    """Return the cached local variant of an avatar URL, queueing a fetch on a miss."""
+    if not url:
+        return ""
+    local = avatars.avatar_url(url, int(size))
+    if local is None:
+        avatars.schedule_fetch(url)
+        return url
+    return local
+
+
+def _static_url(name):
+    try:
+        return static(name)
+    except ValueError:
+        # Not collected yet, so there is no hashed name in the manifest.
+        return settings.STATIC_URL + name
+
+
+@register.simple_tag
+def critical_css():
+    """Return the inlined critical CSS, or "" in DEBUG or before build_assets."""
+    if settings.DEBUG:
+        return ""
+    return mark_safe(assets.critical_css())
+
+
+@register.simple_tag
+def stylesheet_url():
+    """Return the URL of the project stylesheet (the hashed bundle when built)."""
+    if not settings.DEBUG and (assets.static_dir() / assets.BUNDLE_NAME).exists():
+        return _static_url(assets.BUNDLE_NAME)
+    return _static_url(assets.CSS_SOURCES[0])
+
+
+@register.simple_tag
+def directory_stats(top_locations=10, signup_days=14):
+    """Return the precomputed directory statistics (for the admin index)."""
+    return stats.directory_stats(top_locations, signup_days)
@@ -1,15 +1,82 @@
+import asyncio
+import gzip
+import hashlib
+import http.server
+import importlib
+import io
+import json
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from datetime import timedelta
 from io import StringIO
-
-from django.contrib.auth.models import User
-from django.core.exceptions import ValidationError
-from django.core.management import call_command
-from django.test import Client, TestCase
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.forms import SetPasswordForm
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
+from rest_framework.throttling import ScopedRateThrottle
+
+from apps.jobs.models import Job
+from apps.jobs.queue import claim, run_job
 
+from . import archive, availability, avatars, breached, locations, profiling, signed_tokens, stats
+from .api_views import USERS_BATCH_MAX
+from .assets import BUNDLE_NAME, CRITICAL_NAME, build_assets, critical_css, minify_css
+from .authentication import SignedTokenAuthentication
+from .events import EventHub, hub
 from .forms import ProfileForm, RegisterForm, UserUpdateForm
-from .models import Profile, phone_validator
+from .loginguard import LoginGuard, get_guard
+from .middleware import ReplicaPinMiddleware
+from .models import ArchivedUser, ChangeLogEntry, Profile, StatCounter, UserDirectory, phone_validator
+from .pagination import DirectoryPagination
+from .phones import normalize_phone
+from .profiles import get_profile, provision_profiles
+from .routers import PrimaryReplicaRouter, is_pinned_to_primary, pin_to_primary
+from .schema import artifact_path
+from .tiered_cache import TieredCache, _FrontTier
+from .tracking import write_counts
+from .usercache import get_cached_user
+
+PASSWORD = "TestPass123!"
+
+
+def setUpModule():
+    # Under the production settings the default cache is a file shared across runs; start from a clean slate.
+    cache.clear()
+
+
+def make_user(username, email=None, profile=None, **fields):
+    """Create a user with the shared test password, setting ``profile`` fields on the signal-created profile.
+
+    Call it from ``setUpTestData``: rows made there are created once per class and rolled back after it.
+    """
+    user = User.objects.create_user(username, email or f"{username}@example.com", PASSWORD, **fields)
+    if profile:
+        for name, value in profile.items():
+            setattr(user.profile, name, value)
+        user.profile.save()
+    return user
 
 
 class ProfileSignalTests(TestCase):
@@ -95,9 +162,9 @@ class UserUpdateFormTests(TestCase):
 class AuthViewTests(TestCase):
     """Test authentication views."""
 
-    def setUp(self):
-        self.client = Client()
-        self.user = User.objects.create_user("testuser", "test@example.com", "TestPass123!")
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("testuser", "test@example.com")
 
     def test_home_page_accessible(self):
         response = self.client.get(reverse("accounts:home"))
@@ -143,11 +210,14 @@ class AuthViewTests(TestCase):
 class APIPermissionTests(TestCase):
     """Test API permissions."""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = make_user("user1", "u1@example.com")
+        cls.user2 = make_user("user2", "u2@example.com")
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "AdminPass123!")
+
     def setUp(self):
         self.client = APIClient()
-        self.user1 = User.objects.create_user("user1", "u1@example.com", "TestPass123!")
-        self.user2 = User.objects.create_user("user2", "u2@example.com", "TestPass123!")
-        self.admin = User.objects.create_superuser("admin", "admin@example.com", "AdminPass123!")
 
     def test_unauthenticated_access_denied(self):
         response = self.client.get("/api/profiles/")
@@ -270,13 +340,12 @@ class StaticPageViewTests(TestCase):
 class ProfileViewTests(TestCase):
     """Test profile edit view."""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("testuser", "test@example.com", first_name="Test", last_name="User")
+
     def setUp(self):
-        self.client = Client()
-        self.user = User.objects.create_user("testuser", "test@example.com", "TestPass123!")
-        self.user.first_name = "Test"
-        self.user.last_name = "User"
-        self.user.save()
-        self.client.login(username="testuser", password="TestPass123!")
+        self.client.force_login(self.user)
 
     def test_profile_page_loads(self):
         response = self.client.get(reverse("accounts:profile"))
@@ -306,9 +375,9 @@ class ProfileViewTests(TestCase):
 class PasswordViewTests(TestCase):
     """Test password change and reset views."""
 
-    def setUp(self):
-        self.client = Client()
-        self.user = User.objects.create_user("testuser", "test@example.com", "TestPass123!")
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("testuser", "test@example.com")
 
     def test_password_change_requires_login(self):
         response = self.client.get(reverse("accounts:password_change"))
@@ -331,6 +400,12 @@ class PasswordViewTests(TestCase):
             },
         )
         self.assertEqual(response.status_code, 302)
+        # Delivery is left to a background job
+        self.assertEqual(len(mail.outbox), 0)
+        queued = Job.objects.get()
+        self.assertEqual(queued.name, "apps.accounts.tasks.send_email")
+        self.assertTrue(run_job(claim("test")))
+        self.assertEqual(mail.outbox[0].to, ["test@example.com"])
 
 
 class LogoutViewTests(TestCase):
@@ -348,11 +423,14 @@ class LogoutViewTests(TestCase):
 class APICrudTests(TestCase):
     """Test full CRUD on profiles API."""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("testuser", "test@example.com")
+        cls.profile = cls.user.profile
+
     def setUp(self):
         self.client = APIClient()
-        self.user = User.objects.create_user("testuser", "test@example.com", "TestPass123!")
         self.client.force_authenticate(user=self.user)
-        self.profile = self.user.profile
 
     def test_retrieve_own_profile(self):
         response = self.client.get(f"/api/profiles/{self.profile.id}/")
@@ -403,16 +481,13 @@ class APICrudTests(TestCase):
 class APISearchTests(TestCase):
     """Test API search and ordering."""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = make_user("alice", profile={"location": "Stockholm", "bio": "Developer"})
+        cls.user2 = make_user("bob", profile={"location": "Gothenburg", "bio": "Designer"})
+
     def setUp(self):
         self.client = APIClient()
-        self.user1 = User.objects.create_user("alice", "alice@example.com", "TestPass123!")
-        self.user1.profile.location = "Stockholm"
-        self.user1.profile.bio = "Developer"
-        self.user1.profile.save()
-        self.user2 = User.objects.create_user("bob", "bob@example.com", "TestPass123!")
-        self.user2.profile.location = "Gothenburg"
-        self.user2.profile.bio = "Designer"
-        self.user2.profile.save()
         self.client.force_authenticate(user=self.user1)
 
     def test_search_by_location(self):
@@ -436,6 +511,23 @@ class APISchemaTests(TestCase):
         response = self.client.get("/api/schema/")
         self.assertEqual(response.status_code, 200)
 
+    def test_schema_etag_revalidation(self):
+        etag = self.client.get("/api/schema/")["ETag"]
+        response = self.client.get("/api/schema/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_schema_served_gzipped(self):
+        response = self.client.get("/api/schema/", HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("paths", json.loads(gzip.decompress(response.content)))
+
+    def test_build_schema_command(self):
+        with tempfile.TemporaryDirectory() as schema_dir, override_settings(OPENAPI_SCHEMA_DIR=Path(schema_dir)):
+            call_command("build_schema", stdout=StringIO())
+            path = artifact_path()
+            self.assertTrue(path.exists())
+            self.assertEqual(gzip.decompress(path.with_name(path.name + ".gz").read_bytes()), path.read_bytes())
+
     def test_swagger_ui(self):
         response = self.client.get("/api/docs/")
         self.assertEqual(response.status_code, 200)
@@ -459,3 +551,1609 @@ class SeedCommandTests(TestCase):
         call_command("seed_users", stdout=StringIO())
         call_command("seed_users", stdout=StringIO())
         self.assertEqual(User.objects.filter(username="admin").count(), 1)
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class ReplicaRoutingTests(SimpleTestCase):
+    """Test primary/replica routing and read-your-writes pinning."""
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def _middleware(self):
+        return ReplicaPinMiddleware(lambda request: HttpResponse(str(is_pinned_to_primary())))
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(Profile), "replica1")
+        self.assertEqual(self.router.db_for_read(User), "replica1")
+
+    def test_writes_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Profile), "default")
+
+    def test_pinned_reads_go_to_primary(self):
+        with pin_to_primary():
+            self.assertEqual(self.router.db_for_read(Profile), "default")
+
+    def test_unrouted_apps_ignored(self):
+        from django.contrib.sessions.models import Session
+
+        self.assertIsNone(self.router.db_for_read(Session))
+
+    def test_no_migrations_on_replica(self):
+        self.assertFalse(self.router.allow_migrate("replica1", "accounts"))
+        self.assertIsNone(self.router.allow_migrate("default", "accounts"))
+
+    def test_write_request_pins_client(self):
+        response = self._middleware()(self.factory.post("/profile/"))
+        self.assertEqual(response.content, b"True")
+        self.assertIn("replica_pin", response.cookies)
+
+    def test_pinned_client_reads_from_primary(self):
+        response = self._middleware()(self.factory.post("/profile/"))
+        request = self.factory.get("/profile/")
+        request.COOKIES["replica_pin"] = response.cookies["replica_pin"].value
+        self.assertEqual(self._middleware()(request).content, b"True")
+
+    def test_fresh_client_reads_from_replica(self):
+        response = self._middleware()(self.factory.get("/profile/"))
+        self.assertEqual(response.content, b"False")
+        self.assertNotIn("replica_pin", response.cookies)
+
+
+@skipUnless("replica" in settings.DATABASES, "The replica database is defined by config.settings_test")
+class ReplicaDatabaseTests(TransactionTestCase):
+    """Test read-your-writes against a second SQLite database standing in for a replica.
+
+    A TransactionTestCase: inside TestCase's transaction every read is kept on the primary.
+    """
+
+    databases = {"default", "replica"} if "replica" in settings.DATABASES else {"default"}
+
+    def setUp(self):
+        # Not a class decorator: the replica is flushed after each test only while it is not a replica
+        self.enterContext(override_settings(DATABASE_REPLICAS=["replica"]))
+        self.user = make_user("alice", profile={"bio": "old"})
+        # Replicate the rows the requests below read; later writes do not reach the replica.
+        for model in (User, Profile, UserDirectory):
+            model.objects.using("replica").bulk_create(model.objects.using("default").all())
+        self.client.force_login(self.user)
+        self.url = f"/api/profiles/{self.user.profile.pk}/"
+        response = self.client.patch(self.url, {"bio": "new"}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("replica_pin", response.cookies)
+
+    def test_pinned_client_reads_its_write(self):
+        self.assertEqual(self.client.get(self.url).json()["bio"], "new")
+        del self.client.cookies["replica_pin"]
+        self.assertEqual(self.client.get(self.url).json()["bio"], "old")
+
+    def test_token_checks_read_the_primary(self):
+        access = signed_tokens.issue_pair(self.user.pk)["access"]
+        signed_tokens.revoke_tokens(self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(first_name="Primary")
+        cache.clear()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(client.get("/api/stats/").status_code, 401)
+        self.assertEqual(get_cached_user(self.user.pk).first_name, "Primary")
+
+    def test_streamed_page_stays_pinned(self):
+        with mock.patch.object(DirectoryPagination, "stream_page_size", 1):
+            response = self.client.get("/api/profiles/", {"page_size": 1})
+            self.assertIsInstance(response, StreamingHttpResponse)
+            data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(data["results"][0]["bio"], "new")
+
+
+class ProfileProvisioningTests(TestCase):
+    """Test lazy profile access, bulk provisioning and the backfill command."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = make_user("testuser", "test@example.com")
+        Profile.objects.filter(user=user).delete()
+        cls.user = User.objects.get(pk=user.pk)
+
+    def test_get_profile_does_not_write(self):
+        profile = get_profile(self.user)
+        self.assertIsNone(profile.pk)
+        self.assertIs(self.user.profile, profile)
+        self.assertFalse(Profile.objects.filter(user=self.user).exists())
+
+    def test_profile_page_get_does_not_create_profile(self):
+        self.client.login(username="testuser", password="TestPass123!")
+        response = self.client.get(reverse("accounts:profile"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Profile.objects.filter(user=self.user).exists())
+
+    def test_profile_page_post_creates_profile(self):
+        self.client.login(username="testuser", password="TestPass123!")
+        self.client.post(
+            reverse("accounts:profile"),
+            {"first_name": "T", "last_name": "U", "email": "test@example.com", "bio": "Hi"},
+        )
+        self.assertEqual(Profile.objects.get(user=self.user).bio, "Hi")
+
+    def test_provision_profiles_after_bulk_create(self):
+        users = User.objects.bulk_create([User(username="bulk1"), User(username="bulk2")])
+        self.assertEqual(provision_profiles(users), 2)
+        self.assertEqual(provision_profiles(users), 0)
+        self.assertEqual(Profile.objects.filter(user__username__startswith="bulk").count(), 2)
+
+    def test_provisioned_profiles_in_change_feed(self):
+        users = User.objects.bulk_create([User(username="bulk1"), User(username="bulk2")])
+        provision_profiles(users)
+        profile_ids = set(Profile.objects.filter(user__in=users).values_list("pk", flat=True))
+        entries = ChangeLogEntry.objects.filter(kind="profile", action=ChangeLogEntry.Action.CREATED)
+        self.assertEqual(
+            set(entries.filter(object_id__in=profile_ids).values_list("object_id", flat=True)), profile_ids
+        )
+        provision_profiles(users)
+        self.assertEqual(entries.filter(object_id__in=profile_ids).count(), 2)
+
+    def test_backfill_command(self):
+        call_command("backfill_profiles", stdout=StringIO())
+        self.assertTrue(Profile.objects.filter(user=self.user).exists())
+
+
+class BootCommandTests(TestCase):
+    """Test the boot command skips work that is already done."""
+
+    def test_boot_skips_completed_steps(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            static_dir = Path(tmp) / "static"
+            static_root = Path(tmp) / "staticfiles"
+            shutil.copytree(settings.STATICFILES_DIRS[0], static_dir, ignore=shutil.ignore_patterns("dist"))
+            self.enterContext(
+                override_settings(
+                    STATICFILES_DIRS=[static_dir],
+                    STATIC_ROOT=static_root,
+                    OPENAPI_SCHEMA_DIR=static_root / "openapi",
+                    PASSWORD_FILTER_PATH=Path(tmp) / "password_filter.bloom",
+                )
+            )
+
+            first = StringIO()
+            call_command("boot", stdout=first)
+            self.assertIn("migrate: skipped", first.getvalue())
+            self.assertIn("collectstatic: collected", first.getvalue())
+
+            second = StringIO()
+            call_command("boot", stdout=second)
+            self.assertIn("collectstatic: skipped", second.getvalue())
+            self.assertIn("build_schema: skipped", second.getvalue())
+            self.assertIn("build_password_filter: skipped", second.getvalue())
+
+
+class AssetPipelineTests(SimpleTestCase):
+    """Test CSS minification, bundling and critical CSS inlining."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.static_dir = Path(tmp.name)
+        shutil.copytree(settings.STATICFILES_DIRS[0] / "css", self.static_dir / "css")
+        self.enterContext(override_settings(STATICFILES_DIRS=[self.static_dir]))
+        critical_css.cache_clear()
+        self.addCleanup(critical_css.cache_clear)
+
+    def test_minify_css(self):
+        css = "/* note */\na > b ,  c {\n  content: ' ; { ';\n  margin: 0 auto;\n}\n"
+        self.assertEqual(minify_css(css), "a>b,c{content:' ; { ';margin:0 auto}")
+
+    def test_build_assets(self):
+        build_assets()
+        bundle = (self.static_dir / BUNDLE_NAME).read_text()
+        critical = (self.static_dir / CRITICAL_NAME).read_text()
+        self.assertLess(len(bundle), (self.static_dir / "css/main.css").stat().st_size)
+        self.assertTrue(critical.startswith(":root{"))
+        self.assertIn(".navbar-custom", critical)
+        self.assertNotIn(".hero", critical)
+
+    def test_base_template_inlines_critical_css(self):
+        build_assets()
+        response = self.client.get(reverse("accounts:about"))
+        self.assertContains(response, "<style>:root{")
+        self.assertContains(response, BUNDLE_NAME)
+
+
+class ChangeFeedTests(TestCase):
+    """Test the profile change feed and its compaction."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("testuser", "test@example.com")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _changes(self, since=0, **params):
+        return self.client.get("/api/profiles/changes/", {"since": since, **params}).json()
+
+    def test_creation_is_logged(self):
+        data = self._changes()
+        kinds = {(entry["kind"], entry["action"]) for entry in data["results"]}
+        self.assertEqual(kinds, {("user", "created"), ("profile", "created")})
+        self.assertFalse(data["has_more"])
+
+    def test_only_deltas_after_cursor(self):
+        cursor = self._changes()["next_cursor"]
+        self.user.profile.bio = "Changed"
+        self.user.profile.save()
+        data = self._changes(cursor)
+        self.assertEqual(len(data["results"]), 1)
+        self.assertEqual(data["results"][0]["action"], "updated")
+        self.assertEqual(data["results"][0]["data"]["bio"], "Changed")
+
+    def test_deletes_are_logged(self):
+        cursor = self._changes()["next_cursor"]
+        profile_id = self.user.profile.pk
+        self.user.profile.delete()
+        entry = self._changes(cursor)["results"][0]
+        self.assertEqual((entry["kind"], entry["object_id"], entry["action"]), ("profile", profile_id, "deleted"))
+        self.assertIsNone(entry["data"])
+
+    def test_batches(self):
+        data = self._changes(limit=1)
+        self.assertEqual(len(data["results"]), 1)
+        self.assertTrue(data["has_more"])
+        self.assertEqual(len(self._changes(data["next_cursor"], limit=1)["results"]), 1)
+
+    def test_logins_are_not_logged(self):
+        cursor = self._changes()["next_cursor"]
+        self.assertTrue(self.client.login(username="testuser", password=PASSWORD))
+        self.assertEqual(self._changes(cursor)["results"], [])
+
+    def test_late_commit_with_lower_id_is_not_skipped(self):
+        # The first entry stands in for one whose transaction commits after a reader has moved past its id
+        late = ChangeLogEntry.objects.order_by("pk").first()
+        late.delete()
+        cursor = self._changes()["next_cursor"]
+        ChangeLogEntry.objects.create(pk=late.pk, kind=late.kind, object_id=late.object_id, action=late.action)
+        entry = self._changes(cursor)["results"][0]
+        self.assertEqual((entry["kind"], entry["object_id"]), (late.kind, late.object_id))
+        self.assertGreater(entry["cursor"], cursor)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/profiles/changes/", {"since": "abc"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_compaction_keeps_latest_entry_per_object(self):
+        for bio in ["one", "two", "three"]:
+            self.user.profile.bio = bio
+            self.user.profile.save()
+        call_command("compact_changelog", stdout=StringIO())
+        profile_entries = ChangeLogEntry.objects.filter(kind="profile")
+        self.assertEqual(profile_entries.count(), 1)
+        self.assertEqual(profile_entries.get().action, "updated")
+        self.assertEqual(self._changes()["results"][-1]["data"]["bio"], "three")
+
+
+class EventHubTests(SimpleTestCase):
+    """Test the in-process server-sent events hub."""
+
+    async def test_published_event_reaches_subscriber(self):
+        events = EventHub()
+        subscriber = events.subscribe()
+        stream = events.stream(subscriber)
+        self.assertEqual(await anext(stream), "retry: 5000\n\n")
+        await asyncio.to_thread(events.publish, {"id": 1, "bio": "Hi"})
+        self.assertEqual(await anext(stream), 'event: profile\ndata: {"id": 1, "bio": "Hi"}\n\n')
+        await stream.aclose()
+        self.assertEqual(len(events), 0)
+
+    async def test_subscriber_filter(self):
+        events = EventHub()
+        subscriber = events.subscribe(profile_ids={2})
+        events.publish({"id": 1})
+        events.publish({"id": 2})
+        await asyncio.sleep(0)
+        self.assertEqual(subscriber.queue.qsize(), 1)
+
+    async def test_slow_consumer_dropped(self):
+        events = EventHub()
+        subscriber = events.subscribe(maxsize=2)
+        for pk in range(3):
+            events.publish({"id": pk})
+        await asyncio.sleep(0)
+        self.assertTrue(subscriber.dropped)
+        stream = events.stream(subscriber)
+        await anext(stream)
+        self.assertEqual(await anext(stream), "event: dropped\ndata: {}\n\n")
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
+        self.assertEqual(len(events), 0)
+
+    async def test_heartbeat(self):
+        events = EventHub()
+        stream = events.stream(events.subscribe(), heartbeat=0.01)
+        await anext(stream)
+        self.assertEqual(await anext(stream), ": heartbeat\n\n")
+        await stream.aclose()
+
+
+class ProfileStreamTests(TestCase):
+    """Test the profile stream endpoint and event publishing."""
+
+    async def test_stream_requires_authentication(self):
+        response = await self.async_client.get("/api/profiles/stream/")
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_refused_under_wsgi(self):
+        self.client.force_login(User.objects.create_user("testuser"))
+        response = self.client.get("/api/profiles/stream/")
+        self.assertEqual(response.status_code, 501)
+        self.assertNotIsInstance(response, StreamingHttpResponse)
+
+    async def test_stream_accepts_signed_tokens(self):
+        user = await User.objects.acreate(username="testuser")
+        access = (await sync_to_async(signed_tokens.issue_pair)(user.pk))["access"]
+        response = await self.async_client.get("/api/profiles/stream/", headers={"Authorization": f"Bearer {access}"})
+        self.assertEqual(response.status_code, 200)
+        stream = aiter(response.streaming_content)
+        await anext(stream)
+        await stream.aclose()
+        response = await self.async_client.get("/api/profiles/stream/", headers={"Authorization": "Bearer nope"})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_stream_delivers_events(self):
+        user = await User.objects.acreate(username="testuser")
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.get("/api/profiles/stream/", {"ids": "7"})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        await anext(stream)
+        hub.publish({"id": 7, "bio": "Live"})
+        self.assertIn(b'"bio": "Live"', await anext(stream))
+        await stream.aclose()
+
+    def test_profile_save_publishes_event(self):
+        user = User.objects.create_user("testuser", "test@example.com", "TestPass123!")
+        with (
+            mock.patch.object(EventHub, "__len__", lambda events: 1),
+            mock.patch.object(hub, "publish") as publish,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            user.profile.bio = "Live"
+            user.profile.save()
+        event = publish.call_args.args[0]
+        self.assertEqual((event["id"], event["bio"]), (user.profile.pk, "Live"))
+
+
+class LoginGuardTests(SimpleTestCase):
+    """Test failed-login counting and progressive lockout."""
+
+    def setUp(self):
+        self.path = Path(self.enterContext(tempfile.TemporaryDirectory())) / "loginguard.sqlite3"
+        self.guard = LoginGuard(windows=[(300, 1), (3600, 4)], path=self.path)
+
+    def _fail(self, times, username="alice", ip="10.0.0.1"):
+        for _ in range(times):
+            self.guard.record_failure(username, ip)
+
+    def test_pair_locked_after_limit(self):
+        self._fail(4)
+        self.assertFalse(self.guard.is_locked("alice", "10.0.0.1"))
+        self._fail(1)
+        self.assertTrue(self.guard.is_locked("Alice", "10.0.0.1"))
+        self.assertFalse(self.guard.is_locked("bob", "10.0.0.1"))
+
+    def test_username_locked_across_rotating_ips(self):
+        for host in range(20):
+            self.guard.record_failure("alice", f"192.168.{host}.1")
+        self.assertTrue(self.guard.is_locked("alice", "172.16.0.1"))
+        self.assertFalse(self.guard.is_locked("bob", "172.16.0.1"))
+
+    def test_busy_source_tightens_limits_without_locking_it(self):
+        for index in range(50):
+            self.guard.record_failure(f"user{index}", "10.0.0.1")
+        # Others behind the same address are not locked out...
+        self.assertFalse(self.guard.is_locked("bob", "10.0.0.1"))
+        self.assertFalse(self.guard.is_locked("bob", "10.0.0.2"))
+        # ...but get fewer tries
+        self._fail(2, username="bob")
+        self.assertTrue(self.guard.is_locked("bob", "10.0.0.1"))
+        self.assertFalse(self.guard.is_locked("bob", "10.9.0.1"))
+
+    def test_invalid_address_shares_no_source_key(self):
+        self.assertEqual(set(LoginGuard.keys_for("a", "")), {"pair", "username"})
+        for index in range(60):
+            self.guard.record_failure(f"user{index}", "")
+        self.assertFalse(self.guard.is_locked("bob", ""))
+        self._fail(4, username="bob", ip="")
+        self.assertFalse(self.guard.is_locked("bob", ""))
+
+    def test_counters_shared_between_workers(self):
+        # Each worker process builds its own guard on the same file.
+        other_worker = LoginGuard(windows=[(300, 1), (3600, 4)], path=self.path)
+        self._fail(3)
+        for _ in range(2):
+            other_worker.record_failure("alice", "10.0.0.1")
+        self.assertTrue(self.guard.is_locked("alice", "10.0.0.1"))
+
+    def test_storage_bounded_and_apart_from_the_cache(self):
+        guard = LoginGuard(windows=[(300, 1), (3600, 4)], width=64, depth=2, path=self.path)
+        with mock.patch.object(cache, "set") as cache_set, mock.patch.object(cache, "add") as cache_add:
+            for index in range(500):
+                guard.record_failure(f"user{index}", f"10.{index % 250}.{index // 250}.1")
+        cache_set.assert_not_called()
+        cache_add.assert_not_called()
+        (cells,) = guard._db.execute("SELECT COUNT(*) FROM sketch_cells").fetchone()
+        self.assertLessEqual(cells, 2 * 2 * 2 * 64)
+
+    def test_hot_keys_bounded_and_aged_out(self):
+        for host in range(30):
+            self.guard.record_failure(f"user{host}", f"10.0.{host}.1")
+        self.assertEqual(len(self.guard.hot_keys()), 50)
+        with mock.patch("apps.accounts.loginguard.time.time", return_value=time.time() + 3601):
+            self.guard.record_failure("bob", "10.9.9.9")
+            self.assertEqual({row["kind"] for row in self.guard.hot_keys()}, {"pair", "username", "ip", "subnet"})
+            self.assertEqual(len(self.guard.hot_keys()), 4)
+
+    def test_hot_keys(self):
+        self._fail(6)
+        rows = self.guard.hot_keys()
+        self.assertEqual(rows[0]["counts"], [6, 6])
+        self.assertTrue(any(row["kind"] == "pair" and row["over_limit"] for row in rows))
+
+    def test_subnet_key(self):
+        self.assertEqual(LoginGuard.keys_for("a", "10.1.2.3")["subnet"], "10.1.2.0/24")
+        self.assertEqual(LoginGuard.keys_for("a", "2001:db8::1")["subnet"], "2001:db8::/64")
+
+
+# Counters per test thread: under the production settings the file is shared with parallel test workers
+@override_settings(LOGIN_GUARD_PATH=":memory:")
+class LoginGuardViewTests(TestCase):
+    """Test the login view lockout and the staff hot-key page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("testuser", "test@example.com")
+
+    def setUp(self):
+        cache.clear()
+        get_guard.cache_clear()
+        self.addCleanup(get_guard.cache_clear)
+
+    def test_login_locked_after_failures(self):
+        for _ in range(5):
+            response = self.client.post(reverse("accounts:login"), {"username": "testuser", "password": "wrong"})
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post(reverse("accounts:login"), {"username": "testuser", "password": "TestPass123!"})
+        self.assertRedirects(response, reverse("accounts:login"))
+        self.assertNotIn("_auth_user_id", self.client.session)
+
+    def test_successful_login_not_counted(self):
+        self.client.post(reverse("accounts:login"), {"username": "testuser", "password": "TestPass123!"})
+        self.assertEqual(get_guard().hot_keys(), [])
+
+    @override_settings(
+        STORAGES={
+            "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+            "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+        }
+    )
+    def test_hot_keys_page_staff_only(self):
+        self.client.post(reverse("accounts:login"), {"username": "testuser", "password": "wrong"})
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("admin_login_attempts")).status_code, 302)
+        admin = User.objects.create_superuser("admin", "admin@example.com", "AdminPass123!")
+        self.client.force_login(admin)
+        response = self.client.get(reverse("admin_login_attempts"))
+        self.assertContains(response, "testuser|127.0.0.1")
+
+
+def _png_bytes(size=(300, 200)):
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.new("RGB", size, "#4f6af0").save(out, "PNG")
+    return out.getvalue()
+
+
+class _ImageHandler(http.server.BaseHTTPRequestHandler):
+    hosts = []
+
+    def do_GET(self):
+        self.hosts.append(self.headers["Host"])
+        body, content_type = (_png_bytes(), "image/png") if self.path == "/avatar.png" else (b"<html>", "text/html")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class AvatarProxyTests(TestCase):
+    """Test fetching, resizing, serving and evicting cached avatars."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _ImageHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(AVATAR_CACHE_DIR=Path(tmp.name), AVATAR_ALLOW_PRIVATE_HOSTS=True))
+        self.url = f"{self.base_url}/avatar.png"
+        cache.clear()
+
+    def test_fetch_stores_resized_variants(self):
+        from PIL import Image
+
+        digest = avatars.fetch_avatar(self.url)
+        self.assertEqual(avatars.cached_digest(self.url), digest)
+        for size in avatars.AVATAR_SIZES:
+            with Image.open(avatars.variant_path(digest, size)) as image:
+                self.assertEqual((image.format, image.size), ("WEBP", (size, size)))
+
+    def test_variant_served_with_immutable_headers(self):
+        avatars.fetch_avatar(self.url)
+        response = self.client.get(avatars.avatar_url(self.url, 64))
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(self.client.get(reverse("accounts:avatar", args=["0" * 64, 64])).status_code, 404)
+
+    def test_non_image_rejected(self):
+        with self.assertRaises(avatars.AvatarError):
+            avatars.fetch_avatar(f"{self.base_url}/page.html")
+
+    def test_private_host_rejected(self):
+        with override_settings(AVATAR_ALLOW_PRIVATE_HOSTS=False), self.assertRaises(avatars.AvatarError):
+            avatars.fetch_avatar(self.url)
+
+    def test_connects_to_checked_address(self):
+        getaddrinfo = socket.getaddrinfo
+        lookups = []
+
+        def resolve(host, *args, **kwargs):
+            if host != "avatars.example":
+                return getaddrinfo(host, *args, **kwargs)
+            lookups.append(host)
+            # A rebinding resolver answers with a different address the second time
+            return getaddrinfo("127.0.0.1" if len(lookups) == 1 else "192.0.2.1", *args, **kwargs)
+
+        port = self.server.server_address[1]
+        with mock.patch("socket.getaddrinfo", resolve):
+            avatars.fetch_avatar(f"http://avatars.example:{port}/avatar.png")
+        self.assertEqual(lookups, ["avatars.example"])
+        self.assertEqual(_ImageHandler.hosts[-1], f"avatars.example:{port}")
+
+    def test_oversized_image_rejected(self):
+        with mock.patch.object(avatars, "MAX_SOURCE_PIXELS", 300 * 200 - 1), self.assertRaises(avatars.AvatarError):
+            avatars.fetch_avatar(self.url)
+
+    def test_failed_fetch_not_retried(self):
+        url = f"{self.base_url}/page.html"
+        with self.assertLogs("apps.accounts.avatars", "WARNING"):
+            avatars.schedule_fetch(url).result(timeout=10)
+        self.assertIsNone(avatars.schedule_fetch(url))
+
+    def test_lru_eviction(self):
+        digest = avatars.fetch_avatar(self.url)
+        self.assertEqual(avatars.evict(max_bytes=0), len(avatars.AVATAR_SIZES))
+        self.assertFalse(avatars.variant_path(digest, 32).exists())
+        self.assertIsNone(avatars.cached_digest(self.url))
+        self.assertIsNone(avatars.avatar_url(self.url, 32))
+
+    def test_background_fetch_and_serializer(self):
+        user = User.objects.create_user("testuser", "test@example.com", "TestPass123!")
+        profile = user.profile
+        profile.avatar_url = self.url
+        profile.save()
+        avatars.schedule_fetch(self.url).result(timeout=10)
+        self.client.force_login(user)
+        data = self.client.get(f"/api/profiles/{profile.pk}/").json()
+        self.assertTrue(data["avatar_thumbnails"]["128"].startswith("http://testserver/avatars/"))
+
+
+class UserDirectoryTests(TestCase):
+    """Test the denormalized user directory and the list endpoints built on it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user(
+            "Alice",
+            "alice@example.com",
+            first_name="Alice",
+            profile={"location": "Stockholm", "bio": "Backend Developer"},
+        )
+        cls.other = make_user("bob")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_row_kept_in_sync(self):
+        entry = UserDirectory.objects.get(user=self.user)
+        self.assertEqual((entry.profile_id, entry.location), (self.user.profile.pk, "Stockholm"))
+        self.assertEqual(entry.profile_search_key, "alice stockholm backend developer")
+        self.user.last_name = "Andersson"
+        self.user.save()
+        self.assertEqual(UserDirectory.objects.get(user=self.user).user_search_key, "alice alice andersson")
+
+    def test_profile_and_user_deletion(self):
+        self.user.profile.delete()
+        self.assertIsNone(UserDirectory.objects.get(user=self.user).profile_id)
+        self.other.delete()
+        self.assertFalse(UserDirectory.objects.filter(user_id=self.other.pk).exists())
+
+    def test_case_insensitive_search(self):
+        response = self.client.get("/api/users/", {"search": "ALI"})
+        self.assertEqual([row["username"] for row in response.data["results"]], ["Alice"])
+        response = self.client.get("/api/profiles/", {"search": "developer stockholm"})
+        self.assertEqual(response.data["count"], 1)
+
+    def test_ordering(self):
+        response = self.client.get("/api/users/", {"ordering": "username"})
+        self.assertEqual([row["username"] for row in response.data["results"]], ["Alice", "bob"])
+        response = self.client.get("/api/profiles/", {"ordering": "updated_at"})
+        self.assertEqual(response.data["results"][0]["username"], "Alice")
+
+    def test_list_queries(self):
+        # Count and page ids from the directory, then one query for the page.
+        with self.assertNumQueries(3):
+            self.client.get("/api/users/", {"search": "b"})
+
+    def test_rebuild_command(self):
+        UserDirectory.objects.all().delete()
+        call_command("rebuild_directory", stdout=StringIO())
+        self.assertEqual(UserDirectory.objects.count(), 2)
+        self.assertEqual(UserDirectory.objects.get(user=self.user).location, "Stockholm")
+
+
+class TieredCacheTests(SimpleTestCase):
+    """Test the two-tier cache backend."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.location = Path(tmp.name) / "cache.sqlite3"
+
+    def _cache(self, **options):
+        backend = TieredCache(self.location, {"OPTIONS": {"SYNC_INTERVAL": 0, **options}})
+        # A private front tier stands in for a separate worker process.
+        backend._front = _FrontTier(100)
+        return backend
+
+    def test_set_get_delete(self):
+        backend = self._cache()
+        backend.set("key", {"a": 1})
+        self.assertEqual(backend.get("key"), {"a": 1})
+        self.assertTrue(backend.delete("key"))
+        self.assertIsNone(backend.get("key"))
+
+    def test_shared_between_processes(self):
+        first, second = self._cache(), self._cache()
+        first.set("key", "value")
+        self.assertEqual(second.get("key"), "value")
+        self.assertEqual(second.get("key"), "value")
+        self.assertEqual((second.stats()["shared"], second.stats()["front"]), (1, 1))
+
+    def test_invalidation_reaches_other_front_tier(self):
+        first, second = self._cache(), self._cache()
+        first.set("key", 1)
+        second.get("key")
+        first.set("key", 2)
+        self.assertEqual(second.get("key"), 2)
+        first.clear()
+        self.assertIsNone(second.get("key"))
+
+    def test_incr_and_add(self):
+        first, second = self._cache(), self._cache()
+        self.assertTrue(first.add("counter", 1))
+        self.assertFalse(second.add("counter", 5))
+        self.assertEqual(second.incr("counter"), 2)
+        self.assertEqual(first.incr("counter", 3), 5)
+        with self.assertRaises(ValueError):
+            first.incr("missing")
+
+    def test_expiry(self):
+        backend = self._cache()
+        backend.set("key", "value", timeout=0)
+        self.assertIsNone(backend.get("key"))
+        backend.set("key", "value", timeout=60)
+        self.assertTrue(backend.touch("key", timeout=0))
+        self.assertIsNone(backend.get("key"))
+
+    def test_cull_keeps_entries_without_expiry(self):
+        backend = self._cache(MAX_ENTRIES=2, CULL_FREQUENCY=100)
+        backend.set("forever", 1, timeout=None)
+        backend.set("soon", 2, timeout=60)
+        with mock.patch("apps.accounts.tiered_cache.CULL_PROBABILITY", 1):
+            backend.set("later", 3, timeout=3600)
+        backend._front.entries.clear()
+        self.assertEqual([backend.get(key) for key in ["forever", "soon", "later"]], [1, None, 3])
+
+    def test_shared_tier_read_outside_front_lock(self):
+        backend = self._cache()
+        backend.set("key", "value")
+        backend._front.entries.clear()
+        load = backend._load
+
+        def checked_load(*args):
+            self.assertFalse(backend._front.lock.locked())
+            return load(*args)
+
+        with mock.patch.object(backend, "_load", checked_load):
+            self.assertEqual(backend.get("key"), "value")
+            self.assertIsNone(backend.get("missing"))
+
+    def test_hit_ratio(self):
+        backend = self._cache()
+        backend.get("missing")
+        backend.set("key", 1)
+        backend.get("key")
+        self.assertEqual(backend.stats()["hit_ratio"], 0.5)
+
+
+class CacheStatsViewTests(TestCase):
+    """Test the staff cache statistics endpoint."""
+
+    def setUp(self):
+        # The test settings use a plain local memory cache
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cache_settings = {"BACKEND": "apps.accounts.tiered_cache.TieredCache", "LOCATION": Path(tmp.name) / "cache"}
+        self.enterContext(override_settings(CACHES={"default": cache_settings}))
+
+    def test_staff_only(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("testuser", "test@example.com", "TestPass123!"))
+        self.assertEqual(client.get("/api/cache/stats/").status_code, status.HTTP_403_FORBIDDEN)
+        client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "AdminPass123!"))
+        self.assertIn("hit_ratio", client.get("/api/cache/stats/").json())
+
+
+@override_settings(JOBS_EAGER=True)
+class RegistrationPipelineTests(TestCase):
+    """Test the registration pipeline and its deferred side effects."""
+
+    data = {
+        "username": "newuser",
+        "first_name": "New",
+        "last_name": "User",
+        "email": "new@example.com",
+        "password1": "StrongPass123!",
+        "password2": "StrongPass123!",
+    }
+
+    def test_side_effects_run_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse("accounts:register"), self.data)
+            self.assertEqual(len(mail.outbox), 0)
+        self.assertRedirects(response, reverse("accounts:dashboard"))
+        # Two jobs (welcome email, analytics), three user cache invalidations and a location index update
+        self.assertEqual(len(callbacks), 6)
+        with self.assertLogs("apps.accounts.analytics", "INFO") as logs:
+            for callback in callbacks:
+                callback()
+        self.assertEqual(mail.outbox[0].to, ["new@example.com"])
+        self.assertIn("user_registered", logs.output[0])
+
+    def test_user_profile_and_directory_created(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("accounts:register"), self.data)
+        user = User.objects.get(username="newuser")
+        self.assertIsNotNone(user.last_login)
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+        self.assertTrue(UserDirectory.objects.filter(user=user, profile_id__isnull=False).exists())
+        self.assertEqual(self.client.session["_auth_user_id"], str(user.pk))
+
+    @override_settings(JOBS_EAGER=False)
+    def test_user_listed_before_any_job_runs(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse("accounts:register"), self.data)
+        self.assertLessEqual(len(queries), 25)
+        user = User.objects.get(username="newuser")
+        self.assertTrue(UserDirectory.objects.filter(user=user, profile_id__isnull=False).exists())
+        self.assertEqual(
+            set(ChangeLogEntry.objects.values_list("kind", "action")), {("user", "created"), ("profile", "created")}
+        )
+        self.assertEqual(StatCounter.objects.get(kind=StatCounter.Kind.TOTAL, key="users").value, 1)
+        self.assertEqual(
+            set(Job.objects.values_list("name", flat=True)),
+            {"apps.accounts.tasks.send_welcome_email", "apps.accounts.tasks.track_event"},
+        )
+
+
+class StreamingListTests(TestCase):
+    """Test page_size limits and the streaming mode of the list endpoints."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = make_user("staff", is_staff=True)
+        for i in range(4):
+            make_user(f"user{i}")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.staff)
+
+    def get_streamed(self, path, params):
+        response = self.client.get(path, params)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response["Content-Type"], "application/json")
+        return json.loads(b"".join(response.streaming_content))
+
+    def test_page_size_capped_for_regular_users(self):
+        self.client.force_authenticate(user=User.objects.get(username="user0"))
+        response = self.client.get("/api/users/", {"page_size": 2})
+        self.assertEqual(len(response.data["results"]), 2)
+        with mock.patch.object(DirectoryPagination, "max_page_size", 3):
+            response = self.client.get("/api/users/", {"page_size": 1000})
+        self.assertNotIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(len(response.data["results"]), 3)
+
+    def test_streamed_page_matches_buffered_page(self):
+        for path in ["/api/users/", "/api/profiles/"]:
+            streamed = self.get_streamed(path, {"page_size": 1000})
+            with mock.patch.object(DirectoryPagination, "stream_page_size", 10**6):
+                buffered = self.client.get(path, {"page_size": 1000})
+            self.assertEqual(streamed, json.loads(buffered.content))
+            self.assertEqual(streamed["count"], 5)
+
+    def test_streamed_page_links_and_invalid_page(self):
+        with mock.patch.object(DirectoryPagination, "stream_page_size", 2):
+            data = self.get_streamed("/api/users/", {"page_size": 2, "page": 2})
+            self.assertEqual(len(data["results"]), 2)
+            self.assertIn("page=3", data["next"])
+            self.assertIn("page_size=2", data["previous"])
+            response = self.client.get("/api/users/", {"page_size": 2, "page": 9})
+        self.assertEqual(response.status_code, 404)
+
+    def test_rows_loaded_in_chunks(self):
+        # Count, the page's ids, then one query per chunk of two rows
+        with mock.patch("apps.accounts.api_views.STREAM_CHUNK_SIZE", 2), self.assertNumQueries(5):
+            data = self.get_streamed("/api/users/", {"page_size": 1000})
+        self.assertEqual(len(data["results"]), 5)
+
+
+class DirectoryStatsTests(TestCase):
+    """Test the incrementally maintained directory statistics."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("alice")
+        cls.other = make_user("bob")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def counter(self, kind, key):
+        return StatCounter.objects.filter(kind=kind, key=key).values_list("value", flat=True).first() or 0
+
+    def test_signup_and_profile_counted(self):
+        today = timezone.localdate().isoformat()
+        self.assertEqual(self.counter("signups", today), 2)
+        self.assertEqual(self.counter("total", "users"), 2)
+        self.assertEqual(self.counter("location", ""), 2)
+        self.assertEqual(self.counter("completeness", "0"), 2)
+
+    def test_profile_changes_move_counts(self):
+        profile = Profile.objects.get(user=self.user)
+        profile.location = "Stockholm"
+        profile.bio = "Hello"
+        profile.phone = "+46701234567"
+        profile.save()
+        self.assertEqual(self.counter("location", "Stockholm"), 1)
+        self.assertEqual(self.counter("location", ""), 1)
+        self.assertEqual((self.counter("completeness", "0"), self.counter("completeness", "2")), (1, 1))
+        profile.bio = ""
+        profile.save()
+        self.assertEqual((self.counter("completeness", "1"), self.counter("completeness", "2")), (1, 0))
+        self.assertEqual(stats.reconcile(), 0)
+
+    def test_deferred_profile_save(self):
+        Profile.objects.filter(user=self.user).update(location="Oslo")
+        stats.reconcile()
+        profile = Profile.objects.only("pk", "bio").get(user=self.user)
+        profile.location = "Bergen"
+        profile.save()
+        self.assertEqual((self.counter("location", "Oslo"), self.counter("location", "Bergen")), (0, 1))
+
+    def test_user_deletion_uncounted(self):
+        self.other.delete()
+        self.assertEqual(self.counter("total", "users"), 1)
+        self.assertEqual(self.counter("total", "profiles"), 1)
+        self.assertEqual(self.counter("signups", timezone.localdate().isoformat()), 1)
+
+    def test_reconcile_command_fixes_drift(self):
+        Profile.objects.filter(user=self.user).update(location="Oslo")
+        out = StringIO()
+        call_command("reconcile_stats", stdout=out)
+        self.assertIn("2 counter(s) were off", out.getvalue())
+        self.assertEqual(self.counter("location", "Oslo"), 1)
+        self.assertEqual(stats.reconcile(), 0)
+
+    def test_stats_endpoint(self):
+        with self.assertNumQueries(4):
+            response = self.client.get("/api/stats/", {"locations": 5, "days": 7})
+        self.assertEqual(response.data["users"], 2)
+        self.assertEqual(response.data["locations"], [{"location": "", "users": 2}])
+        self.assertEqual(response.data["completeness"][0], {"filled": 0, "of": 3, "profiles": 2})
+        self.assertEqual(response.data["signups"], [{"date": timezone.localdate().isoformat(), "users": 2}])
+        self.assertEqual(self.client.get("/api/stats/", {"days": "x"}).status_code, 400)
+
+    @override_settings(
+        STORAGES={
+            "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+            "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+        }
+    )
+    def test_admin_index_shows_stats(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "AdminPass123!"))
+        response = self.client.get(reverse("admin:index"))
+        self.assertContains(response, 'id="directory-stats"')
+        self.assertContains(response, '<th scope="row">Users</th><td>3</td>', html=False)
+
+
+class ChangeTrackingTests(TestCase):
+    """Test that profile and user saves only write changed columns."""
+
+    form_data = {
+        "first_name": "Test",
+        "last_name": "User",
+        "email": "test@example.com",
+        "bio": "Hello",
+        "location": "Stockholm",
+        "phone": "",
+        "avatar_url": "",
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("testuser", "test@example.com", first_name="Test", last_name="User")
+        Profile.objects.filter(user=cls.user).update(bio="Hello", location="Stockholm")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.enterContext(mock.patch.dict(write_counts, clear=True))
+
+    def updates(self, queries):
+        return [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+
+    def test_unchanged_profile_form_writes_nothing(self):
+        before = Profile.objects.get(user=self.user).updated_at
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("accounts:profile"), self.form_data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.updates(queries), [])
+        self.assertEqual(write_counts["accounts.Profile", "skipped"], 1)
+        self.assertEqual(write_counts["auth.User", "skipped"], 1)
+        self.assertEqual(Profile.objects.get(user=self.user).updated_at, before)
+
+    def test_changed_fields_only(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse("accounts:profile"), {**self.form_data, "bio": "Changed", "last_name": "New"})
+        profile_update, user_update = (
+            next(sql for sql in self.updates(queries) if sql.startswith(f'UPDATE "{table}"'))
+            for table in ("accounts_profile", "auth_user")
+        )
+        self.assertIn('"bio"', profile_update)
+        self.assertIn('"updated_at"', profile_update)
+        self.assertNotIn('"location"', profile_update)
+        self.assertIn('"last_name"', user_update)
+        self.assertNotIn('"password"', user_update)
+        self.assertEqual(Profile.objects.get(user=self.user).bio, "Changed")
+        self.assertEqual(write_counts["accounts.Profile", "saved"], 1)
+
+    def test_api_noop_patch_keeps_updated_at(self):
+        profile = Profile.objects.get(user=self.user)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.patch(f"/api/profiles/{profile.pk}/", {"location": "Stockholm"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Profile.objects.get(pk=profile.pk).updated_at, profile.updated_at)
+        self.assertEqual(write_counts["accounts.Profile", "skipped"], 1)
+
+    def test_deferred_fields(self):
+        profile = Profile.objects.only("pk", "bio").get(user=self.user)
+        self.assertEqual(profile.changed_fields(), [])
+        self.assertEqual(profile.location, "Stockholm")
+        self.assertEqual(profile.changed_fields(), [])
+        profile.phone = "+46701234567"
+        self.assertEqual(profile.changed_fields(), ["phone"])
+        profile.save()
+        self.assertEqual(Profile.objects.get(pk=profile.pk).phone, "+46701234567")
+        self.assertEqual(profile.changed_fields(), [])
+
+
+@override_settings(LOGIN_GUARD_PATH=":memory:")
+class SignedTokenTests(TestCase):
+    """Test stateless signed access/refresh tokens."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("testuser", "test@example.com")
+
+    def setUp(self):
+        cache.clear()
+        get_guard.cache_clear()
+        self.addCleanup(get_guard.cache_clear)
+        self.client = APIClient()
+
+    def obtain(self):
+        response = self.client.post("/api/token/", {"username": "testuser", "password": "TestPass123!"})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_obtain_and_authenticate(self):
+        tokens = self.obtain()
+        self.assertEqual(tokens["token_type"], "Bearer")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.get("/api/stats/").status_code, 200)
+
+    def test_warm_authentication_makes_no_query(self):
+        access = self.obtain()["access"]
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {access}")
+        authenticator = SignedTokenAuthentication()
+        authenticator.authenticate(request)
+        with self.assertNumQueries(0):
+            user, claims = authenticator.authenticate(request)
+        self.assertEqual((user.pk, claims.user_id), (self.user.pk, self.user.pk))
+
+    def test_wrong_password_rejected(self):
+        response = self.client.post("/api/token/", {"username": "testuser", "password": "wrong"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_tampered_expired_and_wrong_type_rejected(self):
+        tokens = self.obtain()
+        kid, kind, user_id, rest = tokens["access"].split(".", 3)
+        tampered = ".".join([kid, kind, f"{self.user.pk + 1:x}", rest])
+        expired = signed_tokens.issue(self.user.pk, 0, lifetime=-1)
+        for token in [tampered, expired, tokens["refresh"], "garbage", "é"]:
+            with self.subTest(token=token):
+                self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+                self.assertEqual(self.client.get("/api/stats/").status_code, 401)
+
+    def test_refresh(self):
+        tokens = self.obtain()
+        response = self.client.post("/api/token/refresh/", {"refresh": tokens["refresh"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(signed_tokens.verify(response.data["access"]).user_id, self.user.pk)
+        response = self.client.post("/api/token/refresh/", {"refresh": tokens["access"]})
+        self.assertEqual(response.status_code, 401)
+
+    def test_revoke(self):
+        tokens = self.obtain()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post("/api/token/revoke/").status_code, 204)
+        self.assertEqual(self.client.get("/api/stats/").status_code, 401)
+        self.client.credentials()
+        response = self.client.post("/api/token/refresh/", {"refresh": tokens["refresh"]})
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_reset_revokes_tokens(self):
+        tokens = self.obtain()
+        form = SetPasswordForm(self.user, {"new_password1": "Fresh-Pass-456!", "new_password2": "Fresh-Pass-456!"})
+        self.assertTrue(form.is_valid())
+        with self.captureOnCommitCallbacks(execute=True):
+            form.save()
+        response = self.client.post("/api/token/refresh/", {"refresh": tokens["refresh"]})
+        self.assertEqual(response.status_code, 401)
+
+    def test_login_hash_upgrade_keeps_tokens(self):
+        tokens = self.obtain()
+        # A hash with a short salt is rehashed by the next successful login
+        User.objects.filter(pk=self.user.pk).update(password=make_password(PASSWORD, salt="short"))
+        self.obtain()
+        self.assertNotEqual(User.objects.get(pk=self.user.pk).password, make_password(PASSWORD, salt="short"))
+        response = self.client.post("/api/token/refresh/", {"refresh": tokens["refresh"]})
+        self.assertEqual(response.status_code, 200)
+
+    def test_obtain_records_login(self):
+        self.obtain()
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    def test_cached_user_has_no_password_hash(self):
+        self.obtain()
+        self.assertIsNotNone(get_cached_user(self.user.pk))
+        self.assertNotIn("password", cache.get(f"user:{self.user.pk}").__dict__)
+
+    def test_inactive_user_rejected(self):
+        access = self.obtain()["access"]
+        self.user.is_active = False
+        self.user.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(self.client.get("/api/stats/").status_code, 401)
+
+    def test_key_rotation(self):
+        old_access = self.obtain()["access"]
+        with override_settings(SECRET_KEY="new-secret", SECRET_KEY_FALLBACKS=[settings.SECRET_KEY]):
+            self.assertEqual(signed_tokens.verify(old_access).user_id, self.user.pk)
+            new_access = signed_tokens.issue(self.user.pk, 0)
+            self.assertNotEqual(new_access.split(".")[0], old_access.split(".")[0])
+        with override_settings(SECRET_KEY="new-secret"), self.assertRaises(signed_tokens.TokenError):
+            signed_tokens.verify(old_access)
+
+    def test_opaque_tokens_still_accepted(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.assertEqual(self.client.get("/api/stats/").status_code, 200)
+
+
+class BreachedPasswordTests(TestCase):
+    """Test the Bloom filter password validator and its builder command."""
+
+    def setUp(self):
+        tmp = self.enterContext(tempfile.TemporaryDirectory())
+        self.path = Path(tmp) / "password_filter.bloom"
+        self.hashes = Path(tmp) / "hashes.txt"
+        self.hashes.write_text(
+            "".join(
+                f"{hashlib.sha1(p.encode()).hexdigest().upper()}:{i + 1}\n"
+                for i, p in enumerate(["Tr0ub4dor&3x", "NotSoSecret!42"])
+            )
+        )
+        self.enterContext(override_settings(PASSWORD_FILTER_PATH=self.path))
+
+    def test_builder_and_lookup(self):
+        out = StringIO()
+        call_command("build_password_filter", str(self.hashes), "--common", stdout=out)
+        self.assertIn("password hash(es)", out.getvalue())
+        bloom = breached.get_filter()
+        for password in ["Tr0ub4dor&3x", "NotSoSecret!42", "password", "qwerty"]:
+            self.assertIn(breached.password_digest(password), bloom)
+        misses = sum(breached.password_digest(f"unlisted-{i}") in bloom for i in range(2000))
+        self.assertLess(misses, 20)
+
+    def test_validator_used_by_register_and_password_change(self):
+        call_command("build_password_filter", str(self.hashes), stdout=StringIO())
+        form = RegisterForm(
+            data={
+                "username": "newuser",
+                "first_name": "New",
+                "last_name": "User",
+                "email": "new@example.com",
+                "password1": "NotSoSecret!42",
+                "password2": "NotSoSecret!42",
+            }
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("data breach", str(form.errors["password2"]))
+
+        User.objects.create_user("testuser", "test@example.com", "TestPass123!")
+        self.client.login(username="testuser", password="TestPass123!")
+        response = self.client.post(
+            reverse("accounts:password_change"),
+            {"old_password": "TestPass123!", "new_password1": "Tr0ub4dor&3x", "new_password2": "Tr0ub4dor&3x"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "data breach")
+
+    def test_falls_back_to_common_list_without_filter(self):
+        validator = breached.BreachedPasswordValidator()
+        with self.assertRaises(ValidationError):
+            validator.validate("password")
+        validator.validate("NotSoSecret!42")
+
+    def test_rebuilt_filter_picked_up(self):
+        call_command("build_password_filter", "--common", stdout=StringIO())
+        self.assertNotIn(breached.password_digest("NotSoSecret!42"), breached.get_filter())
+        call_command("build_password_filter", str(self.hashes), stdout=StringIO())
+        with mock.patch("apps.accounts.breached.time.monotonic", return_value=time.monotonic() + 3600):
+            self.assertIn(breached.password_digest("NotSoSecret!42"), breached.get_filter())
+
+    def test_builder_requires_input(self):
+        with self.assertRaises(CommandError):
+            call_command("build_password_filter", stdout=StringIO())
+
+
+class UserBatchLookupTests(TestCase):
+    """Test multi-get of users by id and username."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        cls.bob = make_user("bob")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.alice)
+
+    def test_ids_in_requested_order_with_missing(self):
+        response = self.client.get("/api/users/", {"ids": f"{self.bob.pk},999,{self.alice.pk},{self.bob.pk}"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["username"] for row in response.data["results"]], ["bob", "alice"])
+        self.assertEqual(response.data["missing"], [999])
+        self.assertNotIn("email", response.data["results"][0])
+
+    def test_staff_see_email(self):
+        self.client.force_authenticate(user=User.objects.create_user("staff", "s@example.com", "x", is_staff=True))
+        response = self.client.get("/api/users/", {"usernames": "bob,nobody"})
+        self.assertEqual(response.data["results"][0]["email"], "bob@example.com")
+        self.assertEqual(response.data["missing"], ["nobody"])
+
+    def test_single_query_then_cache(self):
+        ids = f"{self.alice.pk},{self.bob.pk}"
+        with self.assertNumQueries(1):
+            self.client.get("/api/users/", {"ids": ids})
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/users/", {"ids": ids})
+        self.assertEqual(len(response.data["results"]), 2)
+        # Users cached by id are found by username too
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/users/", {"usernames": "alice,bob"})
+        self.assertEqual([row["username"] for row in response.data["results"]], ["alice", "bob"])
+
+    def test_usernames_single_query_then_cache(self):
+        with self.assertNumQueries(1):
+            self.client.get("/api/users/", {"usernames": "bob,nobody"})
+        with self.assertNumQueries(1):
+            # Only the unknown name is looked up again
+            response = self.client.get("/api/users/", {"usernames": "bob,nobody"})
+        self.assertEqual(response.data["missing"], ["nobody"])
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/users/", {"usernames": "bob"})
+        self.assertEqual(response.data["results"][0]["username"], "bob")
+
+    def test_rename_invalidates_username_cache(self):
+        self.client.get("/api/users/", {"usernames": "bob"})
+        self.bob.username = "robert"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob.save()
+        response = self.client.get("/api/users/", {"usernames": "bob,robert"})
+        self.assertEqual([row["username"] for row in response.data["results"]], ["robert"])
+        self.assertEqual(response.data["missing"], ["bob"])
+
+    def test_profile_change_invalidates_cache(self):
+        self.client.get("/api/users/", {"ids": self.bob.pk})
+        profile = Profile.objects.get(user=self.bob)
+        profile.location = "Oslo"
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        response = self.client.get("/api/users/", {"ids": self.bob.pk})
+        self.assertEqual(response.data["results"][0]["profile"]["location"], "Oslo")
+
+    def test_batch_size_and_format_validated(self):
+        too_many = ",".join(str(i) for i in range(USERS_BATCH_MAX + 1))
+        self.assertEqual(self.client.get("/api/users/", {"ids": too_many}).status_code, 400)
+        self.assertEqual(self.client.get("/api/users/", {"ids": "1,x"}).status_code, 400)
+
+
+class LocationAutocompleteTests(TestCase):
+    """Test location autocomplete from the in-process prefix index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("alice")
+        for name, location in [("bob", "Stockholm"), ("carol", "stockholm "), ("dave", "Stavanger"), ("erin", "Oslo")]:
+            Profile.objects.filter(user=make_user(name)).update(location=location)
+        stats.reconcile()
+
+    def setUp(self):
+        locations.reset_index()
+        self.addCleanup(locations.reset_index)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_prefix_search_merges_spellings(self):
+        index = locations.LocationIndex([("Stockholm", 2), ("stockholm", 1), ("Stavanger", 1), ("Oslo", 4), ("", 9)])
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.search("st"), [("Stockholm", 3), ("Stavanger", 1)])
+        self.assertEqual(index.search("  STO"), [("Stockholm", 3)])
+        self.assertEqual(index.search("", limit=1), [("Oslo", 4)])
+        self.assertEqual(index.search("x"), [])
+        index.adjust("Stavanger", -1)
+        index.adjust("Stord", 1)
+        self.assertEqual(index.search("st"), [("Stockholm", 3), ("Stord", 1)])
+
+    def test_keystrokes_do_not_query(self):
+        self.client.get("/api/locations/", {"prefix": "s"})
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/locations/", {"prefix": "st", "limit": 5})
+        self.assertEqual(
+            response.data["results"], [{"location": "Stockholm", "users": 2}, {"location": "Stavanger", "users": 1}]
+        )
+        self.assertEqual(self.client.get("/api/locations/", {"limit": 0}).status_code, 400)
+
+    def test_profile_saves_update_loaded_index(self):
+        locations.get_index()
+        profile = Profile.objects.get(user=self.user)
+        profile.location = "Stavanger"
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(locations.get_index().search("sta"), [("Stavanger", 2)])
+
+    def test_profile_form_widget(self):
+        html = str(ProfileForm()["location"])
+        self.assertIn('list="location-suggestions"', html)
+        self.assertIn('data-suggest-url="/api/locations/"', html)
+
+    @override_settings(
+        STORAGES={
+            "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+            "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+        }
+    )
+    def test_admin_location_filter(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "AdminPass123!"))
+        url = reverse("admin:accounts_profile_changelist")
+        self.assertContains(self.client.get(url), "Stockholm (2)")
+        response = self.client.get(url, {"location": "Stockholm"})
+        self.assertEqual(response.context["cl"].result_count, 2)
+
+
+class AvailabilityTests(TestCase):
+    """Test the live username/email availability check."""
+
+    @classmethod
+    def setUpTestData(cls):
+        make_user("alice")
+
+    def setUp(self):
+        availability.reset_filter()
+        self.addCleanup(availability.reset_filter)
+        self.client = APIClient()
+
+    def check(self, **params):
+        return self.client.get("/api/availability/", params).data
+
+    def test_taken_and_free(self):
+        data = self.check(username="Alice", email="alice@example.com")
+        self.assertEqual(data["username"], {"value": "Alice", "available": False})
+        self.assertFalse(data["email"]["available"])
+        self.assertTrue(self.check(username="bob")["username"]["available"])
+        self.assertEqual(self.client.get("/api/availability/").status_code, 400)
+
+    def test_misses_skip_the_database(self):
+        availability.get_filter()
+        with self.assertNumQueries(0):
+            self.assertFalse(availability.is_taken(availability.USERNAME, "bob"))
+        with self.assertNumQueries(1):
+            self.assertTrue(availability.is_taken(availability.USERNAME, "alice"))
+
+    def test_filter_follows_new_users(self):
+        availability.get_filter()
+        User.objects.create_user("bob", "bob@example.com", "TestPass123!")
+        self.assertFalse(self.check(username="bob")["username"]["available"])
+        # Users created by other workers are picked up on the next sync
+        User.objects.bulk_create([User(username="carol", email="carol@example.com")])
+        self.assertTrue(self.check(username="carol")["username"]["available"])
+        with mock.patch.object(availability, "_sync_at", 0.0):
+            self.assertFalse(self.check(username="carol")["username"]["available"])
+
+    def test_logins_do_not_fill_the_filter(self):
+        taken = availability.get_filter()
+        count = taken.count
+        self.client.login(username="alice", password=PASSWORD)
+        user = User.objects.get(username="alice")
+        user.save()
+        self.assertEqual(taken.count, count)
+        user.email = "alice@example.org"
+        user.save(update_fields=["email"])
+        self.assertEqual(taken.count, count + 1)
+        self.assertFalse(self.check(email="alice@example.org")["email"]["available"])
+
+    def test_register_form_marks_fields(self):
+        form = RegisterForm()
+        self.assertIn('data-availability="username"', str(form["username"]))
+        self.assertIn('data-availability="email"', str(form["email"]))
+
+
+class AccountArchiveTests(TestCase):
+    """Test archiving cold accounts and restoring them on login."""
+
+    @classmethod
+    def setUpTestData(cls):
+        long_ago = timezone.now() - timedelta(days=1000)
+        cls.cold = make_user("cold", first_name="Cora", profile={"location": "Oslo", "bio": "Away"})
+        cls.cold.groups.add(Group.objects.create(name="members"))
+        User.objects.filter(pk=cls.cold.pk).update(last_login=long_ago, date_joined=long_ago)
+        cls.fresh = make_user("fresh")
+        cls.staff = make_user("staff", is_staff=True, last_login=long_ago)
+
+    def setUp(self):
+        availability.reset_filter()
+        self.addCleanup(availability.reset_filter)
+
+    def test_archive_moves_only_cold_users(self):
+        out = StringIO()
+        call_command("archive_accounts", "--days", "365", stdout=out)
+        self.assertIn("archived 1 account(s)", out.getvalue())
+        self.assertFalse(User.objects.filter(pk=self.cold.pk).exists())
+        self.assertFalse(Profile.objects.filter(user_id=self.cold.pk).exists())
+        self.assertEqual(set(User.objects.values_list("username", flat=True)), {"fresh", "staff"})
+        archived = ArchivedUser.objects.get(pk=self.cold.pk)
+        self.assertEqual((archived.username, archived.data["profile"]["location"]), ("cold", "Oslo"))
+
+    def test_recent_token_keeps_user_and_stale_tokens_are_purged(self):
+        Token.objects.create(user=self.cold)
+        Token.objects.create(user=self.staff)
+        Token.objects.filter(user=self.staff).update(created=timezone.now() - timedelta(days=1000))
+        cutoff = archive.archive_cutoff(365)
+        self.assertEqual(archive.archive_users(cutoff), 0)
+        self.assertEqual(archive.purge_stale_tokens(cutoff, batch_size=1), 1)
+        self.assertEqual(list(Token.objects.values_list("user__username", flat=True)), ["cold"])
+
+    def test_expired_sessions_purged_in_batches(self):
+        for i, days in enumerate([-1, -2, 1]):
+            Session.objects.create(session_key=f"s{i}", session_data="", expire_date=timezone.now() + timedelta(days))
+        self.assertEqual(archive.purge_expired_sessions(batch_size=1), 2)
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["s2"])
+
+    def test_login_restores_account(self):
+        profile_id = Profile.objects.get(user=self.cold).pk
+        archive.archive_users(archive.archive_cutoff(365))
+        self.assertFalse(self.client.login(username="cold", password="wrong"))
+        self.assertTrue(ArchivedUser.objects.filter(pk=self.cold.pk).exists())
+        response = self.client.post(reverse("accounts:login"), {"username": "cold", "password": "TestPass123!"})
+        self.assertRedirects(response, reverse("accounts:dashboard"), fetch_redirect_response=False)
+        user = User.objects.get(pk=self.cold.pk)
+        self.assertEqual((user.first_name, user.profile.location, user.profile.bio), ("Cora", "Oslo", "Away"))
+        self.assertEqual(list(user.groups.values_list("name", flat=True)), ["members"])
+        self.assertFalse(ArchivedUser.objects.exists())
+        self.assertEqual(user.profile.pk, profile_id)
+
+    def test_password_reset_restores_account(self):
+        archive.archive_users(archive.archive_cutoff(365))
+        self.client.post(reverse("accounts:password_reset"), {"email": "COLD@example.com"})
+        self.assertTrue(User.objects.filter(pk=self.cold.pk).exists())
+        self.assertTrue(Job.objects.filter(name="apps.accounts.tasks.send_email").exists())
+
+    def test_inactive_account_not_restored(self):
+        User.objects.filter(pk=self.cold.pk).update(is_active=False)
+        archive.archive_users(archive.archive_cutoff(365))
+        self.assertFalse(self.client.login(username="cold", password=PASSWORD))
+        self.client.post(reverse("accounts:password_reset"), {"email": "cold@example.com"})
+        self.assertFalse(User.objects.filter(pk=self.cold.pk).exists())
+
+    def test_unknown_username_is_hashed_too(self):
+        with mock.patch.object(User, "set_password", autospec=True) as set_password:
+            self.assertFalse(self.client.login(username="nobody", password=PASSWORD))
+        # Once by ModelBackend, once in place of the archived password check
+        self.assertEqual(set_password.call_count, 2)
+
+    def test_signed_token_activity_keeps_user(self):
+        APIClient().post("/api/token/", {"username": "cold", "password": PASSWORD})
+        self.assertEqual(archive.archive_users(archive.archive_cutoff(365)), 0)
+
+    def test_archived_names_stay_reserved(self):
+        archive.archive_users(archive.archive_cutoff(365))
+        form = RegisterForm(
+            data={
+                "username": "Cold",
+                "first_name": "A",
+                "last_name": "B",
+                "email": "cold@example.com",
+                "password1": "Xy7!pQ9#mK2z",
+                "password2": "Xy7!pQ9#mK2z",
+            }
+        )
+        self.assertFalse(form.is_valid())
+        self.assertEqual(set(form.errors), {"username", "email"})
+        self.assertTrue(availability.is_taken(availability.USERNAME, "cold"))
+
+
+class PhoneLookupTests(TestCase):
+    """Test phone normalization and the staff lookup by number."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = make_user("staff", is_staff=True)
+        cls.user = make_user("alice", profile={"phone": "+46 70 123 4501"})
+        cls.profile = Profile.objects.get(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_normalize_phone(self):
+        self.assertEqual(normalize_phone("+46 70 123 4501"), "+46701234501")
+        self.assertEqual(normalize_phone("0046-70-123 45 01"), "+46701234501")
+        self.assertEqual(normalize_phone("070-123 45 01"), "+46701234501")
+        self.assertEqual(normalize_phone("(555) 010 9999", country_code="1"), "+5550109999")
+        self.assertEqual(normalize_phone("not-a-phone"), "")
+        self.assertEqual(normalize_phone(""), "")
+
+    def test_normalized_on_save(self):
+        self.assertEqual(self.profile.phone_normalized, "+46701234501")
+        self.profile.phone = "070 999 88 77"
+        self.profile.save(update_fields=["phone"])
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.phone_normalized, "+46709998877")
+
+    def test_staff_lookup_single_query(self):
+        self.client.force_authenticate(user=self.staff)
+        self.client.get("/api/profiles/by-phone/", {"number": "0"})
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/profiles/by-phone/", {"number": "070-123 45 01"})
+        self.assertEqual(response.data["number"], "+46701234501")
+        self.assertEqual([row["username"] for row in response.data["results"]], ["alice"])
+        self.assertEqual(self.client.get("/api/profiles/by-phone/", {"number": "x"}).status_code, 400)
+
+    def test_lookup_is_staff_only(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get("/api/profiles/by-phone/", {"number": "+46701234501"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_phone_lookup_rate_covers_only_the_lookup(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.staff)
+        with mock.patch.dict(ScopedRateThrottle.THROTTLE_RATES, {"phone_lookup": "1/min"}):
+            self.assertEqual(self.client.get("/api/profiles/by-phone/", {"number": "+46701234501"}).status_code, 200)
+            self.assertEqual(self.client.get("/api/profiles/by-phone/", {"number": "+46701234501"}).status_code, 429)
+            for _ in range(2):
+                self.assertEqual(self.client.get("/api/profiles/").status_code, 200)
+
+    def test_migration_backfills_in_batches(self):
+        backfill = importlib.import_module("apps.accounts.migrations.0008_profile_phone_normalized")
+        Profile.objects.filter(pk=self.profile.pk).update(phone_normalized="")
+        Profile.objects.filter(user=self.staff).update(phone="0046 8 123 456")
+        with mock.patch.object(backfill, "BATCH_SIZE", 1):
+            backfill.backfill_phone_normalized(django_apps, connection.schema_editor())
+        self.assertEqual(
+            set(Profile.objects.values_list("phone_normalized", flat=True)), {"+46701234501", "+468123456"}
+        )
+
+
+class SamplingProfilerTests(TestCase):
+    """Test the opt-in per-endpoint sampling profiler."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = make_user("staff", is_staff=True)
+        cls.user = make_user("alice")
+
+    def setUp(self):
+        tmp = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(
+            override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_STACK_INTERVAL=0.001, PROFILING_DIR=Path(tmp))
+        )
+        profiling.reset()
+        self.addCleanup(profiling.reset)
+
+    def test_disabled_middleware_is_removed(self):
+        with override_settings(PROFILING_SAMPLE_RATE=0), self.assertRaises(MiddlewareNotUsed):
+            profiling.SamplingProfilerMiddleware(lambda request: HttpResponse())
+
+    def test_profiles_grouped_by_url_name(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("accounts:profile"))
+        self.client.get(reverse("accounts:profile"))
+        row = next(row for row in profiling.report() if row["endpoint"] == "accounts:profile")
+        self.assertEqual(row["requests"], 2)
+        self.assertGreater(row["peak_bytes"], 0)
+        self.assertTrue(row["allocations"])
+
+    def test_stack_samples_find_hot_frame(self):
+        def slow_view():
+            time.sleep(0.05)
+
+        profiling.profile_call("slow", slow_view)
+        (row,) = profiling.report()
+        self.assertGreater(row["stack_samples"], 5)
+        self.assertIn("slow_view", row["hot_frames"][0]["frame"])
+
+    def test_staff_endpoint_and_dump_command(self):
+        profiling.profile_call("example", lambda: [object() for _ in range(1000)])
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        self.assertEqual(client.get("/api/profiling/").status_code, status.HTTP_403_FORBIDDEN)
+        client.force_authenticate(user=self.staff)
+        response = client.get("/api/profiling/", {"top": 3})
+        self.assertIn("example", [row["endpoint"] for row in response.data["endpoints"]])
+        out = StringIO()
+        call_command("dump_profiles", "--reset", stdout=out)
+        self.assertIn("example", out.getvalue())
+        self.assertIn("Profiles reset.", out.getvalue())
+        self.assertEqual(profiling.report(), [])
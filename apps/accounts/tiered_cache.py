@@ -0,0 +1,305 @@
+"""Two-tier cache backend: a per-process LRU in front of a shared SQLite file.
+
+Every gunicorn worker on a host opens the same SQLite file, so counters such
+as rate limits and throttles are shared between workers and survive
+restarts. Reads are served from a small in-process LRU when possible. Writes
+append the key to an invalidation log in the shared file, which each process
+polls at most every ``SYNC_INTERVAL`` seconds to evict stale front entries;
+front entries also never outlive ``FRONT_TTL``.
+"""
+
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires);
+CREATE TABLE IF NOT EXISTS cache_invalidations (seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT);
+"""
+INVALIDATION_LOG_SIZE = 10000
+CULL_PROBABILITY = 0.01
+
+
+class _FrontTier:
+    """Process-wide LRU shared by the backend instances of all threads."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.last_seq = None
+        self.next_sync = 0.0
+        # Bumped whenever entries change, so a read that went to the shared
+        # tier meanwhile does not cache what it loaded.
+        self.version = 0
+        self.hits = {"front": 0, "shared": 0, "miss": 0}
+
+    def get(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, pickled, expires):
+        self.entries[key] = (pickled, expires)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+        self.version += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.version += 1
+
+
+_front_tiers = {}
+_front_tiers_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    """See the module docstring. The front lock is never held while the SQLite file is used."""
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._path = str(location)
+        self._front_ttl = options.get("FRONT_TTL", 5)
+        self._sync_interval = options.get("SYNC_INTERVAL", 0.5)
+        with _front_tiers_lock:
+            self._front = _front_tiers.setdefault(self._path, _FrontTier(options.get("FRONT_MAX_ENTRIES", 1000)))
+        self._local = threading.local()
+
+    # --- Shared tier -----------------------------------------------------
+
+    @property
+    def _db(self):
+        # Connections are per thread and reopened after a fork.
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self._path, timeout=10, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _write(self, key, statements):
+        """Run ``statements`` and log ``key`` as invalidated in one transaction."""
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = statements(db)
+            db.execute("INSERT INTO cache_invalidations (key) VALUES (?)", (key,))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return result
+
+    def _load(self, db, key, now):
+        row = db.execute("SELECT value, expires FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            return None
+        return row
+
+    def _store(self, db, key, pickled, expires):
+        db.execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)", (key, pickled, expires)
+        )
+
+    def _cull(self, db, now):
+        db.execute("DELETE FROM cache_entries WHERE expires IS NOT NULL AND expires <= ?", (now,))
+        (count,) = db.execute("SELECT COUNT(*) FROM cache_entries").fetchone()
+        if count > self._max_entries:
+            excess = count - self._max_entries + count // max(self._cull_frequency, 1)
+            db.execute(
+                # Soonest to expire first; SQLite sorts NULL (never expires) before any value
+                "DELETE FROM cache_entries WHERE key IN "
+                "(SELECT key FROM cache_entries ORDER BY expires IS NULL, expires LIMIT ?)",
+                (excess,),
+            )
+        db.execute(
+            "DELETE FROM cache_invalidations WHERE seq <= (SELECT MAX(seq) FROM cache_invalidations) - ?",
+            (INVALIDATION_LOG_SIZE,),
+        )
+
+    # --- Front tier ------------------------------------------------------
+
+    def _sync_front(self, now):
+        front = self._front
+        with front.lock:
+            if now < front.next_sync:
+                return
+            front.next_sync = now + self._sync_interval
+            last_seq = front.last_seq
+        db = self._db
+        if last_seq is None:
+            (seq,) = db.execute("SELECT COALESCE(MAX(seq), 0) FROM cache_invalidations").fetchone()
+            with front.lock:
+                front.clear()
+                front.last_seq = seq
+            return
+        rows = db.execute("SELECT seq, key FROM cache_invalidations WHERE seq > ? ORDER BY seq", (last_seq,)).fetchall()
+        if not rows:
+            return
+        with front.lock:
+            if front.last_seq != last_seq:
+                # Another thread has synced meanwhile.
+                return
+            if rows[0][0] > last_seq + 1 or any(key is None for _, key in rows):
+                # Part of the log was trimmed, or the cache was cleared.
+                front.clear()
+            else:
+                for _, key in rows:
+                    front.discard(key)
+            front.last_seq = rows[-1][0]
+
+    def _cache_front(self, key, pickled, expires, now):
+        front_expires = now + self._front_ttl
+        if expires is not None:
+            front_expires = min(front_expires, expires)
+        self._front.put(key, pickled, front_expires)
+
+    # --- Cache API -------------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        front = self._front
+        self._sync_front(now)
+        with front.lock:
+            pickled = front.get(key, now)
+            if pickled is not None:
+                front.hits["front"] += 1
+                return pickle.loads(pickled)
+            front_version = front.version
+        row = self._load(self._db, key, now)
+        with front.lock:
+            if row is None:
+                front.hits["miss"] += 1
+                return default
+            front.hits["shared"] += 1
+            if front.version == front_version:
+                self._cache_front(key, row[0], row[1], now)
+        return pickle.loads(row[0])
+
+    def _written(self, key, pickled=None, expires=None, now=None):
+        """Update the front tier after a write to the shared tier (drop ``key`` if ``pickled`` is None)."""
+        with self._front.lock:
+            self._front.discard(key)
+            if pickled is not None:
+                self._cache_front(key, pickled, expires, now)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+
+        def statements(db):
+            self._store(db, key, pickled, expires)
+            if random.random() < CULL_PROBABILITY:
+                self._cull(db, now)
+
+        self._write(key, statements)
+        self._written(key, pickled, expires, now)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+
+        def statements(db):
+            if self._load(db, key, now) is not None:
+                return False
+            self._store(db, key, pickled, expires)
+            return True
+
+        added = self._write(key, statements)
+        if added:
+            self._written(key, pickled, expires, now)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        """Atomically add ``delta`` across all processes sharing the file."""
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+
+        def statements(db):
+            row = self._load(db, key, now)
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            pickled = pickle.dumps(value, self.pickle_protocol)
+            self._store(db, key, pickled, row[1])
+            return value, pickled, row[1]
+
+        value, pickled, expires = self._write(key, statements)
+        self._written(key, pickled, expires, now)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+
+        def statements(db):
+            cursor = db.execute(
+                "UPDATE cache_entries SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (expires, key, now),
+            )
+            return cursor.rowcount > 0
+
+        touched = self._write(key, statements)
+        self._written(key)
+        return touched
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+
+        def statements(db):
+            return db.execute("DELETE FROM cache_entries WHERE key = ?", (key,)).rowcount > 0
+
+        deleted = self._write(key, statements)
+        self._written(key)
+        return deleted
+
+    def clear(self):
+        self._write(None, lambda db: db.execute("DELETE FROM cache_entries"))
+        with self._front.lock:
+            self._front.clear()
+
+    def close(self, **kwargs):
+        # Connections are kept open for the life of the thread.
+        pass
+
+    def stats(self):
+        """Return this process's hit counts and ratios per tier."""
+        with self._front.lock:
+            hits = dict(self._front.hits)
+            entries = len(self._front.entries)
+        total = sum(hits.values())
+        return {
+            **hits,
+            "front_entries": entries,
+            "front_hit_ratio": hits["front"] / total if total else 0.0,
+            "hit_ratio": (hits["front"] + hits["shared"]) / total if total else 0.0,
+        }
@@ -0,0 +1,79 @@
+"""Change tracking so saves only write the columns that changed.
+
+``write_counts`` tallies, per model label, the saves that issued an UPDATE
+(``saved``) and those skipped because nothing changed (``skipped``). It is
+per process and meant for benchmarks and tests.
+"""
+
+from collections import Counter
+
+write_counts = Counter()
+
+
+def record_write(label, written):
+    write_counts[label, "saved" if written else "skipped"] += 1
+
+
+class TrackedFieldsMixin:
+    """Model mixin remembering field values as loaded from the database.
+
+    ``save()`` on a loaded instance without explicit ``update_fields`` writes
+    only the changed fields (plus ``auto_now`` ones) and is skipped entirely,
+    signals included, when nothing changed.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values, strict=True))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        # Also called to load a deferred field on first access
+        names = fields or [field.attname for field in self._meta.concrete_fields if field.attname in self.__dict__]
+        attnames = [self._meta.get_field(name).attname for name in names]
+        self._loaded_values = {
+            **getattr(self, "_loaded_values", {}),
+            **{attname: getattr(self, attname) for attname in attnames},
+        }
+
+    def changed_fields(self):
+        """Names of concrete fields whose value differs from the loaded one."""
+        loaded = getattr(self, "_loaded_values", None)
+        if loaded is None:
+            return [field.name for field in self._meta.concrete_fields if not field.primary_key]
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+            and (
+                # Deferred fields only count once assigned
+                getattr(self, field.attname) != loaded[field.attname]
+                if field.attname in loaded
+                else field.attname in self.__dict__
+            )
+        ]
+
+    def save(self, *args, force_insert=False, update_fields=None, **kwargs):
+        updating = hasattr(self, "_loaded_values") and not self._state.adding and not force_insert
+        if updating and update_fields is None:
+            changed = self.changed_fields()
+            if not changed:
+                record_write(self._meta.label, False)
+                return
+            auto_now = [field.name for field in self._meta.concrete_fields if getattr(field, "auto_now", False)]
+            update_fields = list(dict.fromkeys(changed + auto_now))
+        super().save(*args, force_insert=force_insert, update_fields=update_fields, **kwargs)
+        if updating:
+            record_write(self._meta.label, True)
+        # Whatever was written is now the stored value
+        written = None if update_fields is None else {self._meta.get_field(name).attname for name in update_fields}
+        self._loaded_values = {
+            **getattr(self, "_loaded_values", {}),
+            **{
+                field.attname: getattr(self, field.attname)
+                for field in self._meta.concrete_fields
+                if field.attname in self.__dict__ and (written is None or field.attname in written)
+            },
+        }
@@ -1,8 +1,9 @@
 from django.contrib.auth import views as auth_views
-from django.urls import path, reverse_lazy
+from django.urls import path, re_path, reverse_lazy
 
 from . import views
-from .ratelimit import ratelimit
+from .forms import QueuedPasswordResetForm
+from .loginguard import login_guard
 
 app_name = "accounts"
 
@@ -13,9 +14,10 @@ urlpatterns = [
     path("api-docs/", views.api_docs_view, name="api_docs"),
     path("dashboard/", views.dashboard_view, name="dashboard"),
     path("register/", views.register_view, name="register"),
-    path("login/", ratelimit("login")(auth_views.LoginView.as_view(template_name="accounts/login.html")), name="login"),
+    path("login/", login_guard(auth_views.LoginView.as_view(template_name="accounts/login.html")), name="login"),
     path("logout/", auth_views.LogoutView.as_view(), name="logout"),
     path("profile/", views.profile_view, name="profile"),
+    re_path(r"^avatars/(?P<digest>[0-9a-f]{64})/(?P<size>[0-9]+)\.webp$", views.avatar_view, name="avatar"),
     # Change password
     path(
         "password-change/",
@@ -39,6 +41,7 @@ urlpatterns = [
             template_name="accounts/password_reset.html",
             email_template_name="accounts/password_reset_email.html",
             subject_template_name="accounts/password_reset_subject.txt",
+            form_class=QueuedPasswordResetForm,
             success_url=reverse_lazy("accounts:password_reset_done"),
         ),
         name="password_reset",
@@ -0,0 +1,94 @@
+"""Per-user cache of ``User`` rows, with their profile, for hot read paths.
+
+Users are cached by id, and usernames map to ids for lookups by name.
+Entries are dropped by the User and Profile save/delete signals, so
+readers see a change as soon as the writing transaction commits. Misses
+are loaded from the primary, so a lagging replica cannot refill an entry
+with an old row for the cache lifetime. The
+password hash is never cached: it is deferred and read from the database
+by whatever needs it.
+"""
+
+import hashlib
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from .routers import pin_to_primary
+
+USER_CACHE_SECONDS = 300
+
+
+def _key(user_id):
+    return f"user:{user_id}"
+
+
+def _username_key(username):
+    # Hashed: query strings may hold characters cache keys must not
+    return f"user-id:{hashlib.blake2b(username.encode(), digest_size=16).hexdigest()}"
+
+
+def cacheable_users():
+    """Users as the cache holds them: with their profile, without the password hash."""
+    return User.objects.select_related("profile").defer("password")
+
+
+def get_cached_user(user_id):
+    """Return the user with ``user_id`` from the cache, loading it on a miss (None if missing)."""
+    user = cache.get(_key(user_id))
+    if user is None:
+        with pin_to_primary():
+            user = cacheable_users().filter(pk=user_id).first()
+        if user is not None:
+            cache.set(_key(user_id), user, USER_CACHE_SECONDS)
+    return user
+
+
+def get_cached_users(user_ids):
+    """Map each existing id in ``user_ids`` to its user; misses are loaded in one query."""
+    keys = {_key(user_id): user_id for user_id in user_ids}
+    users = {keys[key]: user for key, user in cache.get_many(list(keys)).items()}
+    missing = [user_id for user_id in keys.values() if user_id not in users]
+    if missing:
+        with pin_to_primary():
+            loaded = cacheable_users().in_bulk(missing)
+        cache_users(loaded.values())
+        users.update(loaded)
+    return users
+
+
+def get_cached_users_by_username(usernames):
+    """Map each existing username in ``usernames`` to its user, through the cached ids.
+
+    A mapping is only trusted while the cached user still has that
+    username; stale ones (renamed or deleted users) count as misses, which
+    are loaded in one query.
+    """
+    keys = {_username_key(username): username for username in usernames}
+    ids = {keys[key]: user_id for key, user_id in cache.get_many(list(keys)).items()}
+    by_id = get_cached_users(ids.values()) if ids else {}
+    users = {
+        username: by_id[user_id]
+        for username, user_id in ids.items()
+        if user_id in by_id and by_id[user_id].username == username
+    }
+    missing = [username for username in keys.values() if username not in users]
+    if missing:
+        with pin_to_primary():
+            loaded = list(cacheable_users().filter(username__in=missing))
+        cache_users(loaded)
+        users.update((user.username, user) for user in loaded)
+    return users
+
+
+def cache_users(users):
+    """Cache users loaded from ``cacheable_users()``, by id and by username."""
+    entries = {}
+    for user in users:
+        entries[_key(user.pk)] = user
+        entries[_username_key(user.username)] = user.pk
+    cache.set_many(entries, USER_CACHE_SECONDS)
+
+
+def invalidate_user(user_id, username=None):
+    cache.delete_many([_key(user_id), _username_key(username)] if username is not None else [_key(user_id)])
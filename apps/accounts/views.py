@@ -1,11 +1,16 @@
-from django.contrib import messages
-from django.contrib.auth import login
+from django.contrib import admin, messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404
 from django.shortcuts import redirect, render
+from django.views.decorators.http import require_safe
 
+from .avatars import AVATAR_SIZES, variant_path
 from .forms import ProfileForm, RegisterForm, UserUpdateForm
-from .models import Profile
+from .loginguard import get_guard
+from .profiles import ensure_profile, get_profile
 from .ratelimit import ratelimit
+from .registration import register_user
 
 
 def home_view(request):
@@ -29,8 +34,7 @@ def register_view(request):
     if request.method == "POST":
         form = RegisterForm(request.POST)
         if form.is_valid():
-            user = form.save()
-            login(request, user)
+            register_user(request, form)
             messages.success(request, "Account created successfully!")
             return redirect("accounts:dashboard")
     else:
@@ -40,14 +44,14 @@ def register_view(request):
 
 @login_required
 def dashboard_view(request):
+    get_profile(request.user)
     return render(request, "accounts/dashboard.html")
 
 
 @login_required
 def profile_view(request):
-    profile, _ = Profile.objects.get_or_create(user=request.user)
-
     if request.method == "POST":
+        profile = ensure_profile(request.user)
         user_form = UserUpdateForm(request.POST, instance=request.user)
         profile_form = ProfileForm(request.POST, instance=profile)
         if user_form.is_valid() and profile_form.is_valid():
@@ -56,6 +60,7 @@ def profile_view(request):
             messages.success(request, "Profile updated successfully!")
             return redirect("accounts:profile")
     else:
+        profile = get_profile(request.user)
         user_form = UserUpdateForm(instance=request.user)
         profile_form = ProfileForm(instance=profile)
 
@@ -64,3 +69,31 @@ def profile_view(request):
         "profile_form": profile_form,
     }
     return render(request, "accounts/profile.html", context)
+
+
+@staff_member_required
+def login_attempts_view(request):
+    guard = get_guard()
+    context = {
+        **admin.site.each_context(request),
+        "title": "Login attempts",
+        "windows": [window for window, _ in guard.windows],
+        "rows": guard.hot_keys(),
+    }
+    return render(request, "admin/login_attempts.html", context)
+
+
+@require_safe
+def avatar_view(request, digest, size):
+    size = int(size)
+    if size not in AVATAR_SIZES:
+        raise Http404
+    path = variant_path(digest, size)
+    try:
+        response = FileResponse(path.open("rb"), content_type="image/webp")
+    except FileNotFoundError:
+        raise Http404 from None
+    path.touch()
+    # Variants are addressed by content digest, so they never change.
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
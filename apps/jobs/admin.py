@@ -0,0 +1,20 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ["id", "name", "status", "priority", "attempts", "run_at", "finished_at"]
+    list_filter = ["status", "name"]
+    search_fields = ["name", "last_error"]
+    readonly_fields = ["locked_by", "started_at", "finished_at", "created_at", "last_error"]
+    ordering = ["-id"]
+    actions = ["requeue"]
+
+    @admin.action(description="Requeue selected jobs")
+    def requeue(self, request, queryset):
+        from .queue import requeue
+
+        count = requeue(queryset.exclude(status=Job.Status.RUNNING))
+        self.message_user(request, f"Requeued {count} job{'' if count == 1 else 's'}.")
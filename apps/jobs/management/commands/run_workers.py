@@ -0,0 +1,64 @@
+import json
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.jobs.queue import job_metrics
+from apps.jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = "Run background job workers (threads per process, optionally several processes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=2, help="Worker threads per process (default: 2)")
+        parser.add_argument("--processes", type=int, default=1, help="Worker processes to fork (default: 1)")
+        parser.add_argument(
+            "--poll-interval", type=float, default=1.0, help="Seconds to wait when the queue is empty (default: 1)"
+        )
+        parser.add_argument(
+            "--stats-interval", type=int, default=60, help="Seconds between metrics log lines (default: 60)"
+        )
+        parser.add_argument("--burst", action="store_true", help="Exit once no job is ready")
+        parser.add_argument("--stats", action="store_true", help="Print queue metrics as JSON and exit")
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            self.stdout.write(json.dumps(job_metrics(), indent=2))
+            return
+        if options["processes"] <= 1:
+            processed = self.serve(options)
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} job{'' if processed == 1 else 's'}."))
+            return
+        # Children must not share the parent's database connections
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        children = [
+            context.Process(target=self.serve, args=(options,), name=f"run_workers-{index}")
+            for index in range(options["processes"])
+        ]
+        for child in children:
+            child.start()
+
+        def stop_children(*args):
+            for child in children:
+                child.terminate()
+
+        # The children stop gracefully on SIGTERM; Ctrl-C reaches them through the process group
+        signal.signal(signal.SIGTERM, stop_children)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for child in children:
+            child.join()
+
+    def serve(self, options):
+        worker = Worker(
+            threads=options["threads"],
+            poll_interval=options["poll_interval"],
+            stats_interval=options["stats_interval"],
+            burst=options["burst"],
+        )
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        return worker.run()
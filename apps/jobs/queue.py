@@ -0,0 +1,193 @@
+"""Database-backed job queue.
+
+Functions decorated with ``@job`` are enqueued by name with JSON keyword
+arguments. The INSERT joins the caller's transaction, so workers only see a
+job once the work that produced it has committed.
+
+Workers claim jobs with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+database supports it. SQLite has no row locks but serialises writers, so
+there a conditional ``UPDATE ... WHERE status = 'queued'`` is the claim:
+of several workers racing for the same row, exactly one updates it.
+"""
+
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, connections, router, transaction
+from django.db.models import Avg, Count, F, Min
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Ready rows a SQLite worker tries before giving up on a poll
+CLAIM_CANDIDATES = 5
+# Tries of a statement that fails on a lock held by another worker
+LOCKED_RETRIES = 5
+
+_registry = {}
+
+
+def job(func=None, *, name=None):
+    """Register ``func`` as a job under ``name`` (default: its dotted path)."""
+
+    def decorator(func):
+        func.job_name = name or f"{func.__module__}.{func.__qualname__}"
+        _registry[func.job_name] = func
+        return func
+
+    return decorator(func) if func is not None else decorator
+
+
+def enqueue(func, *, priority=0, run_at=None, delay=0, max_attempts=3, **kwargs):
+    """Queue a registered job with JSON-serialisable ``kwargs``.
+
+    Higher ``priority`` runs first. ``run_at`` or ``delay`` (seconds)
+    schedules it for later. With ``JOBS_EAGER`` the job runs inline once the
+    current transaction commits and no row is written.
+    """
+    name = getattr(func, "job_name", func)
+    if name not in _registry:
+        raise ValueError(f"{name!r} is not a registered job.")
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: _call(name, kwargs))
+        return None
+    return Job.objects.create(
+        name=name,
+        kwargs=kwargs,
+        priority=priority,
+        run_at=run_at or timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts,
+    )
+
+
+def _call(name, kwargs):
+    try:
+        _registry[name](**kwargs)
+    except Exception:
+        logger.exception("Job %s failed", name)
+
+
+def _ready(now):
+    return Job.objects.filter(status=Job.Status.QUEUED, run_at__lte=now).order_by("-priority", "run_at", "id")
+
+
+def claim(worker):
+    """Mark the next ready job as running for ``worker`` and return it, or None."""
+    now = timezone.now()
+    claimed = {"status": Job.Status.RUNNING, "locked_by": worker, "started_at": now, "attempts": F("attempts") + 1}
+    alias = router.db_for_write(Job)
+    if connections[alias].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=alias):
+            pk = _ready(now).select_for_update(skip_locked=True).values_list("pk", flat=True).first()
+            if pk is None:
+                return None
+            Job.objects.filter(pk=pk).update(**claimed)
+        return Job.objects.get(pk=pk)
+    for pk in _retry_locked(list, _ready(now).values_list("pk", flat=True)[:CLAIM_CANDIDATES]):
+        if _retry_locked(Job.objects.filter(pk=pk, status=Job.Status.QUEUED).update, **claimed):
+            return _retry_locked(Job.objects.get, pk=pk)
+    return None
+
+
+def _retry_locked(query, *args, **kwargs):
+    # SQLite fails at once where another connection holds a table lock
+    # (e.g. shared-cache in-memory databases) and after its busy timeout
+    # otherwise; contention between workers is expected, so back off and retry.
+    for attempt in range(LOCKED_RETRIES):
+        try:
+            return query(*args, **kwargs)
+        except OperationalError:
+            if attempt == LOCKED_RETRIES - 1:
+                raise
+            time.sleep(0.05 * 2**attempt)
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome; return True on success."""
+    try:
+        func = _registry.get(job.name)
+        if func is None:
+            raise LookupError(f"{job.name!r} is not a registered job.")
+        func(**job.kwargs)
+    except Exception as exc:
+        logger.warning("Job #%s %s failed (attempt %s/%s): %s", job.pk, job.name, job.attempts, job.max_attempts, exc)
+        error = "".join(traceback.format_exception(exc))
+        if job.attempts < job.max_attempts:
+            # Exponential backoff: JOBS_RETRY_DELAY, then double per attempt
+            delay = settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+            changes = {"status": Job.Status.QUEUED, "run_at": timezone.now() + timedelta(seconds=delay)}
+        else:
+            changes = {"status": Job.Status.FAILED, "finished_at": timezone.now()}
+        _finish(job, last_error=error, **changes)
+        return False
+    _finish(job, status=Job.Status.DONE, finished_at=timezone.now())
+    return True
+
+
+def _finish(job, **changes):
+    # The job has already run: losing this write would run it again once the
+    # lock times out. It only applies while this worker still holds the job;
+    # once requeue_stale has released it, the outcome belongs to the next worker.
+    running = Job.objects.filter(pk=job.pk, status=Job.Status.RUNNING, locked_by=job.locked_by)
+    updated = _retry_locked(running.update, locked_by="", **changes)
+    if not updated:
+        logger.warning("Job #%s %s was released while %s ran it", job.pk, job.name, job.locked_by)
+    return updated
+
+
+def requeue(queryset):
+    """Queue the given jobs again from scratch, e.g. failed ones after a fix."""
+    return queryset.update(status=Job.Status.QUEUED, run_at=timezone.now(), attempts=0, locked_by="", finished_at=None)
+
+
+def requeue_stale(timeout=None):
+    """Release jobs left running by a worker that died, counting the lost attempt.
+
+    A job whose attempts are used up is marked failed instead, so one that
+    keeps crashing its worker is not retried forever.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.Status.RUNNING, started_at__lt=now - timedelta(seconds=timeout or settings.JOBS_LOCK_TIMEOUT)
+    )
+    lost = "Worker lost: the job was still running after the lock timeout."
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.Status.FAILED, locked_by="", finished_at=now, last_error=lost
+    )
+    return failed + stale.update(status=Job.Status.QUEUED, locked_by="", last_error=lost)
+
+
+def purge_finished(days=None):
+    """Delete done and failed jobs older than ``days`` (default ``JOBS_KEEP_DAYS``)."""
+    cutoff = timezone.now() - timedelta(days=days if days is not None else settings.JOBS_KEEP_DAYS)
+    deleted, _ = Job.objects.filter(status__in=[Job.Status.DONE, Job.Status.FAILED], finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def job_metrics(window=60):
+    """Queue depth and throughput over the last ``window`` seconds."""
+    now = timezone.now()
+    counts = dict(Job.objects.order_by().values_list("status").annotate(Count("id")))
+    finished = Job.objects.filter(finished_at__gte=now - timedelta(seconds=window))
+    done = finished.filter(status=Job.Status.DONE).aggregate(
+        count=Count("id"),
+        wait=Avg(F("started_at") - F("run_at")),
+        runtime=Avg(F("finished_at") - F("started_at")),
+    )
+    oldest = _ready(now).aggregate(oldest=Min("run_at"))["oldest"]
+    return {
+        **{status: counts.get(status, 0) for status in Job.Status.values},
+        "ready": _ready(now).count(),
+        "oldest_ready_seconds": round((now - oldest).total_seconds(), 3) if oldest else 0,
+        "window_seconds": window,
+        "completed": done["count"],
+        "failed_recently": finished.filter(status=Job.Status.FAILED).count(),
+        "jobs_per_second": round(done["count"] / window, 3),
+        "avg_wait_ms": round(done["wait"].total_seconds() * 1000, 1) if done["wait"] else 0,
+        "avg_runtime_ms": round(done["runtime"].total_seconds() * 1000, 1) if done["runtime"] else 0,
+    }
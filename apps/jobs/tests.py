@@ -0,0 +1,170 @@
+import json
+import threading
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .queue import claim, enqueue, job, job_metrics, purge_finished, requeue_stale, run_job
+from .worker import Worker
+
+calls = []
+calls_lock = threading.Lock()
+
+
+@job
+def record(value):
+    with calls_lock:
+        calls.append(value)
+
+
+@job(name="tests.explode")
+def explode():
+    raise RuntimeError("boom")
+
+
+class QueueTests(TestCase):
+    """Test enqueueing, claiming and running jobs."""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_stores_name_and_kwargs(self):
+        queued = enqueue(record, value=1, priority=5)
+        self.assertEqual(queued.name, "apps.jobs.tests.record")
+        self.assertEqual(queued.kwargs, {"value": 1})
+        self.assertEqual(queued.priority, 5)
+        self.assertEqual(queued.status, Job.Status.QUEUED)
+
+    def test_enqueue_unregistered_job_rejected(self):
+        with self.assertRaises(ValueError):
+            enqueue("os.system", command="true")
+
+    def test_claim_order_priority_then_run_at(self):
+        now = timezone.now()
+        low = enqueue(record, value="low", run_at=now - timedelta(minutes=5))
+        high = enqueue(record, value="high", priority=10)
+        older = enqueue(record, value="older", run_at=now - timedelta(minutes=10))
+        self.assertEqual([claim("w").pk for _ in range(3)], [high.pk, older.pk, low.pk])
+        self.assertIsNone(claim("w"))
+
+    def test_scheduled_job_waits(self):
+        enqueue(record, value=1, delay=60)
+        self.assertIsNone(claim("w"))
+
+    def test_claim_marks_running_once(self):
+        enqueue(record, value=1)
+        claimed = claim("worker-1")
+        self.assertEqual(claimed.status, Job.Status.RUNNING)
+        self.assertEqual(claimed.locked_by, "worker-1")
+        self.assertEqual(claimed.attempts, 1)
+        self.assertIsNone(claim("worker-2"))
+
+    def test_run_job_success(self):
+        enqueue(record, value=7)
+        self.assertTrue(run_job(claim("w")))
+        self.assertEqual(calls, [7])
+        done = Job.objects.get()
+        self.assertEqual(done.status, Job.Status.DONE)
+        self.assertIsNotNone(done.finished_at)
+
+    @override_settings(JOBS_RETRY_DELAY=10)
+    def test_failed_job_retried_with_backoff_then_failed(self):
+        enqueue(explode, max_attempts=2)
+        before = timezone.now()
+        self.assertFalse(run_job(claim("w")))
+        retry = Job.objects.get()
+        self.assertEqual(retry.status, Job.Status.QUEUED)
+        self.assertGreaterEqual(retry.run_at, before + timedelta(seconds=10))
+        self.assertIn("RuntimeError: boom", retry.last_error)
+
+        Job.objects.update(run_at=timezone.now())
+        self.assertFalse(run_job(claim("w")))
+        self.assertEqual(Job.objects.get().status, Job.Status.FAILED)
+
+    def test_requeue_stale(self):
+        enqueue(record, value=1)
+        claim("dead-worker")
+        self.assertEqual(requeue_stale(timeout=60), 0)
+        Job.objects.update(started_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(requeue_stale(timeout=60), 1)
+        self.assertEqual(claim("w").attempts, 2)
+
+    def test_stale_job_out_of_attempts_failed(self):
+        enqueue(record, value=1, max_attempts=1)
+        claim("dead-worker")
+        Job.objects.update(started_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(requeue_stale(timeout=60), 1)
+        failed = Job.objects.get()
+        self.assertEqual(failed.status, Job.Status.FAILED)
+        self.assertIn("Worker lost", failed.last_error)
+        self.assertIsNone(claim("w"))
+
+    def test_released_job_not_finished_by_slow_worker(self):
+        enqueue(record, value=1)
+        slow = claim("slow-worker")
+        Job.objects.update(started_at=timezone.now() - timedelta(minutes=5))
+        requeue_stale(timeout=60)
+        claim("next-worker")
+        with self.assertLogs("apps.jobs.queue", "WARNING"):
+            self.assertTrue(run_job(slow))
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.Status.RUNNING)
+        self.assertEqual(job.locked_by, "next-worker")
+
+    def test_purge_finished(self):
+        enqueue(record, value=1)
+        run_job(claim("w"))
+        self.assertEqual(purge_finished(days=1), 0)
+        Job.objects.update(finished_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(purge_finished(days=1), 1)
+
+    def test_metrics(self):
+        enqueue(record, value=1)
+        enqueue(record, value=2, delay=60)
+        run_job(claim("w"))
+        metrics = job_metrics(window=60)
+        self.assertEqual(metrics["done"], 1)
+        self.assertEqual(metrics["queued"], 1)
+        self.assertEqual(metrics["ready"], 0)
+        self.assertEqual(metrics["completed"], 1)
+        self.assertGreaterEqual(metrics["avg_runtime_ms"], 0)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_runs_on_commit_without_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(enqueue(record, value=3))
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, [3])
+        self.assertFalse(Job.objects.exists())
+
+
+class WorkerTests(TransactionTestCase):
+    """Test concurrent workers and the run_workers command."""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_threads_run_each_job_once(self):
+        Job.objects.bulk_create(Job(name=record.job_name, kwargs={"value": i}) for i in range(40))
+        processed = Worker(threads=4, burst=True).run()
+        self.assertEqual(processed, 40)
+        self.assertEqual(sorted(calls), list(range(40)))
+        self.assertEqual(Job.objects.filter(status=Job.Status.DONE).count(), 40)
+
+    def test_run_workers_command(self):
+        enqueue(record, value=1)
+        enqueue(explode, max_attempts=1)
+        out = StringIO()
+        call_command("run_workers", "--burst", "--threads=1", stdout=out)
+        self.assertIn("Processed 2 jobs.", out.getvalue())
+        self.assertEqual(calls, [1])
+
+        out = StringIO()
+        call_command("run_workers", "--stats", stdout=out)
+        metrics = json.loads(out.getvalue())
+        self.assertEqual(metrics["done"], 1)
+        self.assertEqual(metrics["failed"], 1)
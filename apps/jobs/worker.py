@@ -0,0 +1,90 @@
+import logging
+import os
+import socket
+import threading
+
+from django.db import DatabaseError, close_old_connections, connections
+
+from .queue import claim, job_metrics, purge_finished, requeue_stale, run_job
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """A pool of threads that claim and run jobs until stopped.
+
+    The calling thread does housekeeping every ``stats_interval`` seconds:
+    it releases jobs of dead workers, purges old finished jobs and logs the
+    throughput metrics. With ``burst`` each thread exits once nothing is
+    ready, which suits cron and tests.
+    """
+
+    def __init__(self, threads=1, poll_interval=1.0, stats_interval=60, burst=False, name=None):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.stats_interval = stats_interval
+        self.burst = burst
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.processed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self, *args):
+        """Finish the jobs in progress, then return from ``run``."""
+        self._stop.set()
+
+    def run(self):
+        self.housekeeping()
+        pool = [
+            threading.Thread(target=self._loop, args=(f"{self.name}:{index}",), name=f"jobs-{index}")
+            for index in range(self.threads)
+        ]
+        for thread in pool:
+            thread.start()
+        while any(thread.is_alive() for thread in pool):
+            if self._stop.wait(self.stats_interval if not self.burst else 0.1):
+                break
+            if not self.burst:
+                self.housekeeping()
+        for thread in pool:
+            thread.join()
+        connections.close_all()
+        return self.processed
+
+    def housekeeping(self):
+        try:
+            if released := requeue_stale():
+                logger.warning("Released %s stale job%s", released, "" if released == 1 else "s")
+            purge_finished()
+            logger.info("Jobs %s", " ".join(f"{key}={value}" for key, value in job_metrics().items()))
+        except DatabaseError:
+            logger.exception("Job housekeeping failed")
+
+    def _loop(self, worker_id):
+        try:
+            while not self._stop.is_set():
+                close_old_connections()
+                try:
+                    job = claim(worker_id)
+                except DatabaseError as exc:
+                    # e.g. SQLite "database is locked" under write contention
+                    logger.warning("Claiming a job failed: %s", exc)
+                    self._stop.wait(self.poll_interval)
+                    continue
+                if job is None:
+                    if self.burst:
+                        break
+                    self._stop.wait(self.poll_interval)
+                    continue
+                try:
+                    ok = run_job(job)
+                except DatabaseError:
+                    # The job stays running and is released by requeue_stale
+                    logger.exception("Recording job #%s failed", job.pk)
+                    ok = False
+                with self._lock:
+                    self.processed += 1
+                    self.failed += not ok
+        finally:
+            connections.close_all()
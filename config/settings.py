@@ -17,13 +17,16 @@ if not SECRET_KEY:
     raise ImproperlyConfigured(
         "SECRET_KEY environment variable is required. Copy .env.example to .env and set a secret key."
     )
+# Previous keys, still accepted for signatures (sessions, password resets, signed API tokens) while rotating
+SECRET_KEY_FALLBACKS = [key for key in os.getenv("SECRET_KEY_FALLBACKS", "").split(",") if key]
 
 DEBUG = os.getenv("DEBUG", "False").lower() in ("true", "1", "yes")
 
 ALLOWED_HOSTS = [h.strip() for h in os.getenv("ALLOWED_HOSTS", "localhost,127.0.0.1").split(",") if h.strip()]
 
 INSTALLED_APPS = [
-    "django.contrib.admin",
+    # Admin modules are discovered in config/urls.py, so management commands skip them
+    "django.contrib.admin.apps.SimpleAdminConfig",
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sessions",
@@ -36,11 +39,14 @@ INSTALLED_APPS = [
     "django_bootstrap5",
     # Local
     "apps.accounts",
+    "apps.jobs",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "apps.accounts.profiling.SamplingProfilerMiddleware",
+    "apps.accounts.middleware.ReplicaPinMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -75,10 +81,42 @@ DATABASES = {
     }
 }
 
+# Cache: per-process LRU in front of a SQLite file shared by all workers on the host
+CACHES = {
+    "default": {
+        "BACKEND": "apps.accounts.tiered_cache.TieredCache",
+        "LOCATION": BASE_DIR / os.getenv("CACHE_LOCATION", "cache.sqlite3"),
+        "OPTIONS": {
+            "MAX_ENTRIES": 100_000,
+            "FRONT_MAX_ENTRIES": 1000,
+            "FRONT_TTL": 5,
+        },
+    }
+}
+
+# Read replicas (comma-separated database names, e.g. "replica1.sqlite3,replica2.sqlite3")
+DATABASE_REPLICAS = []
+for _index, _name in enumerate(
+    (n.strip() for n in os.getenv("DATABASE_REPLICA_NAMES", "").split(",") if n.strip()),
+    start=1,
+):
+    DATABASES[f"replica{_index}"] = {
+        "ENGINE": DATABASES["default"]["ENGINE"],
+        "NAME": BASE_DIR / _name,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{_index}")
+
+DATABASE_ROUTERS = ["apps.accounts.routers.PrimaryReplicaRouter"]
+
+# Seconds a client keeps reading from the primary after a write
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", "5"))
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
-    {"NAME": "django.contrib.auth.password_validation.CommonPasswordValidator"},
+    # Breached/common passwords from a memory-mapped Bloom filter (build_password_filter)
+    {"NAME": "apps.accounts.breached.BreachedPasswordValidator"},
     {"NAME": "django.contrib.auth.password_validation.NumericPasswordValidator"},
 ]
 
@@ -90,6 +128,8 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
+# Hashed names from the manifest are served by WhiteNoise as immutable with a
+# far-future max-age, alongside the gzip and brotli variants it precompresses.
 STORAGES = {
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
@@ -102,6 +142,9 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 LOGIN_URL = "accounts:login"
 LOGIN_REDIRECT_URL = "accounts:dashboard"
 LOGOUT_REDIRECT_URL = "accounts:login"
+# Restores accounts moved out by `manage.py archive_accounts` when they log in
+AUTHENTICATION_BACKENDS = ["apps.accounts.archive.ArchiveBackend"]
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "730"))
 
 # Email
 EMAIL_BACKEND = os.getenv(
@@ -109,6 +152,30 @@ EMAIL_BACKEND = os.getenv(
     "django.core.mail.backends.console.EmailBackend",
 )
 
+# Country code for phone numbers entered in national format (leading 0), see apps.accounts.phones
+PHONE_DEFAULT_COUNTRY_CODE = os.getenv("PHONE_DEFAULT_COUNTRY_CODE", "46")
+
+# Bloom filter of breached/common password hashes, shared by all workers through mmap
+PASSWORD_FILTER_PATH = BASE_DIR / os.getenv("PASSWORD_FILTER_PATH", "password_filter.bloom")
+
+# Fixed-size failed-login counters (apps.accounts.loginguard), shared by all workers on a host
+LOGIN_GUARD_PATH = BASE_DIR / os.getenv("LOGIN_GUARD_PATH", "loginguard.sqlite3")
+
+# Signed API tokens (/api/token/); keys are derived from SECRET_KEY and SECRET_KEY_FALLBACKS
+SIGNED_TOKEN_ACCESS_SECONDS = int(os.getenv("SIGNED_TOKEN_ACCESS_SECONDS", "900"))
+SIGNED_TOKEN_REFRESH_SECONDS = int(os.getenv("SIGNED_TOKEN_REFRESH_SECONDS", str(14 * 24 * 3600)))
+
+# Background jobs (apps.jobs), run by `manage.py run_workers`
+JOBS_EAGER = os.getenv("JOBS_EAGER", "False").lower() in ("true", "1", "yes")  # run inline after commit, no worker
+JOBS_RETRY_DELAY = 10  # seconds before the first retry, doubled per attempt
+JOBS_LOCK_TIMEOUT = 600  # seconds before a running job of a dead worker is released
+JOBS_KEEP_DAYS = 7
+
+# Sampling profiler (apps.accounts.profiling): fraction of requests profiled, 0 disables it entirely
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_STACK_INTERVAL = 0.005  # seconds between stack samples of a profiled request
+PROFILING_DIR = BASE_DIR / os.getenv("PROFILING_DIR", "profiles")
+
 # Production security settings (activated when DEBUG=False)
 if not DEBUG:
     SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
@@ -127,6 +194,7 @@ CSRF_TRUSTED_ORIGINS = [o.strip() for o in os.getenv("CSRF_TRUSTED_ORIGINS", "")
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.TokenAuthentication",
+        "apps.accounts.authentication.SignedTokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
@@ -142,6 +210,9 @@ REST_FRAMEWORK = {
     "DEFAULT_THROTTLE_RATES": {
         "anon": "20/minute",
         "user": "60/minute",
+        "autocomplete": "600/minute",
+        "availability": "120/minute",
+        "phone_lookup": "6000/hour",
     },
 }
 
@@ -155,9 +226,18 @@ SPECTACULAR_SETTINGS = {
     "TAGS": [
         {"name": "Profiles", "description": "Full CRUD operations on user profiles"},
         {"name": "Users", "description": "Read-only access to registered users"},
+        {"name": "Auth", "description": "Signed access/refresh tokens"},
+        {"name": "Admin", "description": "Operational endpoints for staff"},
     ],
 }
 
+# Avatar proxy: resized WebP variants of profile avatars, evicted least recently used
+AVATAR_CACHE_DIR = BASE_DIR / os.getenv("AVATAR_CACHE_DIR", "avatar_cache")
+AVATAR_CACHE_MAX_BYTES = int(os.getenv("AVATAR_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+
+# Prebuilt OpenAPI schema artifacts (see the build_schema command)
+OPENAPI_SCHEMA_DIR = STATIC_ROOT / "openapi"
+
 # Logging
 LOGGING = {
     "version": 1,
@@ -0,0 +1,48 @@
+"""
+Settings for the test suite (selected by ``manage.py test``).
+
+Fast password hashing, an in-memory database and a per-process cache keep
+the suite quick, and nothing on disk is shared, so ``--parallel`` runs do
+not interfere with each other.
+"""
+
+import os
+
+os.environ.setdefault("SECRET_KEY", "insecure-test-only-key")
+os.environ.setdefault("DEBUG", "True")
+
+from .settings import *  # noqa: E402, F403
+from .settings import BASE_DIR, DATABASES  # noqa: E402
+
+# PBKDF2 costs tens of milliseconds per user created or logged in
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+# SQLite test databases live in memory, as do the per-worker clones made by --parallel
+DATABASES["default"]["TEST"] = {"NAME": None}
+
+# A second SQLite file standing in for a read replica (only created for tests that use it)
+DATABASES["replica"] = {
+    "ENGINE": "django.db.backends.sqlite3",
+    "NAME": BASE_DIR / "replica.sqlite3",
+    "TEST": {"NAME": BASE_DIR / "test_replica.sqlite3"},
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "tests",
+    }
+}
+
+# Compressing and hashing every static file makes collectstatic take seconds
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+# Failed-login counters per test thread, not in a file shared with parallel workers
+LOGIN_GUARD_PATH = ":memory:"
+
+EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+
+TEST_RUNNER = "config.test_runner.TimedTestRunner"
@@ -0,0 +1,58 @@
+"""Test runner that reports the slowest tests after every run.
+
+Durations come from unittest's ``addDuration`` hook on Python 3.12+, which
+Django forwards from ``--parallel`` workers. Older versions time each test
+between ``startTest`` and ``stopTest``, so parallel runs there get no report.
+"""
+
+import time
+import unittest
+
+from django.test.runner import DiscoverRunner, ParallelTestSuite
+from django.utils.version import PY312
+
+
+class TimingTestResult(unittest.TextTestResult):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timings = []
+
+    def startTest(self, test):
+        self._started = time.perf_counter()
+        super().startTest(test)
+
+    def stopTest(self, test):
+        super().stopTest(test)
+        if not PY312:
+            self.timings.append((time.perf_counter() - self._started, test.id()))
+
+    def addDuration(self, test, elapsed):
+        super().addDuration(test, elapsed)
+        self.timings.append((elapsed, test.id()))
+
+
+class TimedTestRunner(DiscoverRunner):
+    def __init__(self, slowest=10, **kwargs):
+        super().__init__(**kwargs)
+        self.slowest = slowest
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--slowest", type=int, default=10, metavar="N", help="Report the N slowest tests (0 to disable)"
+        )
+
+    def get_resultclass(self):
+        return super().get_resultclass() or TimingTestResult
+
+    def run_suite(self, suite, **kwargs):
+        result = super().run_suite(suite, **kwargs)
+        if isinstance(suite, ParallelTestSuite) and not PY312:
+            return result
+        timings = sorted(getattr(result, "timings", ()), reverse=True)[: self.slowest]
+        if timings:
+            self.log(f"\nSlowest {len(timings)} tests:")
+            for elapsed, test_id in timings:
+                self.log(f"{elapsed:8.3f}s  {test_id}")
+        return result
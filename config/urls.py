@@ -1,7 +1,12 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from apps.accounts.views import login_attempts_view
+
+admin.autodiscover()
+
 urlpatterns = [
+    path("admin/login-attempts/", login_attempts_view, name="admin_login_attempts"),
     path("admin/", admin.site.urls),
     path("", include("apps.accounts.urls")),
     path("api/", include("apps.accounts.api_urls")),
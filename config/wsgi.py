@@ -8,9 +8,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 """
 
 import os
+from importlib import import_module
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 application = get_wsgi_application()
+
+# Import the URLconf (views, serializers, admin) now so that gunicorn --preload
+# workers fork from a fully warmed master instead of paying for it per worker.
+import_module(settings.ROOT_URLCONF)
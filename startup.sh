@@ -1,20 +1,29 @@
 #!/bin/bash
+# Usage: startup.sh [web|worker]. Run one process per container (see
+# docker-compose.yml) so each gets its own signals and restart policy.
 set -e
 
-echo "==> Running migrations..."
-python manage.py migrate --noinput
+case "${1:-web}" in
+    worker)
+        echo "==> Starting background job workers..."
+        exec python manage.py run_workers --threads "${JOB_THREADS:-2}" --processes "${JOB_PROCESSES:-1}"
+        ;;
+    web)
+        echo "==> Preparing application..."
+        python manage.py boot --seed
 
-echo "==> Seeding demo users..."
-python manage.py seed_users 2>/dev/null || true
-
-echo "==> Collecting static files..."
-python manage.py collectstatic --noinput
-
-PORT="${PORT:-8000}"
-echo "==> Starting gunicorn on 0.0.0.0:${PORT}..."
-exec gunicorn config.wsgi:application \
-    --bind "0.0.0.0:${PORT}" \
-    --workers "${WEB_WORKERS:-2}" \
-    --timeout 120 \
-    --access-logfile - \
-    --error-logfile -
+        PORT="${PORT:-8000}"
+        echo "==> Starting gunicorn on 0.0.0.0:${PORT}..."
+        exec gunicorn config.wsgi:application \
+            --bind "0.0.0.0:${PORT}" \
+            --workers "${WEB_WORKERS:-2}" \
+            --preload \
+            --timeout 120 \
+            --access-logfile - \
+            --error-logfile -
+        ;;
+    *)
+        echo "Unknown process type: $1 (expected web or worker)" >&2
+        exit 2
+        ;;
+esac